@@ -0,0 +1,179 @@
+'''
+Synthetic input tables for the benchmarks, generated deterministically from
+the format, the number of rows, the number of columns and the nesting depth.
+'''
+
+import csv
+import dataclasses
+import json
+import os
+import random
+
+from typing import (
+    Any,
+    Iterator,
+)
+
+# local
+
+from .. core.functions.nest_row import nest_row
+
+FORMATS = ['csv', 'jsonl', 'json', 'xlsx']
+BASE_COLUMNS = ['id', 'name', 'city', 'score', 'tags']
+NUM_NAMES = 100
+NUM_CITIES = 20
+NUM_TAGS = 10
+
+dict_dataset_writers: dict[str, callable] = {}
+
+def register_dataset_writer(
+    format: str,
+):
+    def decorator(writer):
+        dict_dataset_writers[format] = writer
+        return writer
+    return decorator
+
+@dataclasses.dataclass(frozen=True)
+class DatasetSpec:
+    '''
+    The width is the number of the leaf columns including the base columns,
+    and the filler columns are nested under depth - 1 levels of objects.
+    '''
+    format: str
+    rows: int
+    width: int = 8
+    depth: int = 1
+    seed: int = 0
+
+    def __post_init__(self):
+        if self.format not in FORMATS:
+            raise ValueError(f'Unsupported dataset format: {self.format}')
+        if self.rows < 1:
+            raise ValueError(f'Invalid number of rows: {self.rows}')
+        if self.width <= len(BASE_COLUMNS):
+            raise ValueError(
+                f'The width must be greater than {len(BASE_COLUMNS)}: {self.width}'
+            )
+        if self.depth < 1:
+            raise ValueError(f'Invalid nesting depth: {self.depth}')
+
+    @property
+    def file_name(self) -> str:
+        return f'rows{self.rows}-width{self.width}-depth{self.depth}-seed{self.seed}.{self.format}'
+
+    @property
+    def columns(self) -> list[str]:
+        num_fillers = self.width - len(BASE_COLUMNS)
+        return BASE_COLUMNS + [
+            get_filler_column(index, self.depth) for index in range(num_fillers)
+        ]
+
+    @property
+    def deep_field(self) -> str:
+        '''
+        The most nested column, referenced by the scenarios.
+        '''
+        return get_filler_column(0, self.depth)
+
+def get_filler_column(
+    index: int,
+    depth: int,
+) -> str:
+    levels = [f'n{level}' for level in range(1, depth)]
+    return '.'.join(levels + [f'f{index}'])
+
+def iter_dataset_rows(
+    spec: DatasetSpec,
+) -> Iterator[dict[str, Any]]:
+    '''
+    Yield the flat rows keyed by the dotted columns, with None for the
+    missing values.
+    '''
+    rand = random.Random(spec.seed)
+    fillers = spec.columns[len(BASE_COLUMNS):]
+    for index in range(spec.rows):
+        row = {
+            'id': index,
+            'name': f'name{rand.randrange(NUM_NAMES)}',
+            # NOTE: 空欄や欠損値も混ぜておく
+            'city': f'city{rand.randrange(NUM_CITIES)}' if rand.random() >= 0.1 else None,
+            'score': round(rand.uniform(0, 100), 2) if rand.random() >= 0.05 else None,
+            'tags': ';'.join(
+                f'tag{tag}' for tag in rand.sample(range(NUM_TAGS), rand.randint(1, 4))
+            ),
+        }
+        for position, column in enumerate(fillers):
+            if position % 2 == 0:
+                row[column] = rand.randrange(1000000)
+            else:
+                row[column] = f'value{rand.randrange(1000)}'
+        yield row
+
+@register_dataset_writer('csv')
+def write_csv_dataset(
+    spec: DatasetSpec,
+    output_file: str,
+):
+    with open(output_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=spec.columns)
+        writer.writeheader()
+        writer.writerows(iter_dataset_rows(spec))
+
+@register_dataset_writer('jsonl')
+def write_jsonl_dataset(
+    spec: DatasetSpec,
+    output_file: str,
+):
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for row in iter_dataset_rows(spec):
+            f.write(json.dumps(nest_row(row), ensure_ascii=False))
+            f.write('\n')
+
+@register_dataset_writer('json')
+def write_json_dataset(
+    spec: DatasetSpec,
+    output_file: str,
+):
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write('[\n')
+        for index, row in enumerate(iter_dataset_rows(spec)):
+            if index > 0:
+                f.write(',\n')
+            f.write(json.dumps(nest_row(row), ensure_ascii=False))
+        f.write('\n]\n')
+
+@register_dataset_writer('xlsx')
+def write_xlsx_dataset(
+    spec: DatasetSpec,
+    output_file: str,
+):
+    import xlsxwriter
+    workbook = xlsxwriter.Workbook(output_file, {'constant_memory': True})
+    try:
+        worksheet = workbook.add_worksheet()
+        columns = spec.columns
+        worksheet.write_row(0, 0, columns)
+        for index, row in enumerate(iter_dataset_rows(spec)):
+            for position, column in enumerate(columns):
+                if row[column] is not None:
+                    worksheet.write(index + 1, position, row[column])
+    finally:
+        workbook.close()
+
+def prepare_dataset(
+    spec: DatasetSpec,
+    work_dir: str,
+) -> str:
+    '''
+    Return the path to the dataset in the work directory, generating it if
+    it does not exist yet.
+    '''
+    path = os.path.join(work_dir, spec.file_name)
+    if not os.path.exists(path):
+        os.makedirs(work_dir, exist_ok=True)
+        # NOTE: 書き出しの途中で中断されても壊れたファイルを再利用しないように
+        temp_path = path + '.tmp'
+        dict_dataset_writers[spec.format](spec, temp_path)
+        os.replace(temp_path, path)
+    return path
@@ -0,0 +1,423 @@
+'''
+Microbenchmarks of the helpers called for every row, timed in isolation on
+synthetic rows of the given key depth, row width and ratio of the keys found,
+optionally against alternative implementations of the same helper.
+'''
+
+import copy
+import dataclasses
+import datetime
+import gc
+import importlib
+import platform
+import random
+import statistics
+import time
+
+from collections import OrderedDict
+from typing import (
+    Any,
+    Callable,
+)
+
+# local
+
+from .. import __version__
+from .. core.constants import STAGING_FIELD
+from .. core.functions.flatten_row import flatten_row
+from .. core.functions.get_nested_field_value import get_nested_field_value
+from .. core.functions.nest_row import nest_row
+from .. core.functions.search_column_value import search_column_value
+from .. core.functions.set_flat_field_value import set_flat_field_value
+from .. core.functions.set_nested_field_value import set_nested_field_value
+
+MICRO_REPORT_VERSION = 1
+DEFAULT_IMPLEMENTATION = 'default'
+# NOTE: timeit.Timer.autorange と同様に 1 回の計測がこの時間を超えるまで回数を増やす
+MIN_MEASURE_SECONDS = 0.2
+
+@dataclasses.dataclass(frozen=True)
+class MicroSpec:
+    depth: int = 1
+    width: int = 10
+    hit_ratio: float = 1.0
+    calls: int = 1000
+    seed: int = 0
+
+    def __post_init__(self):
+        if self.depth < 1:
+            raise ValueError(f'Invalid key depth: {self.depth}')
+        if self.width < 1:
+            raise ValueError(f'Invalid row width: {self.width}')
+        if not 0 <= self.hit_ratio <= 1:
+            raise ValueError(f'Invalid hit ratio: {self.hit_ratio}')
+        if self.calls < 1:
+            raise ValueError(f'Invalid number of calls: {self.calls}')
+
+@dataclasses.dataclass
+class MicroCase:
+    '''
+    The setup returns a fresh state for each loop, which is not timed, and
+    the run calls the helper spec.calls times on the state and returns what
+    is compared between the implementations.
+    '''
+    setup: Callable[[], Any]
+    run: Callable[[Callable, Any], Any]
+
+@dataclasses.dataclass
+class MicroHelper:
+    function: Callable
+    setup_case: Callable[[MicroSpec], MicroCase]
+    # NOTE: 見つかるキーの割合に依存しない関数もある
+    uses_hit_ratio: bool = True
+
+dict_micro_helpers: dict[str, MicroHelper] = {}
+
+def register_micro_helper(
+    name: str,
+    function: Callable,
+    uses_hit_ratio: bool = True,
+):
+    def decorator(setup_case):
+        dict_micro_helpers[name] = MicroHelper(
+            function = function,
+            setup_case = setup_case,
+            uses_hit_ratio = uses_hit_ratio,
+        )
+        return setup_case
+    return decorator
+
+def get_columns(
+    spec: MicroSpec,
+    leaf_prefix: str = 'c',
+) -> list[str]:
+    '''
+    Return the dotted columns of the row, spread over a few branches at each
+    of the depth - 1 levels.
+    '''
+    columns = []
+    for index in range(spec.width):
+        levels = [
+            f'l{level}_{index % (level + 1)}' for level in range(1, spec.depth)
+        ]
+        columns.append('.'.join(levels + [f'{leaf_prefix}{index}']))
+    return columns
+
+def make_flat_row(
+    spec: MicroSpec,
+    rand: random.Random,
+) -> OrderedDict:
+    row = OrderedDict()
+    for index, column in enumerate(get_columns(spec)):
+        if index % 2 == 0:
+            row[column] = rand.randrange(1000000)
+        else:
+            row[column] = f'value{rand.randrange(1000)}'
+    return row
+
+def make_nested_row(
+    spec: MicroSpec,
+    rand: random.Random,
+) -> OrderedDict:
+    return nest_row(make_flat_row(spec, rand))
+
+def choose_fields(
+    spec: MicroSpec,
+    rand: random.Random,
+    hit_fields: list,
+    miss_fields: list,
+) -> list:
+    '''
+    Choose spec.calls fields, each found with the probability of the hit
+    ratio.
+    '''
+    fields = []
+    for _ in range(spec.calls):
+        if rand.random() < spec.hit_ratio:
+            fields.append(rand.choice(hit_fields))
+        else:
+            fields.append(rand.choice(miss_fields))
+    return fields
+
+@register_micro_helper('get_nested_field_value', get_nested_field_value)
+def setup_get_nested_field_value(
+    spec: MicroSpec,
+) -> MicroCase:
+    rand = random.Random(spec.seed)
+    row = make_nested_row(spec, rand)
+    # NOTE: 親は存在するが末端のキーが存在しない
+    fields = choose_fields(
+        spec, rand, get_columns(spec), get_columns(spec, leaf_prefix='m'),
+    )
+    return MicroCase(
+        setup = lambda: row,
+        run = lambda function, row: [function(row, field) for field in fields],
+    )
+
+@register_micro_helper('set_nested_field_value', set_nested_field_value)
+def setup_set_nested_field_value(
+    spec: MicroSpec,
+) -> MicroCase:
+    rand = random.Random(spec.seed)
+    row = make_nested_row(spec, rand)
+    # NOTE: 見つからないキーは親から作られる
+    new_columns = [
+        '.'.join(f'new_{field}' for field in column.split('.'))
+        for column in get_columns(spec)
+    ]
+    fields = choose_fields(spec, rand, get_columns(spec), new_columns)
+    def run(function, row):
+        for index, field in enumerate(fields):
+            function(row, field, index)
+        return row
+    return MicroCase(
+        setup = lambda: copy.deepcopy(row),
+        run = run,
+    )
+
+@register_micro_helper('set_flat_field_value', set_flat_field_value)
+def setup_set_flat_field_value(
+    spec: MicroSpec,
+) -> MicroCase:
+    '''
+    The top level values of a nested row are set to a flat row, which already
+    has the found ones.
+    '''
+    rand = random.Random(spec.seed)
+    row = make_nested_row(spec, rand)
+    flat_row = flatten_row(row)
+    hit_items = list(row.items())
+    miss_items = [(f'new_{key}', value) for key, value in hit_items]
+    items = choose_fields(spec, rand, hit_items, miss_items)
+    def run(function, flat_row):
+        for target, value in items:
+            function(flat_row, target, value)
+        return flat_row
+    return MicroCase(
+        setup = lambda: flat_row.copy(),
+        run = run,
+    )
+
+@register_micro_helper('flatten_row', flatten_row, uses_hit_ratio=False)
+def setup_flatten_row(
+    spec: MicroSpec,
+) -> MicroCase:
+    rand = random.Random(spec.seed)
+    # NOTE: 行の数を抑えて同じ行を繰り返し変換する
+    rows = [make_nested_row(spec, rand) for _ in range(min(spec.calls, 100))]
+    def run(function, rows):
+        return [function(rows[index % len(rows)]) for index in range(spec.calls)]
+    return MicroCase(
+        setup = lambda: rows,
+        run = run,
+    )
+
+@register_micro_helper('nest_row', nest_row)
+def setup_nest_row(
+    spec: MicroSpec,
+) -> MicroCase:
+    '''
+    The values are missing (NaN) with the probability of 1 - hit ratio.
+    '''
+    rand = random.Random(spec.seed)
+    rows = []
+    for _ in range(min(spec.calls, 100)):
+        row = make_flat_row(spec, rand)
+        for column in row:
+            if rand.random() >= spec.hit_ratio:
+                row[column] = float('nan')
+        rows.append(row)
+    def run(function, rows):
+        return [function(rows[index % len(rows)]) for index in range(spec.calls)]
+    return MicroCase(
+        setup = lambda: rows,
+        run = run,
+    )
+
+@register_micro_helper('search_column_value', search_column_value)
+def setup_search_column_value(
+    spec: MicroSpec,
+) -> MicroCase:
+    '''
+    The found columns are either in the row or in the staging field, and the
+    missing ones are searched in all the candidate locations.
+    '''
+    rand = random.Random(spec.seed)
+    row = make_nested_row(spec, rand)
+    staging = make_nested_row(spec, rand)
+    staging_columns = get_columns(spec, leaf_prefix='s')
+    for column, value in zip(staging_columns, flatten_row(staging).values()):
+        set_nested_field_value(row, f'{STAGING_FIELD}.{column}', value)
+    fields = choose_fields(
+        spec,
+        rand,
+        get_columns(spec) + staging_columns,
+        get_columns(spec, leaf_prefix='m'),
+    )
+    return MicroCase(
+        setup = lambda: row,
+        run = lambda function, row: [function(row, field) for field in fields],
+    )
+
+def load_function(
+    path: str,
+) -> Callable:
+    '''
+    Load the function given as "module:name".
+    '''
+    if ':' not in path:
+        raise ValueError(f'Expected "module:name": {path!r}')
+    module_name, name = path.split(':', 1)
+    module = importlib.import_module(module_name)
+    function = getattr(module, name, None)
+    if not callable(function):
+        raise ValueError(f'Not a function: {path!r}')
+    return function
+
+def measure_loops(
+    case: MicroCase,
+    function: Callable,
+    number: int,
+) -> float:
+    '''
+    Return the seconds spent in number runs of the case, without the setup.
+    '''
+    total = 0.0
+    gc_enabled = gc.isenabled()
+    # NOTE: timeit と同様に GC を止めて計測する
+    gc.disable()
+    try:
+        for _ in range(number):
+            state = case.setup()
+            start = time.perf_counter()
+            case.run(function, state)
+            total += time.perf_counter() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return total
+
+def autorange_loops(
+    case: MicroCase,
+    function: Callable,
+    min_seconds: float = MIN_MEASURE_SECONDS,
+) -> int:
+    '''
+    Return the number of loops taking at least min_seconds, increased in
+    the sequence 1, 2, 5, 10, 20, 50, ... as timeit.Timer.autorange does.
+    '''
+    scale = 1
+    while True:
+        for multiplier in (1, 2, 5):
+            number = scale * multiplier
+            if measure_loops(case, function, number) >= min_seconds:
+                return number
+        scale *= 10
+
+def summarize_times(
+    list_seconds: list[float],
+    number: int,
+    calls: int,
+) -> dict[str, float]:
+    '''
+    Summarize the seconds of the repeats as nanoseconds per call.
+    '''
+    per_call = [seconds / number / calls * 1e9 for seconds in list_seconds]
+    return {
+        'min': min(per_call),
+        'median': statistics.median(per_call),
+        'mean': statistics.mean(per_call),
+        'stdev': statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+    }
+
+def run_micro_case(
+    helper_name: str,
+    spec: MicroSpec,
+    implementations: dict[str, Callable],
+    repeat: int = 5,
+    number: int | None = None,
+) -> list[dict[str, Any]]:
+    '''
+    Time each implementation of the helper on the same case, with the number
+    of loops calibrated on the default implementation unless given, and check
+    the results of the alternatives against the default one.
+    '''
+    helper = dict_micro_helpers[helper_name]
+    case = helper.setup_case(spec)
+    default_function = implementations[DEFAULT_IMPLEMENTATION]
+    if number is None:
+        number = autorange_loops(case, default_function)
+    expected = case.run(default_function, case.setup())
+    results = []
+    for name, function in implementations.items():
+        list_seconds = [
+            measure_loops(case, function, number) for _ in range(repeat)
+        ]
+        result = {
+            'helper': helper_name,
+            'implementation': name,
+            'depth': spec.depth,
+            'width': spec.width,
+            'hit_ratio': spec.hit_ratio if helper.uses_hit_ratio else None,
+            'calls': spec.calls,
+            'number': number,
+            'repeat': repeat,
+            'per_call_ns': summarize_times(list_seconds, number, spec.calls),
+        }
+        if name != DEFAULT_IMPLEMENTATION:
+            result['matches_default'] = \
+                case.run(function, case.setup()) == expected
+        results.append(result)
+    default_median = results[0]['per_call_ns']['median']
+    for result in results[1:]:
+        result['speedup'] = default_median / result['per_call_ns']['median']
+    return results
+
+def run_micro_bench(
+    helper_names: list[str],
+    depths: list[int],
+    widths: list[int],
+    hit_ratios: list[float],
+    calls: int = 1000,
+    repeat: int = 5,
+    number: int | None = None,
+    alternatives: dict[str, dict[str, Callable]] | None = None,
+    seed: int = 0,
+) -> dict[str, Any]:
+    '''
+    Run the helpers over the product of the depths, the widths and the hit
+    ratios, the alternatives being keyed by the helper name and then by the
+    name of the implementation.
+    '''
+    if repeat < 1:
+        raise ValueError(f'Invalid number of repeats: {repeat}')
+    for helper_name in helper_names:
+        if helper_name not in dict_micro_helpers:
+            raise ValueError(f'Unsupported helper: {helper_name}')
+    alternatives = alternatives or {}
+    results = []
+    for helper_name in helper_names:
+        helper = dict_micro_helpers[helper_name]
+        implementations = {DEFAULT_IMPLEMENTATION: helper.function}
+        implementations.update(alternatives.get(helper_name, {}))
+        for depth in depths:
+            for width in widths:
+                for hit_ratio in hit_ratios if helper.uses_hit_ratio else [1.0]:
+                    spec = MicroSpec(
+                        depth = depth,
+                        width = width,
+                        hit_ratio = hit_ratio,
+                        calls = calls,
+                        seed = seed,
+                    )
+                    results.extend(run_micro_case(
+                        helper_name, spec, implementations, repeat, number,
+                    ))
+    return {
+        'version': MICRO_REPORT_VERSION,
+        'created_at': datetime.datetime.now().astimezone().isoformat(),
+        'table_converter': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
@@ -0,0 +1,248 @@
+'''
+Run the benchmark scenarios through convert() on the synthetic datasets and
+report the throughput, the wall time per stage and the peak RSS as JSON,
+optionally compared with the report of a baseline run.
+'''
+
+import dataclasses
+import datetime
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+try:
+    # NOTE: Windows には resource モジュールがない
+    import resource
+except ImportError:
+    resource = None
+
+# 3-rd party modules
+
+from icecream import ic
+
+# local
+
+from .. import __version__
+from .. core.stage_timer import StageTimer
+
+from . datasets import (
+    DatasetSpec,
+    prepare_dataset,
+)
+from . scenarios import dict_scenarios
+
+BENCH_REPORT_VERSION = 1
+DEFAULT_THRESHOLD = 0.1
+COMPARED_METRICS = ['wall_seconds', 'peak_rss_bytes']
+
+@dataclasses.dataclass(frozen=True)
+class BenchCase:
+    scenario: str
+    dataset: DatasetSpec
+    output_format: str
+    engine: str = 'row'
+    stream: bool = False
+    jobs: int = 1
+
+    @property
+    def key(self) -> str:
+        '''
+        The key matching the results of the same case across the reports.
+        '''
+        key = f'{self.scenario}:{self.dataset.file_name}:{self.output_format}'
+        if self.engine != 'row':
+            key += f':engine={self.engine}'
+        if self.stream:
+            key += ':stream'
+        if self.jobs != 1:
+            key += f':jobs={self.jobs}'
+        return key
+
+def get_peak_rss() -> int | None:
+    '''
+    Return the peak RSS in bytes of this process and its waited children,
+    or None if it can not be measured.
+    '''
+    if resource is None:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    if sys.platform == 'darwin':
+        return peak
+    # NOTE: Linux では KiB 単位
+    return peak * 1024
+
+def run_case_in_process(
+    case: BenchCase,
+    input_file: str,
+    output_file: str,
+) -> dict[str, Any]:
+    '''
+    Convert the input file with the scenario of the case, expected to be
+    called in a fresh process so the peak RSS belongs to this case only.
+    '''
+    # NOTE: pandas などは計測する子プロセスでだけ読み込む
+    from .. core.convert import convert
+    # NOTE: CLI の既定と同じく ic の出力は計測に含めない
+    ic.disable()
+    scenario = dict_scenarios[case.scenario](case.dataset)
+    stage_timer = StageTimer()
+    rss_before = get_peak_rss()
+    start = time.perf_counter()
+    convert(
+        input_files = [input_file],
+        output_file = output_file,
+        list_actions = scenario.list_actions,
+        list_pick_columns = scenario.list_pick_columns,
+        stream = case.stream,
+        engine = case.engine,
+        jobs = case.jobs,
+        stage_timer = stage_timer,
+    )
+    wall_seconds = time.perf_counter() - start
+    stages = stage_timer.as_dict()
+    # NOTE: 設定の準備など、どの段階にも含まれない時間
+    stages['other'] = {
+        'seconds': wall_seconds - sum(stage['seconds'] for stage in stages.values()),
+        'calls': 1,
+    }
+    return {
+        'wall_seconds': wall_seconds,
+        'stages': stages,
+        'rss_before_bytes': rss_before,
+        'peak_rss_bytes': get_peak_rss(),
+    }
+
+def run_case(
+    case: BenchCase,
+    work_dir: str,
+    repeat: int = 3,
+) -> dict[str, Any]:
+    '''
+    Run the case repeat times, each in a new process, and summarize the runs
+    with the median times and the maximum peak RSS.
+    '''
+    input_file = prepare_dataset(case.dataset, work_dir)
+    output_dir = os.path.join(work_dir, 'output')
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(
+        output_dir, f'{case.scenario}.{case.output_format}'
+    )
+    context = multiprocessing.get_context('spawn')
+    runs = []
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            future = executor.submit(run_case_in_process, case, input_file, output_file)
+            runs.append(future.result())
+    os.remove(output_file)
+    wall_seconds = statistics.median(run['wall_seconds'] for run in runs)
+    stages = {}
+    for run in runs:
+        for stage in run['stages']:
+            stages.setdefault(stage, None)
+    for stage in stages:
+        stages[stage] = statistics.median(
+            run['stages'].get(stage, {}).get('seconds', 0.0) for run in runs
+        )
+    peak_rss = None
+    peak_rss_delta = None
+    if runs[0]['peak_rss_bytes'] is not None:
+        peak_rss = max(run['peak_rss_bytes'] for run in runs)
+        peak_rss_delta = max(
+            run['peak_rss_bytes'] - run['rss_before_bytes'] for run in runs
+        )
+    return {
+        'key': case.key,
+        'scenario': case.scenario,
+        'format': case.dataset.format,
+        'output_format': case.output_format,
+        'rows': case.dataset.rows,
+        'width': case.dataset.width,
+        'depth': case.dataset.depth,
+        'engine': case.engine,
+        'stream': case.stream,
+        'jobs': case.jobs,
+        'repeat': repeat,
+        'wall_seconds': wall_seconds,
+        'wall_seconds_min': min(run['wall_seconds'] for run in runs),
+        'rows_per_second': case.dataset.rows / wall_seconds,
+        'stages': stages,
+        'peak_rss_bytes': peak_rss,
+        'peak_rss_delta_bytes': peak_rss_delta,
+    }
+
+def compare_results(
+    results: list[dict[str, Any]],
+    baseline: dict[str, Any],
+    threshold: float = DEFAULT_THRESHOLD,
+) -> dict[str, Any]:
+    '''
+    Compare the results with the baseline report case by case, and flag the
+    metrics exceeding the baseline by more than the threshold ratio.
+    The cases missing in the baseline are not compared.
+    '''
+    dict_baseline = {
+        result['key']: result for result in baseline.get('results', [])
+    }
+    entries = []
+    for result in results:
+        base = dict_baseline.get(result['key'])
+        if base is None:
+            continue
+        for metric in COMPARED_METRICS:
+            value = result.get(metric)
+            base_value = base.get(metric)
+            if not value or not base_value:
+                continue
+            ratio = value / base_value
+            entries.append({
+                'key': result['key'],
+                'metric': metric,
+                'baseline': base_value,
+                'current': value,
+                'ratio': ratio,
+                'regression': ratio > 1 + threshold,
+            })
+    return {
+        'threshold': threshold,
+        'num_compared': len(entries),
+        'num_regressions': sum(entry['regression'] for entry in entries),
+        'entries': entries,
+    }
+
+def run_bench(
+    cases: list[BenchCase],
+    work_dir: str,
+    repeat: int = 3,
+    baseline: dict[str, Any] | None = None,
+    threshold: float = DEFAULT_THRESHOLD,
+) -> dict[str, Any]:
+    if repeat < 1:
+        raise ValueError(f'Invalid number of repeats: {repeat}')
+    for case in cases:
+        if case.scenario not in dict_scenarios:
+            raise ValueError(f'Unsupported scenario: {case.scenario}')
+    results = []
+    for case in cases:
+        ic(case.key)
+        results.append(run_case(case, work_dir, repeat))
+    report = {
+        'version': BENCH_REPORT_VERSION,
+        'created_at': datetime.datetime.now().astimezone().isoformat(),
+        'table_converter': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    if baseline is not None:
+        report['comparison'] = compare_results(results, baseline, threshold)
+    return report
@@ -0,0 +1,104 @@
+'''
+Representative configurations of the conversion for the benchmarks, given
+as the action and pick arguments of the command line.
+'''
+
+import dataclasses
+
+from typing import (
+    Callable,
+)
+
+from . datasets import DatasetSpec
+
+@dataclasses.dataclass
+class Scenario:
+    list_actions: list[str] | None = None
+    list_pick_columns: list[str] | None = None
+
+dict_scenarios: dict[str, Callable[[DatasetSpec], Scenario]] = {}
+
+def register_scenario(
+    name: str,
+):
+    def decorator(setup):
+        dict_scenarios[name] = setup
+        return setup
+    return decorator
+
+@register_scenario('copy')
+def setup_copy_scenario(
+    spec: DatasetSpec,
+) -> Scenario:
+    return Scenario()
+
+@register_scenario('pick')
+def setup_pick_scenario(
+    spec: DatasetSpec,
+) -> Scenario:
+    return Scenario(
+        list_pick_columns = ['id', 'name', 'score', f'deep={spec.deep_field}'],
+    )
+
+@register_scenario('assign-chain')
+def setup_assign_chain_scenario(
+    spec: DatasetSpec,
+) -> Scenario:
+    return Scenario(
+        list_actions = [
+            'assign:place=city||name',
+            'assign:value=missing??score',
+            f"assign:deep=(missing||{spec.deep_field})??'none'",
+            "assign:label=place??value??'unknown'",
+        ],
+        list_pick_columns = ['id', 'place', 'value', 'deep', 'label'],
+    )
+
+@register_scenario('filter')
+def setup_filter_scenario(
+    spec: DatasetSpec,
+) -> Scenario:
+    return Scenario(
+        list_actions = [
+            'filter-not-empty:score',
+            'filter:city!=city0',
+            'filter:name=~^name[0-4]',
+        ],
+        list_pick_columns = ['id', 'name', 'city', 'score'],
+    )
+
+@register_scenario('assign-id')
+def setup_assign_id_scenario(
+    spec: DatasetSpec,
+) -> Scenario:
+    return Scenario(
+        list_actions = [
+            'assign-id:name_id=name',
+            'assign-id:city_id=city:context=name',
+        ],
+        list_pick_columns = ['id', 'name_id', 'city_id'],
+    )
+
+@register_scenario('split-join')
+def setup_split_join_scenario(
+    spec: DatasetSpec,
+) -> Scenario:
+    return Scenario(
+        list_actions = [
+            'split:tag_list=tags:delimiter=;',
+            'join:tag_text=tag_list:delimiter=|',
+        ],
+        list_pick_columns = ['id', 'tag_text'],
+    )
+
+@register_scenario('assign-format')
+def setup_assign_format_scenario(
+    spec: DatasetSpec,
+) -> Scenario:
+    return Scenario(
+        list_actions = [
+            # NOTE: 書式の "." は属性の参照になるので入れ子の列は使わない
+            'assign-format:label={name}-{id}/{city}',
+        ],
+        list_pick_columns = ['id', 'label'],
+    )
@@ -0,0 +1,190 @@
+'''
+Startup time of the command line, running each command in a new interpreter
+on small synthetic tables, with the heavy modules it imported, so the cost
+paid on every invocation from the shell scripts can be tracked.
+'''
+
+import dataclasses
+import datetime
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from typing import Any
+
+# local
+
+from .. import __version__
+
+from . datasets import (
+    DatasetSpec,
+    prepare_dataset,
+)
+from . runner import (
+    DEFAULT_THRESHOLD,
+    compare_results,
+)
+from . scenarios import dict_scenarios
+
+STARTUP_REPORT_VERSION = 1
+HEAVY_MODULES = ['pandas', 'numpy', 'openpyxl', 'xlsxwriter', 'yaml']
+IMPORT_TIME_PREFIX = 'import time:'
+
+@dataclasses.dataclass(frozen=True)
+class StartupCase:
+    # NOTE: データセットがなければヘルプを表示するだけ
+    scenario: str = 'copy'
+    dataset: DatasetSpec | None = None
+
+    @property
+    def key(self) -> str:
+        if self.dataset is None:
+            return 'help'
+        return f'{self.scenario}:{self.dataset.file_name}'
+
+def get_command_args(
+    case: StartupCase,
+    work_dir: str,
+) -> list[str]:
+    if case.dataset is None:
+        return ['convert', '--help']
+    input_file = prepare_dataset(case.dataset, work_dir)
+    output_dir = os.path.join(work_dir, 'output')
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(
+        output_dir, f'{case.scenario}.{case.dataset.format}'
+    )
+    scenario = dict_scenarios[case.scenario](case.dataset)
+    args = ['convert', input_file, '--output', output_file]
+    if scenario.list_pick_columns:
+        args += ['--pick', *scenario.list_pick_columns]
+    if scenario.list_actions:
+        args += ['--do', *scenario.list_actions]
+    return args
+
+def get_command_env() -> dict[str, str]:
+    '''
+    Return the environment running this copy of the package rather than an
+    installed one.
+    '''
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env['PYTHONPATH'] = os.pathsep.join(
+        path for path in [root, env.get('PYTHONPATH')] if path
+    )
+    return env
+
+def run_command(
+    command: list[str],
+    env: dict[str, str],
+) -> tuple[float, str]:
+    '''
+    Run the command and return the wall time and the standard error.
+    '''
+    start = time.perf_counter()
+    result = subprocess.run(
+        command,
+        env = env,
+        stdout = subprocess.DEVNULL,
+        stderr = subprocess.PIPE,
+        text = True,
+    )
+    wall_seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(
+            f'Failed to run: {command}: {result.stderr[-1000:]}'
+        )
+    return wall_seconds, result.stderr
+
+def get_cli_command(
+    args: list[str],
+    python_options: list[str] | None = None,
+) -> list[str]:
+    return [sys.executable, *(python_options or []), '-m', 'table_converter.cli', *args]
+
+def parse_import_times(
+    stderr: str,
+) -> dict[str, float]:
+    '''
+    Return the cumulative import seconds of the heavy modules from the
+    output of -X importtime. The imports nested in a heavy module are also
+    counted in that module.
+    '''
+    import_seconds = {}
+    for line in stderr.splitlines():
+        if not line.startswith(IMPORT_TIME_PREFIX):
+            continue
+        fields = line[len(IMPORT_TIME_PREFIX):].split('|')
+        if len(fields) != 3:
+            continue
+        name = fields[2].strip()
+        if name in HEAVY_MODULES and fields[1].strip().isdigit():
+            import_seconds[name] = int(fields[1]) / 1e6
+    return import_seconds
+
+def run_startup_case(
+    case: StartupCase,
+    work_dir: str,
+    env: dict[str, str],
+    repeat: int = 10,
+) -> dict[str, Any]:
+    '''
+    Run the command of the case repeat times after a warm-up run, and once
+    more with -X importtime to find the heavy modules it imported.
+    '''
+    args = get_command_args(case, work_dir)
+    command = get_cli_command(args)
+    # NOTE: 初回は .pyc の生成やファイルキャッシュの影響を受けるので捨てる
+    run_command(command, env)
+    times = [run_command(command, env)[0] for _ in range(repeat)]
+    _, stderr = run_command(get_cli_command(args, ['-X', 'importtime']), env)
+    import_seconds = parse_import_times(stderr)
+    return {
+        'key': case.key,
+        'scenario': case.scenario if case.dataset else None,
+        'format': case.dataset.format if case.dataset else None,
+        'rows': case.dataset.rows if case.dataset else None,
+        'repeat': repeat,
+        'wall_seconds': statistics.median(times),
+        'wall_seconds_min': min(times),
+        'imported_modules': sorted(import_seconds),
+        'import_seconds': import_seconds,
+    }
+
+def run_startup_bench(
+    cases: list[StartupCase],
+    work_dir: str,
+    repeat: int = 10,
+    baseline: dict[str, Any] | None = None,
+    threshold: float = DEFAULT_THRESHOLD,
+) -> dict[str, Any]:
+    if repeat < 1:
+        raise ValueError(f'Invalid number of repeats: {repeat}')
+    for case in cases:
+        if case.scenario not in dict_scenarios:
+            raise ValueError(f'Unsupported scenario: {case.scenario}')
+    env = get_command_env()
+    # NOTE: インタプリタ自体の起動時間 (差し引いて比べるため)
+    python_command = [sys.executable, '-c', 'pass']
+    run_command(python_command, env)
+    python_seconds = statistics.median(
+        run_command(python_command, env)[0] for _ in range(repeat)
+    )
+    results = [
+        run_startup_case(case, work_dir, env, repeat) for case in cases
+    ]
+    report = {
+        'version': STARTUP_REPORT_VERSION,
+        'created_at': datetime.datetime.now().astimezone().isoformat(),
+        'table_converter': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'python_seconds': python_seconds,
+        'results': results,
+    }
+    if baseline is not None:
+        report['comparison'] = compare_results(results, baseline, threshold)
+    return report
@@ -39,6 +39,48 @@ def command_convert_tables(
     if parser is None:
         parse_and_run(command_parser)
 
+def command_bench(
+    parser: argparse.ArgumentParser|None = None,
+):
+    if parser is None:
+        command_parser = argparse.ArgumentParser(
+            description='Benchmark the conversion on synthetic tables.'
+        )
+    else:
+        command_parser = parser
+    from table_converter.commands.bench import setup_parser
+    setup_parser(command_parser)
+    if parser is None:
+        parse_and_run(command_parser)
+
+def command_bench_micro(
+    parser: argparse.ArgumentParser|None = None,
+):
+    if parser is None:
+        command_parser = argparse.ArgumentParser(
+            description='Benchmark the row helpers in isolation.'
+        )
+    else:
+        command_parser = parser
+    from table_converter.commands.bench_micro import setup_parser
+    setup_parser(command_parser)
+    if parser is None:
+        parse_and_run(command_parser)
+
+def command_bench_startup(
+    parser: argparse.ArgumentParser|None = None,
+):
+    if parser is None:
+        command_parser = argparse.ArgumentParser(
+            description='Benchmark the startup time of the command line.'
+        )
+    else:
+        command_parser = parser
+    from table_converter.commands.bench_startup import setup_parser
+    setup_parser(command_parser)
+    if parser is None:
+        parse_and_run(command_parser)
+
 def setup_common_args(
     parser: argparse.ArgumentParser,
 ):
@@ -60,6 +102,27 @@ def main():
     setup_common_args(parser_convert_tables)
     command_convert_tables(parser_convert_tables)
 
+    parser_bench = subparsers.add_parser(
+        'bench',
+        help='Benchmark the conversion on synthetic tables.'
+    )
+    setup_common_args(parser_bench)
+    command_bench(parser_bench)
+
+    parser_bench_micro = subparsers.add_parser(
+        'bench-micro',
+        help='Benchmark the row helpers in isolation.'
+    )
+    setup_common_args(parser_bench_micro)
+    command_bench_micro(parser_bench_micro)
+
+    parser_bench_startup = subparsers.add_parser(
+        'bench-startup',
+        help='Benchmark the startup time of the command line.'
+    )
+    setup_common_args(parser_bench_startup)
+    command_bench_startup(parser_bench_startup)
+
     parse_and_run(parser)
 
 if __name__ == '__main__':
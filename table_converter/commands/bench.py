@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import itertools
+import json
+import sys
+import tempfile
+
+from icecream import ic
+
+from .. bench.datasets import (
+    BASE_COLUMNS,
+    FORMATS,
+    DatasetSpec,
+)
+from .. bench.runner import (
+    DEFAULT_THRESHOLD,
+    BenchCase,
+    run_bench,
+)
+from .. bench.scenarios import dict_scenarios
+from .. core.constants import ENGINES
+
+def run(
+    args: argparse.Namespace,
+):
+    cases = []
+    for format, rows, width, depth, scenario in itertools.product(
+        args.formats, args.rows, args.widths, args.depths, args.scenarios,
+    ):
+        dataset = DatasetSpec(
+            format = format,
+            rows = rows,
+            width = width,
+            depth = depth,
+            seed = args.seed,
+        )
+        cases.append(BenchCase(
+            scenario = scenario,
+            dataset = dataset,
+            output_format = args.output_format or format,
+            engine = args.engine,
+            stream = args.stream,
+            jobs = args.jobs,
+        ))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    if args.work_dir:
+        report = run_bench(
+            cases, args.work_dir, args.repeat, baseline, args.threshold,
+        )
+    else:
+        with tempfile.TemporaryDirectory(prefix='table-converter-bench-') as work_dir:
+            report = run_bench(
+                cases, work_dir, args.repeat, baseline, args.threshold,
+            )
+    str_report = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            f.write(str_report + '\n')
+    else:
+        sys.stdout.write(str_report + '\n')
+    if baseline is not None:
+        comparison = report['comparison']
+        for entry in comparison['entries']:
+            if entry['regression']:
+                sys.stderr.write(
+                    f'Regression: {entry["key"]}: {entry["metric"]}: ' +
+                    f'{entry["baseline"]:.6g} -> {entry["current"]:.6g} ' +
+                    f'({entry["ratio"]:.2f}x)\n'
+                )
+        ic(comparison['num_compared'], comparison['num_regressions'])
+        if comparison['num_regressions'] > 0:
+            sys.exit(1)
+
+def parse_width(
+    value: str,
+) -> int:
+    '''
+    argparse type of --widths, rejecting the widths without the filler columns.
+    '''
+    try:
+        width = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid int value: {value!r}')
+    if width <= len(BASE_COLUMNS):
+        raise argparse.ArgumentTypeError(
+            f'must be greater than {len(BASE_COLUMNS)}: {width}'
+        )
+    return width
+
+def setup_parser(
+    parser: argparse.ArgumentParser,
+):
+    parser.add_argument(
+        '--formats',
+        nargs='+',
+        choices=FORMATS,
+        default=FORMATS,
+        help='Formats of the generated input files',
+    )
+    parser.add_argument(
+        '--rows',
+        nargs='+',
+        type=int,
+        default=[10000],
+        help='Numbers of rows of the generated input files',
+    )
+    parser.add_argument(
+        '--widths',
+        nargs='+',
+        type=parse_width,
+        default=[8],
+        help='Numbers of columns of the generated input files',
+    )
+    parser.add_argument(
+        '--depths',
+        nargs='+',
+        type=int,
+        default=[1],
+        help='Nesting depths of the columns of the generated input files',
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Random seed of the generated input files',
+    )
+    parser.add_argument(
+        '--scenarios',
+        nargs='+',
+        choices=list(dict_scenarios),
+        default=list(dict_scenarios),
+        help='Conversion scenarios to run',
+    )
+    parser.add_argument(
+        '--output-format',
+        choices=FORMATS,
+        help='Format of the converted files (the input format by default)',
+    )
+    parser.add_argument(
+        '--repeat', '-r',
+        type=int,
+        default=3,
+        help='Number of runs of each case, each in a new process',
+    )
+    parser.add_argument(
+        '--engine',
+        choices=ENGINES,
+        default='row',
+        help='Execution engine passed to the conversion',
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Convert in the streaming mode',
+    )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help='Number of processes passed to the conversion',
+    )
+    parser.add_argument(
+        '--work-dir',
+        metavar='WORK_DIR',
+        help='Directory keeping the generated input files across runs (a temporary directory by default)',
+    )
+    parser.add_argument(
+        '--output-file', '--output', '-o',
+        metavar='OUTPUT_FILE',
+        help='Path to the JSON report (the standard output by default)',
+    )
+    parser.add_argument(
+        '--baseline', '-b',
+        metavar='BASELINE_FILE',
+        help='JSON report of a baseline run to compare with, exiting with 1 on regressions',
+    )
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help='Ratio over the baseline flagged as a regression (0.1 for 10%%)',
+    )
+    parser.set_defaults(handler=run)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import sys
+
+from collections import defaultdict
+
+from .. bench.micro import (
+    dict_micro_helpers,
+    load_function,
+    run_micro_bench,
+)
+
+def run(
+    args: argparse.Namespace,
+):
+    alternatives = defaultdict(dict)
+    for str_impl in args.implementations or []:
+        if '=' not in str_impl:
+            raise ValueError(f'Expected "helper=module:name": {str_impl!r}')
+        helper_name, path = str_impl.split('=', 1)
+        helper_name = helper_name.strip()
+        if helper_name not in dict_micro_helpers:
+            raise ValueError(f'Unsupported helper: {helper_name}')
+        alternatives[helper_name][path.strip()] = load_function(path.strip())
+    report = run_micro_bench(
+        helper_names = args.helpers,
+        depths = args.depths,
+        widths = args.widths,
+        hit_ratios = args.hit_ratios,
+        calls = args.calls,
+        repeat = args.repeat,
+        number = args.number,
+        alternatives = alternatives,
+        seed = args.seed,
+    )
+    str_report = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            f.write(str_report + '\n')
+    else:
+        sys.stdout.write(str_report + '\n')
+    for result in report['results']:
+        if result.get('matches_default') is False:
+            sys.stderr.write(
+                f'Mismatch: {result["helper"]}: {result["implementation"]}: ' +
+                f'depth={result["depth"]}, width={result["width"]}, ' +
+                f'hit_ratio={result["hit_ratio"]}\n'
+            )
+
+def setup_parser(
+    parser: argparse.ArgumentParser,
+):
+    parser.add_argument(
+        '--helpers',
+        nargs='+',
+        choices=list(dict_micro_helpers),
+        default=list(dict_micro_helpers),
+        help='Helpers to benchmark',
+    )
+    parser.add_argument(
+        '--depths',
+        nargs='+',
+        type=int,
+        default=[1, 3, 5],
+        help='Key depths of the rows',
+    )
+    parser.add_argument(
+        '--widths',
+        nargs='+',
+        type=int,
+        default=[10, 50],
+        help='Numbers of the leaf columns of the rows',
+    )
+    parser.add_argument(
+        '--hit-ratios',
+        nargs='+',
+        type=float,
+        default=[1.0, 0.5, 0.0],
+        help='Ratios of the keys found in the rows',
+    )
+    parser.add_argument(
+        '--calls',
+        type=int,
+        default=1000,
+        help='Number of calls of the helper per loop',
+    )
+    parser.add_argument(
+        '--repeat', '-r',
+        type=int,
+        default=5,
+        help='Number of the timed repeats of the loops',
+    )
+    parser.add_argument(
+        '--number', '-n',
+        type=int,
+        help='Number of loops per repeat (calibrated to take at least 0.2 seconds by default)',
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Random seed of the generated rows',
+    )
+    parser.add_argument(
+        '--impl',
+        dest='implementations',
+        metavar='HELPER=MODULE:NAME',
+        nargs='+',
+        help='Alternative implementations of the helpers to compare with the default ones',
+    )
+    parser.add_argument(
+        '--output-file', '--output', '-o',
+        metavar='OUTPUT_FILE',
+        help='Path to the JSON report (the standard output by default)',
+    )
+    parser.set_defaults(handler=run)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import sys
+import tempfile
+
+from icecream import ic
+
+from .. bench.datasets import (
+    FORMATS,
+    DatasetSpec,
+)
+from .. bench.runner import DEFAULT_THRESHOLD
+from .. bench.scenarios import dict_scenarios
+from .. bench.startup import (
+    StartupCase,
+    run_startup_bench,
+)
+
+def run(
+    args: argparse.Namespace,
+):
+    cases = [StartupCase()]
+    for format in args.formats:
+        for scenario in args.scenarios:
+            cases.append(StartupCase(
+                scenario = scenario,
+                dataset = DatasetSpec(
+                    format = format,
+                    rows = args.rows,
+                    seed = args.seed,
+                ),
+            ))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    if args.work_dir:
+        report = run_startup_bench(
+            cases, args.work_dir, args.repeat, baseline, args.threshold,
+        )
+    else:
+        with tempfile.TemporaryDirectory(prefix='table-converter-startup-') as work_dir:
+            report = run_startup_bench(
+                cases, work_dir, args.repeat, baseline, args.threshold,
+            )
+    str_report = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            f.write(str_report + '\n')
+    else:
+        sys.stdout.write(str_report + '\n')
+    if baseline is not None:
+        comparison = report['comparison']
+        for entry in comparison['entries']:
+            if entry['regression']:
+                sys.stderr.write(
+                    f'Regression: {entry["key"]}: {entry["metric"]}: ' +
+                    f'{entry["baseline"]:.6g} -> {entry["current"]:.6g} ' +
+                    f'({entry["ratio"]:.2f}x)\n'
+                )
+        ic(comparison['num_compared'], comparison['num_regressions'])
+        if comparison['num_regressions'] > 0:
+            sys.exit(1)
+
+def setup_parser(
+    parser: argparse.ArgumentParser,
+):
+    parser.add_argument(
+        '--formats',
+        nargs='+',
+        choices=FORMATS,
+        default=FORMATS,
+        help='Formats of the converted files (the help is always measured)',
+    )
+    parser.add_argument(
+        '--scenarios',
+        nargs='+',
+        choices=list(dict_scenarios),
+        default=['copy'],
+        help='Conversion scenarios to run',
+    )
+    parser.add_argument(
+        '--rows',
+        type=int,
+        default=10,
+        help='Number of rows of the generated input files',
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Random seed of the generated input files',
+    )
+    parser.add_argument(
+        '--repeat', '-r',
+        type=int,
+        default=10,
+        help='Number of timed runs of each command, each in a new interpreter',
+    )
+    parser.add_argument(
+        '--work-dir',
+        metavar='WORK_DIR',
+        help='Directory keeping the generated input files across runs (a temporary directory by default)',
+    )
+    parser.add_argument(
+        '--output-file', '--output', '-o',
+        metavar='OUTPUT_FILE',
+        help='Path to the JSON report (the standard output by default)',
+    )
+    parser.add_argument(
+        '--baseline', '-b',
+        metavar='BASELINE_FILE',
+        help='JSON report of a baseline run to compare with, exiting with 1 on regressions',
+    )
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help='Ratio over the baseline flagged as a regression (0.1 for 10%%)',
+    )
+    parser.set_defaults(handler=run)
@@ -1,13 +1,73 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import json
+import sys
+import time
+
+from typing import Callable
 
 from icecream import ic
 
-from .. core.convert import convert
+from .. core.constants import (
+    DEFAULT_CHUNK_SIZE,
+    ENGINES,
+)
+from .. core.memory_tracker import (
+    MemoryTracker,
+    format_memory_report,
+    get_memory_report,
+)
+from .. core.stage_timer import (
+    StageTimer,
+    format_stage_report,
+    get_stage_report,
+)
 
 def run(
     args: argparse.Namespace,
+):
+    # NOTE: pandas の読み込みに時間がかかるため、--help などでは読み込まず、
+    # 変換するときに計測の前に読み込む
+    from .. core.convert import convert
+    stage_timer = None
+    profile = bool(args.profile or args.profile_output)
+    memory_tracker = None
+    if args.memory_report or args.memory_report_output:
+        memory_tracker = MemoryTracker()
+    if profile or memory_tracker:
+        stage_timer = StageTimer(detailed=profile, memory=memory_tracker)
+    if memory_tracker:
+        memory_tracker.start()
+    start = time.perf_counter()
+    try:
+        run_convert(convert, args, stage_timer)
+    finally:
+        if memory_tracker:
+            memory_tracker.stop()
+    if profile:
+        report = get_stage_report(stage_timer, time.perf_counter() - start)
+        sys.stderr.write(format_stage_report(report))
+        if args.profile_output:
+            write_json_report(report, args.profile_output)
+    if memory_tracker:
+        report = get_memory_report(memory_tracker)
+        sys.stderr.write(format_memory_report(report))
+        if args.memory_report_output:
+            write_json_report(report, args.memory_report_output)
+
+def write_json_report(
+    report: dict,
+    output_file: str,
+):
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+def run_convert(
+    convert: Callable,
+    args: argparse.Namespace,
+    stage_timer: StageTimer | None = None,
 ):
     convert(
         input_files = args.input_files,
@@ -20,6 +80,15 @@ def run(
         output_debug = args.output_debug,
         verbose = args.verbose,
         ignore_file_rows = args.ignore_file_rows,
+        stream = args.stream,
+        chunk_size = args.chunk_size,
+        engine = args.engine,
+        jobs = args.jobs,
+        id_registry = args.id_registry,
+        cache_dir = args.cache_dir,
+        compact_json = args.compact_json,
+        nest_jsonl = args.nest_jsonl,
+        stage_timer = stage_timer,
     )
 
 def setup_parser(
@@ -70,11 +139,77 @@ def setup_parser(
         '--ignore-file-rows', '--ignore-rows', '--ignore',
         nargs='+',
         type=str,
-        help='Ignore tuples of file name and row index',
+        help='Ignore the rows given as "file:index" or "file:start-end" (inclusive)',
     )
     parser.add_argument(
         '--output-debug',
         action='store_true',
         help='Output debug information',
     )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Read, convert and write rows in chunks to bound the memory usage (the value types are inferred per chunk)',
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help='Number of rows per chunk in the streaming mode',
+    )
+    parser.add_argument(
+        '--engine',
+        choices=ENGINES,
+        default='row',
+        help='Execution engine: "columnar" runs the column-local actions on whole columns ' +
+            'and falls back to "row" when it can not, "compare" runs both and checks the results',
+    )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help='Number of processes converting the input files (or the chunks in the streaming mode) in parallel',
+    )
+    parser.add_argument(
+        '--id-registry',
+        metavar='ID_REGISTRY_FILE',
+        help='Path to the SQLite file keeping the IDs assigned by assign-id across runs',
+    )
+    parser.add_argument(
+        '--cache-dir',
+        metavar='CACHE_DIR',
+        help='Directory caching the converted input files, which are not converted again while unchanged',
+    )
+    parser.add_argument(
+        '--compact-json',
+        action='store_true',
+        help='Write the JSON output without indent, one row per line',
+    )
+    parser.add_argument(
+        '--nest-jsonl',
+        action='store_true',
+        help='Nest the dotted keys in the JSON Lines output as in the JSON output',
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Print the cumulative time and the number of calls of each stage and action, ' +
+            'ranked by the time (the workers of --jobs are measured as a whole)',
+    )
+    parser.add_argument(
+        '--profile-output',
+        metavar='PROFILE_FILE',
+        help='Path to the JSON file of the profile (implies --profile)',
+    )
+    parser.add_argument(
+        '--memory-report',
+        action='store_true',
+        help='Print the peak and the retained memory of each stage and input file, ' +
+            'traced with tracemalloc (slower) and sampled as the RSS',
+    )
+    parser.add_argument(
+        '--memory-report-output',
+        metavar='MEMORY_REPORT_FILE',
+        help='Path to the JSON file of the memory report (implies --memory-report)',
+    )
     parser.set_defaults(handler=run)
@@ -5,11 +5,13 @@ Actions are used to transform the data in the table.
 import ast
 import json
 import re
+import string
 
 from collections import OrderedDict
 from dataclasses import dataclass
 from typing import (
     Any,
+    Callable,
 )
 
 from icecream import ic
@@ -24,6 +26,7 @@ from . constants import (
 )
 
 from . types import (
+    ActionConfig,
     AssignConfig,
     AssignConstantConfig,
     AssignFormatConfig,
@@ -31,23 +34,40 @@ from . types import (
     FilterConfig,
     GlobalStatus,
     JoinConfig,
+    LocalId,
     OmitConfig,
     ParseConfig,
     PickConfig,
     SplitConfig,
     Row,
+    is_missing_value,
 )
 
-from . functions.assign_id import assign_id
+from . expressions import (
+    ColumnExpression,
+    Expression,
+    LiteralExpression,
+    get_expression_columns,
+    iter_fallback_chain,
+    parse_expression,
+)
+from . functions.assign_id import get_or_assign_context_id
 from . functions.flatten_row import flatten_row
+from . functions.get_nested_field_value import get_nested_field_value
 from . functions.nest_row import nest_row
-from . functions.search_column_value import search_column_value
-from . functions.set_flat_field_value import set_flat_field_value
+from . functions.nest_value import nest_value
+from . functions.search_column_value import (
+    compile_column_search,
+    search_row_value,
+)
 from . functions.set_row_value import (
     set_row_staging_value,
+    set_row_value,
 )
 from . functions.set_nested_field_value import set_nested_field_value
 
+type ActionFunction = Callable[[GlobalStatus, Row], Row | None]
+
 def setup_actions_with_args(
     config: Config,
     list_actions: list[str],
@@ -268,48 +288,62 @@ def setup_filter_action(
         f'Unsupported filter: {str_filter}'
     )
 
-def do_actions(
-    status: GlobalStatus,
-    row: Row,
-    actions: list[AssignConstantConfig],
-):
-    for action in actions:
-        row = do_action(status, row, action)
-        if row is None:
-            return None
-    return row
+def compile_actions(
+    actions: list[ActionConfig],
+) -> list[ActionFunction]:
+    '''
+    Compile the configured actions into a plan: a list of functions taking
+    the global status and a row, and returning the row or None if the row is
+    filtered out. The per-action invariant work is done here once.
+    '''
+    return [compile_action(action) for action in actions]
 
-def do_action(
-    status: GlobalStatus,
-    row: Row,
-    action: AssignConstantConfig,
-):
+def compile_action(
+    action: ActionConfig,
+) -> ActionFunction:
     if isinstance(action, AssignConfig):
-        return assign(row, action)
+        return compile_assign(action)
     if isinstance(action, AssignConstantConfig):
-        return assign_constant(row, action)
+        return compile_assign_constant(action)
     if isinstance(action, AssignFormatConfig):
-        return assign_format(row, action)
+        return compile_assign_format(action)
     if isinstance(action, AssignIdConfig):
-        return assign_id(status.id_context_map, row, action)
+        return compile_assign_id(action)
     if isinstance(action, FilterConfig):
-        if filter_row(row, action):
-            return row
-        return None
+        return compile_filter(action)
     if isinstance(action, JoinConfig):
-        return join_field(row, action)
+        return compile_join_field(action)
     if isinstance(action, ParseConfig):
-        return parse(row, action)
+        return compile_parse(action)
     if isinstance(action, OmitConfig):
-        return omit_field(row, action)
+        return compile_omit_field(action)
     if isinstance(action, SplitConfig):
-        return split_field(row, action)
+        return compile_split_field(action)
     raise ValueError(
         f'Unsupported action: {action}'
     )
 
+def do_actions(
+    status: GlobalStatus,
+    row: Row,
+    plan: list[ActionFunction],
+):
+    for action in plan:
+        row = action(status, row)
+        if row is None:
+            return None
+    return row
+
+def do_action(
+    status: GlobalStatus,
+    row: Row,
+    action: ActionConfig,
+):
+    return compile_action(action)(status, row)
+
 def prepare_row(
     flat_row: OrderedDict | None = None,
+    columns: frozenset[str] | None = None,
 ):
     if flat_row is None:
         flat_row = OrderedDict()
@@ -319,19 +353,10 @@ def prepare_row(
         ic(flat_row)
         raise
     return Row(
-        flat = OrderedDict(flat_row),
         nested = nested_row,
+        columns = columns,
     )
 
-def delete_flat_row_value(
-    flat_row: OrderedDict,
-    target: str,
-):
-    prefix = f'{target}.'
-    for key in list(flat_row.keys()):
-        if key == target or key.startswith(prefix):
-            del flat_row[key]
-
 def pop_nested_row_value(
     nested_row: OrderedDict,
     key: str,
@@ -349,7 +374,6 @@ def pop_row_value(
     key: str,
     default: Any = None,
 ):
-    delete_flat_row_value(row.flat, key)
     return pop_nested_row_value(row.nested, key, default)
 
 def pop_row_staging(
@@ -358,31 +382,68 @@ def pop_row_staging(
 ):
     return pop_row_value(row, STAGING_FIELD, default)
 
+def discard_row_staging(
+    row: Row,
+):
+    '''
+    Same as pop_row_staging without returning the staging, so the input
+    snapshot of a row bound to a schema is not built.
+    '''
+    if row.values is not None:
+        row.staging = None
+    else:
+        row.nested.pop(STAGING_FIELD, None)
+
+def compile_assign_constant(
+    config: AssignConstantConfig,
+) -> ActionFunction:
+    target = f'{STAGING_FIELD}.{config.target}'
+    value = config.value
+    def run(status: GlobalStatus, row: Row):
+        set_row_value(row, target, value)
+        return row
+    return run
+
 def assign_constant(
     row: Row,
     config: AssignConstantConfig,
 ):
-    set_row_staging_value(row, config.target, config.value)
-    return row
+    return compile_assign_constant(config)(None, row)
+
+def compile_split_field(
+    config: SplitConfig,
+) -> ActionFunction:
+    search = compile_column_search(config.source)
+    target = f'{STAGING_FIELD}.{config.target}'
+    delimiter = config.delimiter
+    def run(status: GlobalStatus, row: Row):
+        value, found = search(row)
+        if found:
+            if isinstance(value, str):
+                new_value = value.split(delimiter)
+                new_value = map(str.strip, new_value)
+                new_value = list(filter(None, new_value))
+                value = new_value
+            set_row_value(row, target, value)
+        return row
+    return run
 
 def split_field(
     row: Row,
     config: SplitConfig,
 ):
-    value, found = search_column_value(row.flat, config.source)
-    if found:
-        if isinstance(value, str):
-            new_value = value.split(config.delimiter)
-            new_value = map(str.strip, new_value)
-            new_value = list(filter(None, new_value))
-            value = new_value
-        set_row_staging_value(row, config.target, value)
-    return row
+    return compile_split_field(config)(None, row)
 
 def remap_columns(
     row: Row,
     list_config: list[PickConfig],
+    keep_staging: bool = True,
 ):
+    '''
+    Pick the fields of the row into a new row. The fields not picked are
+    moved into the staging, unless keep_staging is False because the
+    staging is discarded afterwards.
+    '''
     if not list_config:
         list_config = []
         for key in row.nested[STAGING_FIELD][INPUT_FIELD].keys():
@@ -390,108 +451,256 @@ def remap_columns(
                 source = key,
                 target = key,
             ))
-    new_flat_row = OrderedDict()
+    new_nested_row = OrderedDict()
     picked = []
     for config in list_config:
-        value, key = search_column_value(row.nested, config.source)
+        value, key = search_row_value(row, config.source)
         if key:
-            set_flat_field_value(new_flat_row, config.target, value)
+            set_nested_field_value(new_nested_row, config.target, nest_value(value))
             picked.append(key)
-    for key in row.flat.keys():
+    if not keep_staging:
+        row.nested = new_nested_row
+        row.columns = None
+        return row
+    flat_row = row.flat
+    for key, value in flat_row.items():
         if key in picked:
             if not key.startswith(f'{STAGING_FIELD}.{INPUT_FIELD}.'):
                 continue
-        if key in new_flat_row:
+        if get_nested_field_value(new_nested_row, key)[1]:
             continue
         if key.startswith(f'{STAGING_FIELD}.'):
             # NOTE: Skip staging fields
-            new_flat_row[key] = row.flat[key]
+            set_nested_field_value(new_nested_row, key, value)
         else:
             input_key = f'{STAGING_FIELD}.{INPUT_FIELD}.{key}'
-            if input_key in row.flat:
-                value = row.flat[key]
-                input_value = row.flat[input_key]
+            if input_key in flat_row:
+                input_value = flat_row[input_key]
                 if value == input_value:
                     # NOTE: Skip if the same value in the input field
                     continue
             # NOTE: Set the unused value to the staging field
-            new_flat_row[f'{STAGING_FIELD}.{key}'] = row.flat[key]
-    row.flat = new_flat_row
-    row.nested = nest_row(new_flat_row)
+            set_nested_field_value(new_nested_row, f'{STAGING_FIELD}.{key}', value)
+    row.nested = new_nested_row
+    row.columns = None
     return row
 
+def compile_search_expression(
+    expression: Expression,
+) -> Callable[[Row], tuple[Any, str | None]]:
+    '''
+    Return a function evaluating the parsed source expression on a row.
+    The chain of the fallback operators is searched in a loop.
+    '''
+    if isinstance(expression, ColumnExpression):
+        return compile_column_search(expression.column)
+    if isinstance(expression, LiteralExpression):
+        value = expression.value
+        text = expression.text
+        return lambda row: (value, text)
+    chain = list(iter_fallback_chain(expression))
+    search_last = compile_search_expression(chain[-1][0])
+    pairs = [
+        (compile_search_expression(operand), operator)
+        for operand, operator in chain[:-1]
+    ]
+    def search(row: Row):
+        for search_column, operator in pairs:
+            value, found = search_column(row)
+            if operator == '||':
+                if bool(value):
+                    return value, found
+            if operator == '??':
+                if found and value is not None:
+                    return value, found
+        return search_last(row)
+    return search
+
+def compile_search_with_operator(
+    source: str,
+) -> Callable[[Row], tuple[Any, str | None]]:
+    '''
+    Parse the source with the fallback operators ("||" and "??") once and
+    return a function searching the operands in order.
+    '''
+    return compile_search_expression(parse_expression(source))
 
 def search_with_operator(
     row: Row,
     source: str,
 ):
-    or_operator = '\|\|'
-    null_or_operator = '\?\?'
-    operator_group = f'{or_operator}|{null_or_operator}'
-    matched = re.split(f'({operator_group})', source, 1)
-    #ic(source, matched)
-    if len(matched) == 1:
-        return search_column_value(row.nested, source)
-    matched = map(str.strip, matched)
-    left, operator, rest = matched
-    value, found = search_column_value(row.nested, left)
-    if operator == '||':
-        if bool(value):
-            return value, found
-    if operator == '??':
-        if found and value is not None:
-            return value, found
-    return search_with_operator(row, rest)
+    return compile_search_with_operator(source)(row)
+
+def compile_assign(
+    config: AssignConfig,
+) -> ActionFunction:
+    search = compile_search_with_operator(config.source)
+    target = f'{STAGING_FIELD}.{config.target}'
+    source = config.source
+    required = config.required
+    assign_default = config.assign_default
+    default_value = config.default_value
+    def run(status: GlobalStatus, row: Row):
+        value, found = search(row)
+        if required:
+            if not found or bool(value) == False:
+                raise ValueError(
+                    'Required field not found or empty, ' +
+                    f'field: {source}, found: {found}, value: {value}'
+                )
+        if found:
+            set_row_value(row, target, value)
+        else:
+            if assign_default:
+                set_row_value(row, target, default_value)
+        return row
+    return run
 
 def assign(
     row: Row,
     config: AssignConfig,
 ):
-    value, found = search_with_operator(row, config.source)
-    if config.required:
-        if not found or bool(value) == False:
-            raise ValueError(
-                'Required field not found or empty, ' +
-                f'field: {config.source}, found: {found}, value: {value}'
-            )
-    if found:
-        set_row_staging_value(row, config.target, value)
-    else:
-        if config.assign_default:
-            set_row_staging_value(row, config.target, config.default_value)
-    return row
+    return compile_assign(config)(None, row)
 
-def assign_format(
+def get_flat_leaf(
+    mapping: Any,
+    key: str,
+) -> tuple[Any, bool]:
+    '''
+    Return the value of the key if it is a leaf of the flat view, where only
+    the OrderedDict values are expanded.
+    '''
+    if not isinstance(mapping, OrderedDict) or key not in mapping:
+        return None, False
+    value = mapping[key]
+    if isinstance(value, OrderedDict):
+        return None, False
+    return value, True
+
+def get_value_leaf(
     row: Row,
+    name: str,
+) -> tuple[Any, bool]:
+    '''
+    get_flat_leaf in the values of a row bound to a schema.
+    '''
+    found = row.schema.find_path((name,))
+    if found is None or found[0] < 0 or found[1]:
+        return None, False
+    value = row.values[found[0]]
+    if is_missing_value(value) or isinstance(value, OrderedDict):
+        return None, False
+    return value, True
+
+def get_format_param(
+    row: Row,
+    name: str,
+) -> tuple[Any, bool]:
+    '''
+    Return the value of a format parameter as found in the flat view: the
+    top level field, otherwise the staging field or the field of the input
+    snapshot, whichever comes later in the staging.
+    '''
+    if row.values is not None:
+        value, found = get_value_leaf(row, name)
+        if found:
+            return value, True
+        # NOTE: 入力のスナップショットは値のリストと同じなので見つからない
+        return get_flat_leaf(row.staging, name)
+    nested_row = row.nested
+    value, found = get_flat_leaf(nested_row, name)
+    if found:
+        return value, True
+    staging = nested_row.get(STAGING_FIELD)
+    staging_value, staging_found = get_flat_leaf(staging, name)
+    input_value, input_found = get_flat_leaf(
+        staging.get(INPUT_FIELD) if isinstance(staging, OrderedDict) else None, name,
+    )
+    if staging_found and input_found:
+        # NOTE: フラットなビューでは後に現れる方で上書きされていた
+        for key in staging:
+            if key == name:
+                return input_value, True
+            if key == INPUT_FIELD:
+                return staging_value, True
+    if staging_found:
+        return staging_value, True
+    if input_found:
+        return input_value, True
+    return None, False
+
+def compile_assign_format(
     config: AssignFormatConfig,
-):
+) -> ActionFunction:
+    '''
+    The template is parsed once, and only the parameters referenced by the
+    template are looked up. The missing parameters are given the undefined
+    marker.
+    '''
     template = config.format
-    params = {}
-    for key, value in row.flat.items():
-        for prefix in [
-            f'{STAGING_FIELD}.{INPUT_FIELD}.',
-            f'{STAGING_FIELD}.',
-        ]:
-            if key.startswith(prefix):
-                rest = key[len(prefix):]
-                params[rest] = value
-    params.update(row.flat)
-    formatted = None
-    while formatted is None:
+    target = config.target
+    # NOTE: 空や数字の名前は位置引数になる
+    names = [
+        name for name in dict.fromkeys(get_format_fields(template))
+        if name and not name.isdigit()
+    ]
+    undefined = {name: f'__{name}__undefined__' for name in names}
+    def run(status: GlobalStatus, row: Row):
+        params = {}
+        for name in names:
+            value, found = get_format_param(row, name)
+            params[name] = value if found else undefined[name]
         try:
             formatted = template.format(**params)
-        except KeyError as e:
-            #ic(e)
-            #ic(e.args)
-            #ic(e.args[0])
-            key = e.args[0]
-            params[key] = f'__{key}__undefined__'
         except:
-            #ic(params)
             ic(params.keys())
             raise
-    set_row_staging_value(row, config.target, formatted)
-    return row
+        set_row_staging_value(row, target, formatted)
+        return row
+    return run
+
+def compile_assign_id(
+    config: AssignIdConfig,
+) -> ActionFunction:
+    context_columns = tuple(config.context or [])
+    primary_columns = tuple(config.primary)
+    context_searches = [
+        (column, compile_column_search(column)) for column in context_columns
+    ]
+    primary_searches = [
+        (column, compile_column_search(column)) for column in primary_columns
+    ]
+    target = f'{STAGING_FIELD}.{config.target}'
+    def run(status: GlobalStatus, row: Row):
+        context_values = []
+        for column, search in context_searches:
+            value, found = search(row)
+            if not found:
+                raise KeyError(f'Column not found: {column}, existing columns: {row.flat.keys()}')
+            context_values.append(value)
+        primary_values = []
+        for column, search in primary_searches:
+            value, found = search(row)
+            if not found:
+                raise KeyError(f'Column not found: {column}, existing columns: {row.flat.keys()}')
+            primary_values.append(value)
+        context_key = (
+            context_columns,
+            tuple(context_values),
+            primary_columns,
+        )
+        field_id = get_or_assign_context_id(status, context_key, tuple(primary_values))
+        if status.defer_ids:
+            field_id = LocalId(context_key, field_id)
+        set_row_value(row, target, field_id)
+        return row
+    return run
+
+def assign_format(
+    row: Row,
+    config: AssignFormatConfig,
+):
+    return compile_assign_format(config)(None, row)
 
 def check_empty(
     value: Any,
@@ -501,101 +710,269 @@ def check_empty(
         return True
     return not bool(value)
 
-def filter_row(
-    row: Row,
-    config: list[FilterConfig],
-):
-    value, found = search_column_value(row.nested, config.field)
-    #ic(config, value, found)
+def compile_filter_predicate(
+    config: FilterConfig,
+) -> Callable[[Row], bool]:
+    '''
+    Return a function deciding whether the row should be kept.
+    The operator is resolved here instead of for every row.
+    '''
+    search = compile_column_search(config.field)
+    config_value = config.value
     if config.operator == '==':
-        if not found:
-            return False
-        if value != config.value and str(value) != str(config.value):
-            return False
+        str_value = str(config_value)
+        def predicate(row: Row):
+            value, found = search(row)
+            if not found:
+                return False
+            if value != config_value and str(value) != str_value:
+                return False
+            return True
     elif config.operator == '!=':
-        if str(value) == str(config.value) or value == config.value:
-            return False
+        str_value = str(config_value)
+        def predicate(row: Row):
+            value, found = search(row)
+            if str(value) == str_value or value == config_value:
+                return False
+            return True
     elif config.operator == '=~':
-        if not found:
-            return False
-        if not re.search(config.value, value):
-            return False
-    elif config.operator == 'not-in':
-        if isinstance(config.value, list):
-            if value in config.value:
+        pattern = re.compile(config_value)
+        def predicate(row: Row):
+            value, found = search(row)
+            if not found:
                 return False
-            if str(value) in config.value:
+            if not pattern.search(value):
                 return False
-        else:
+            return True
+    elif config.operator == 'not-in':
+        if not isinstance(config_value, list):
             raise ValueError(f'Unsupported filter value type: type{config.value}')
+        def predicate(row: Row):
+            value, found = search(row)
+            if value in config_value:
+                return False
+            if str(value) in config_value:
+                return False
+            return True
     elif config.operator == 'empty':
-        if not check_empty(value, found):
-            return False
+        def predicate(row: Row):
+            value, found = search(row)
+            return check_empty(value, found)
     elif config.operator == 'not-empty':
-        if check_empty(value, found):
-            return False
+        def predicate(row: Row):
+            value, found = search(row)
+            return not check_empty(value, found)
     else:
         raise ValueError(f'Unsupported operator: {config.operator}')
-    return True
+    return predicate
+
+def compile_filter(
+    config: FilterConfig,
+) -> ActionFunction:
+    predicate = compile_filter_predicate(config)
+    def run(status: GlobalStatus, row: Row):
+        if predicate(row):
+            return row
+        return None
+    return run
+
+def filter_row(
+    row: Row,
+    config: FilterConfig,
+):
+    return compile_filter_predicate(config)(row)
+
+def compile_omit_field(
+    config: OmitConfig,
+) -> ActionFunction:
+    field = config.field
+    target = f'{STAGING_FIELD}.{config.field}'
+    def run(status: GlobalStatus, row: Row):
+        value, found = pop_row_value(row, field)
+        if not found:
+            return row
+        if not get_nested_field_value(row.nested, target)[1]:
+            set_row_value(row, target, value)
+        return row
+    return run
 
 def omit_field(
     row: Row,
     config: OmitConfig,
 ):
-    value, found = pop_row_value(row, config.field)
-    if not found:
+    return compile_omit_field(config)(None, row)
+
+def compile_join_field(
+    config: JoinConfig,
+) -> ActionFunction:
+    search = compile_column_search(config.source)
+    target = f'{STAGING_FIELD}.{config.target}'
+    delimiter = config.delimiter
+    if delimiter is None:
+        delimiter = ';'
+    if delimiter == '\\n':
+        delimiter = '\n'
+    def run(status: GlobalStatus, row: Row):
+        value, found = search(row)
+        if found:
+            if isinstance(value, list):
+                value = delimiter.join(value)
+            set_row_value(row, target, value)
         return row
-    if f'{STAGING_FIELD}.{config.field}' not in row.flat:
-        set_row_staging_value(row, config.field, value)
-    return row
+    return run
 
 def join_field(
     row: Row,
     config: JoinConfig,
 ):
-    value, found = search_column_value(row.nested, config.source)
-    if found:
-        delimiter = config.delimiter
-        if delimiter is None:
-            delimiter = ';'
-        if delimiter == '\\n':
-            delimiter = '\n'
-        if isinstance(value, list):
-            value = delimiter.join(value)
-        set_row_staging_value(row, config.target, value)
-    return row
+    return compile_join_field(config)(None, row)
 
-def parse(
-    row: Row,
-    config: AssignConfig,
+def parse_literal(
+    value: str,
 ):
-    value, found = search_column_value(row.nested, config.source)
-    if config.required:
-        if not found:
-            raise ValueError(
-                f'Required field not found, field: {config.source}'
-            )
-    if found:
-        if type(value) == str:
-            if config.as_type == 'literal':
-                try:
-                    parsed = ast.literal_eval(value)
-                except:
-                    raise ValueError(
-                        f'Failed to parse literal: {value}'
-                    )
-            elif config.as_type == 'json':
-                try:
-                    parsed = json.loads(value)
-                except:
-                    raise ValueError(
-                        f'Failed to parse JSON: {value}'
-                    )
-            else:
+    try:
+        return ast.literal_eval(value)
+    except:
+        raise ValueError(
+            f'Failed to parse literal: {value}'
+        )
+
+def parse_json(
+    value: str,
+):
+    try:
+        return json.loads(value)
+    except:
+        raise ValueError(
+            f'Failed to parse JSON: {value}'
+        )
+
+def compile_parse(
+    config: ParseConfig,
+) -> ActionFunction:
+    search = compile_column_search(config.source)
+    source = config.source
+    target = f'{STAGING_FIELD}.{config.target}'
+    required = config.required
+    if config.as_type == 'literal':
+        parse_value = parse_literal
+    elif config.as_type == 'json':
+        parse_value = parse_json
+    else:
+        raise ValueError(
+            f'Unsupported as type: {config.as_type}'
+        )
+    def run(status: GlobalStatus, row: Row):
+        value, found = search(row)
+        if required:
+            if not found:
                 raise ValueError(
-                    f'Unsupported as type: {config.as_type}'
+                    f'Required field not found, field: {source}'
                 )
-        else:
-            parsed = value
-        set_row_staging_value(row, config.target, parsed)
-    return row
+        if found:
+            if type(value) == str:
+                parsed = parse_value(value)
+            else:
+                parsed = value
+            set_row_value(row, target, parsed)
+        return row
+    return run
+
+def parse(
+    row: Row,
+    config: ParseConfig,
+):
+    return compile_parse(config)(None, row)
+
+def get_format_fields(
+    template: str,
+):
+    '''
+    Return the names of the parameters referenced by the format string.
+    '''
+    fields = []
+    for literal_text, field_name, format_spec, conversion in \
+            string.Formatter().parse(template):
+        if field_name is None:
+            continue
+        fields.append(re.split(r'[.\[]', field_name, maxsplit=1)[0])
+        if format_spec:
+            # NOTE: 書式指定の中にも置換フィールドを書ける
+            fields.extend(get_format_fields(format_spec))
+    return fields
+
+def get_action_fields(
+    action: ActionConfig,
+) -> list[str] | None:
+    if isinstance(action, AssignConfig):
+        return get_expression_columns(parse_expression(action.source))
+    if isinstance(action, AssignConstantConfig):
+        return []
+    if isinstance(action, AssignFormatConfig):
+        return get_format_fields(action.format)
+    if isinstance(action, AssignIdConfig):
+        return list(action.primary) + list(action.context or [])
+    if isinstance(action, FilterConfig):
+        return [action.field]
+    if isinstance(action, JoinConfig | ParseConfig | SplitConfig):
+        return [action.source]
+    if isinstance(action, OmitConfig):
+        # NOTE: 取り除くだけなので読み込む必要はない
+        return []
+    return None
+
+def get_process_fields(
+    config: Config,
+) -> list[str]:
+    '''
+    Return the fields referenced by the post-processing of the rows.
+    '''
+    process = config.process
+    fields = []
+    for list_config in process.assign_array.values():
+        fields.extend(item.field for item in list_config)
+    fields.extend(process.assign_length.values())
+    for push in process.push:
+        fields.extend([push.target, push.source])
+        if push.condition is not None:
+            fields.append(push.condition)
+    return fields
+
+def get_referenced_fields(
+    config: Config,
+) -> frozenset[str] | None:
+    '''
+    Return the top level names of the input columns which the conversion can
+    refer to, or None if every column may be needed.
+    Without pick, the unreferenced columns are also output, so all of them
+    are needed.
+    '''
+    if not config.pick:
+        return None
+    fields = [pick.source for pick in config.pick]
+    for action in config.actions:
+        try:
+            action_fields = get_action_fields(action)
+        except ValueError:
+            # NOTE: 不正な書式は実行時のエラーに任せる
+            return None
+        if action_fields is None:
+            return None
+        fields.extend(action_fields)
+    fields.extend(get_process_fields(config))
+    top_fields = set([STAGING_FIELD])
+    for field in fields:
+        if not isinstance(field, str):
+            return None
+        candidates = [field]
+        for prefix in [f'{STAGING_FIELD}.', f'{INPUT_FIELD}.']:
+            if field.startswith(prefix):
+                candidates.append(field[len(prefix):])
+        if field.startswith(f'{STAGING_FIELD}.{INPUT_FIELD}.'):
+            candidates.append(field[len(f'{STAGING_FIELD}.{INPUT_FIELD}.'):])
+        for candidate in candidates:
+            if candidate in [STAGING_FIELD, INPUT_FIELD, f'{STAGING_FIELD}.{INPUT_FIELD}']:
+                # NOTE: 入力全体を参照している
+                return None
+            top_fields.add(candidate.split('.', 1)[0])
+    return frozenset(top_fields)
@@ -0,0 +1,689 @@
+'''
+Columnar execution engine. The column-local actions are run as whole-column
+operations on each loaded DataFrame instead of one row at a time.
+Frames and configurations which can not be converted this way raise
+NotVectorizable, and the row engine is used for them instead.
+'''
+
+import dataclasses
+import re
+import string
+
+from collections import OrderedDict
+from typing import (
+    Any,
+    Callable,
+    Mapping,
+)
+
+# 3-rd party modules
+
+from icecream import ic
+import numpy as np
+import pandas as pd
+
+# local
+
+from . actions import (
+    ActionFunction,
+    compile_actions,
+    parse_json,
+    parse_literal,
+    prepare_row,
+)
+from . config import (
+    Config,
+)
+from . expressions import (
+    ColumnExpression,
+    Expression,
+    LiteralExpression,
+    iter_fallback_chain,
+    parse_expression,
+)
+from . constants import (
+    FILE_FIELD,
+    FILE_ROW_INDEX_FIELD,
+    INPUT_FIELD,
+    POSITIONAL_COLUMNS_ATTR,
+    ROW_INDEX_FIELD,
+    STAGING_FIELD,
+    VALUES_FIELD,
+)
+from . functions.flatten_row import flatten_row
+from . functions.set_nested_field_value import set_nested_field_value
+from . types import (
+    AssignConfig,
+    AssignConstantConfig,
+    AssignFormatConfig,
+    ActionConfig,
+    FilterConfig,
+    JoinConfig,
+    ParseConfig,
+    SplitConfig,
+)
+
+class NotVectorizable(Exception):
+    '''
+    Raised when a frame or an action can not be run by the columnar engine.
+    '''
+
+@dataclasses.dataclass
+class ColumnarFrame:
+    '''
+    The rows of a loaded DataFrame which are still alive (not filtered out),
+    and the staging columns assigned by the actions so far.
+    Each staging column is a pair of an object array of the values and a
+    boolean array telling in which rows the value is set.
+    '''
+    df: pd.DataFrame
+    positions: np.ndarray
+    staging: OrderedDict[str, tuple[np.ndarray, np.ndarray]] = \
+        dataclasses.field(default_factory=OrderedDict)
+
+    def __len__(self):
+        return len(self.positions)
+
+type ColumnarAction = Callable[[ColumnarFrame], None]
+
+@dataclasses.dataclass
+class Prefilter:
+    '''
+    The filters hoisted ahead of the row construction of the row engine,
+    run as columnar actions on the loaded frame, and the row plan of the
+    other actions.
+    '''
+    filters: list[ColumnarAction]
+    # NOTE: filters の元になったフィルタの設定
+    filter_actions: list[ActionConfig]
+    plan: list[ActionFunction]
+    # NOTE: plan の元になったアクションの設定
+    actions: list[ActionConfig]
+
+def to_object_array(
+    values: Any,
+) -> np.ndarray:
+    '''
+    Make a 1-D object array of the values, keeping list values as elements.
+    '''
+    return np.fromiter(values, dtype=object, count=len(values))
+
+def full_object_array(
+    value: Any,
+    size: int,
+) -> np.ndarray:
+    array = np.empty(size, dtype=object)
+    array.fill(value)
+    return array
+
+def is_prefix_conflict(
+    field: str,
+    other: str,
+):
+    return other.startswith(f'{field}.') or field.startswith(f'{other}.')
+
+def search_input_column(
+    frame: ColumnarFrame,
+    field: str,
+):
+    columns = frame.df.columns
+    for column in columns:
+        if is_prefix_conflict(field, column):
+            # NOTE: 部分木や入れ子の値の参照は行単位で処理する
+            raise NotVectorizable(f'Nested field: {field}')
+    size = len(frame)
+    if field in columns:
+        return frame.df[field].to_numpy(dtype=object), np.ones(size, dtype=bool)
+    return full_object_array(None, size), np.zeros(size, dtype=bool)
+
+def search_column(
+    frame: ColumnarFrame,
+    field: str,
+):
+    '''
+    Columnar version of search_column_value: the staging field first, then
+    the input columns. Omit is not supported, so the input snapshot always
+    has the same values as the input columns.
+    '''
+    if field == INPUT_FIELD or field == STAGING_FIELD:
+        raise NotVectorizable(f'Nested field: {field}')
+    if field.startswith(f'{STAGING_FIELD}.'):
+        raise NotVectorizable(f'Staging field: {field}')
+    if field.startswith(f'{INPUT_FIELD}.'):
+        return search_input_column(frame, field[len(INPUT_FIELD)+1:])
+    for key in frame.staging.keys():
+        if is_prefix_conflict(field, key):
+            raise NotVectorizable(f'Nested staging field: {field}')
+    values, found = search_input_column(frame, field)
+    if field in frame.staging:
+        staging_values, staging_found = frame.staging[field]
+        values = np.where(staging_found, staging_values, values)
+        found = staging_found | found
+    return values, found
+
+def set_staging_column(
+    frame: ColumnarFrame,
+    target: str,
+    values: np.ndarray,
+    mask: np.ndarray,
+):
+    if target == INPUT_FIELD or target.startswith(f'{INPUT_FIELD}.'):
+        raise NotVectorizable(f'Assigning to the input field: {target}')
+    if target in frame.staging:
+        old_values, old_found = frame.staging[target]
+        values = np.where(mask, values, old_values)
+        mask = mask | old_found
+    frame.staging[target] = (values, mask)
+
+def keep_rows(
+    frame: ColumnarFrame,
+    keep: np.ndarray,
+):
+    frame.df = frame.df[keep].reset_index(drop=True)
+    frame.positions = frame.positions[keep]
+    for key, (values, found) in frame.staging.items():
+        frame.staging[key] = (values[keep], found[keep])
+
+def is_truthy(
+    values: np.ndarray,
+) -> np.ndarray:
+    return values.astype(bool)
+
+def is_not_none(
+    values: np.ndarray,
+) -> np.ndarray:
+    return np.fromiter((value is not None for value in values), bool, len(values))
+
+def is_instance(
+    values: np.ndarray,
+    types: type | tuple[type, ...],
+) -> np.ndarray:
+    return np.fromiter((isinstance(value, types) for value in values), bool, len(values))
+
+def to_str_array(
+    values: np.ndarray,
+) -> np.ndarray:
+    return pd.Series(values, dtype=object).astype(str).to_numpy(dtype=object)
+
+def compile_columnar_search_expression(
+    expression: Expression,
+) -> Callable[[ColumnarFrame], tuple[np.ndarray, np.ndarray]]:
+    if isinstance(expression, ColumnExpression):
+        column = expression.column
+        return lambda frame: search_column(frame, column)
+    if isinstance(expression, LiteralExpression):
+        value = expression.value
+        return lambda frame: (
+            full_object_array(value, len(frame)), np.ones(len(frame), dtype=bool)
+        )
+    chain = list(iter_fallback_chain(expression))
+    search_last = compile_columnar_search_expression(chain[-1][0])
+    pairs = [
+        (compile_columnar_search_expression(operand), operator)
+        for operand, operator in chain[:-1]
+    ]
+    def search(frame: ColumnarFrame):
+        values, found = search_last(frame)
+        # NOTE: 後ろから評価し、前の被演算子が採用される行を上書きする
+        for search_operand, operator in reversed(pairs):
+            column_values, column_found = search_operand(frame)
+            if operator == '||':
+                take = is_truthy(column_values)
+            else:
+                take = column_found & is_not_none(column_values)
+            values = np.where(take, column_values, values)
+            found = np.where(take, column_found, found)
+        return values, found
+    return search
+
+def compile_columnar_assign(
+    config: AssignConfig,
+) -> ColumnarAction:
+    search = compile_columnar_search_expression(parse_expression(config.source))
+    def run(frame: ColumnarFrame):
+        values, found = search(frame)
+        if config.required:
+            invalid = ~found | ~is_truthy(values)
+            if invalid.any():
+                index = np.flatnonzero(invalid)[0]
+                raise ValueError(
+                    'Required field not found or empty, ' +
+                    f'field: {config.source}, found: {bool(found[index])}, value: {values[index]}'
+                )
+        if config.assign_default:
+            values = np.where(found, values, full_object_array(config.default_value, len(frame)))
+            found = np.ones(len(frame), dtype=bool)
+        set_staging_column(frame, config.target, values, found)
+    return run
+
+def compile_columnar_assign_constant(
+    config: AssignConstantConfig,
+) -> ColumnarAction:
+    if isinstance(config.value, Mapping):
+        raise NotVectorizable(f'Mapping constant: {config.target}')
+    def run(frame: ColumnarFrame):
+        size = len(frame)
+        set_staging_column(
+            frame,
+            config.target,
+            full_object_array(config.value, size),
+            np.ones(size, dtype=bool),
+        )
+    return run
+
+def compile_columnar_split(
+    config: SplitConfig,
+) -> ColumnarAction:
+    def run(frame: ColumnarFrame):
+        values, found = search_column(frame, config.source)
+        is_str = found & is_instance(values, str)
+        if is_str.any():
+            split = pd.Series(values[is_str], dtype=object).str.split(
+                config.delimiter, regex=False,
+            )
+            exploded = split.explode().str.strip()
+            exploded = exploded[exploded.str.len() > 0]
+            grouped = exploded.groupby(level=0, sort=False).agg(list)
+            new_values = [[] for _ in range(len(split))]
+            for position, parts in grouped.items():
+                new_values[position] = parts
+            values = values.copy()
+            values[is_str] = to_object_array(new_values)
+        set_staging_column(frame, config.target, values, found)
+    return run
+
+def compile_columnar_join(
+    config: JoinConfig,
+) -> ColumnarAction:
+    delimiter = config.delimiter
+    if delimiter is None:
+        delimiter = ';'
+    if delimiter == '\\n':
+        delimiter = '\n'
+    def run(frame: ColumnarFrame):
+        values, found = search_column(frame, config.source)
+        is_list = found & is_instance(values, list)
+        if is_list.any():
+            lists = values[is_list]
+            joined = pd.Series(lists, dtype=object).str.join(delimiter)
+            failed = joined.isna().to_numpy()
+            if failed.any():
+                # NOTE: 文字列以外の要素があれば行単位の処理と同じ例外を送出する
+                delimiter.join(lists[np.flatnonzero(failed)[0]])
+            values = values.copy()
+            values[is_list] = joined.to_numpy(dtype=object)
+        set_staging_column(frame, config.target, values, found)
+    return run
+
+def compile_columnar_parse(
+    config: ParseConfig,
+) -> ColumnarAction:
+    if config.as_type == 'literal':
+        parse_value = parse_literal
+    elif config.as_type == 'json':
+        parse_value = parse_json
+    else:
+        raise ValueError(
+            f'Unsupported as type: {config.as_type}'
+        )
+    def run(frame: ColumnarFrame):
+        values, found = search_column(frame, config.source)
+        if config.required:
+            if not found.all():
+                raise ValueError(
+                    f'Required field not found, field: {config.source}'
+                )
+        is_str = found & is_instance(values, str)
+        if is_str.any():
+            values = values.copy()
+            values[is_str] = to_object_array(
+                pd.Series(values[is_str], dtype=object).map(parse_value)
+            )
+        set_staging_column(frame, config.target, values, found)
+    return run
+
+def compile_columnar_assign_format(
+    config: AssignFormatConfig,
+) -> ColumnarAction:
+    parts = []
+    fields = []
+    plain = True
+    for literal, field_name, format_spec, conversion in \
+            string.Formatter().parse(config.format):
+        if literal:
+            parts.append((literal, None))
+        if field_name is None:
+            continue
+        if not field_name.isidentifier():
+            raise NotVectorizable(f'Unsupported format field: {field_name!r}')
+        if format_spec and '{' in format_spec:
+            raise NotVectorizable(f'Nested format spec: {format_spec!r}')
+        if format_spec or conversion:
+            plain = False
+        parts.append((None, len(fields)))
+        fields.append(field_name)
+    def resolve(frame: ColumnarFrame, name: str):
+        '''
+        Same resolution as assign_format: the input column, then the staging
+        field, and otherwise the undefined marker.
+        '''
+        size = len(frame)
+        undefined = full_object_array(f'__{name}__undefined__', size)
+        if name in frame.df.columns:
+            return frame.df[name].to_numpy(dtype=object)
+        if name in frame.staging:
+            values, found = frame.staging[name]
+            # NOTE: マッピングはフラットなビューで展開されるので未定義扱い
+            found = found & ~is_instance(values, Mapping)
+            return np.where(found, values, undefined)
+        return undefined
+    def run(frame: ColumnarFrame):
+        size = len(frame)
+        list_values = [resolve(frame, name) for name in fields]
+        if not fields:
+            formatted = full_object_array(config.format.format(), size)
+        elif plain:
+            # NOTE: 書式指定がなければ文字列の連結で済む
+            formatted = full_object_array('', size)
+            for literal, field_index in parts:
+                if literal is not None:
+                    formatted = formatted + literal
+                else:
+                    formatted = formatted + to_str_array(list_values[field_index])
+        else:
+            formatted = to_object_array([
+                config.format.format(**dict(zip(fields, row_values)))
+                for row_values in zip(*list_values)
+            ])
+        set_staging_column(frame, config.target, formatted, np.ones(size, dtype=bool))
+    return run
+
+def compile_columnar_filter(
+    config: FilterConfig,
+) -> ColumnarAction:
+    config_value = config.value
+    str_value = str(config_value)
+    if config.operator not in ['==', '!=', '=~', 'empty', 'not-empty']:
+        raise NotVectorizable(f'Unsupported filter operator: {config.operator}')
+    if not isinstance(config_value, str | int | float | bool):
+        raise NotVectorizable(f'Unsupported filter value: {config_value!r}')
+    if config.operator == '=~':
+        pattern = re.compile(config_value)
+    def run(frame: ColumnarFrame):
+        values, found = search_column(frame, config.field)
+        series = pd.Series(values, dtype=object)
+        if config.operator == '==':
+            equal = (series == config_value).to_numpy(dtype=bool)
+            str_equal = (series.astype(str) == str_value).to_numpy(dtype=bool)
+            keep = found & (equal | str_equal)
+        elif config.operator == '!=':
+            equal = (series == config_value).to_numpy(dtype=bool)
+            str_equal = (series.astype(str) == str_value).to_numpy(dtype=bool)
+            keep = ~(equal | str_equal)
+        elif config.operator == '=~':
+            not_str = found & ~is_instance(values, str)
+            if not_str.any():
+                # NOTE: 行単位の処理と同じ例外を送出する
+                pattern.search(values[np.flatnonzero(not_str)[0]])
+            matched = series[found].str.contains(pattern, regex=True)
+            keep = found.copy()
+            keep[found] = matched.to_numpy(dtype=bool)
+        elif config.operator == 'empty':
+            keep = ~found | ~is_truthy(values)
+        else:
+            keep = found & is_truthy(values)
+        keep_rows(frame, keep)
+    return run
+
+def compile_columnar_action(
+    action: ActionConfig,
+) -> ColumnarAction:
+    if isinstance(action, AssignConfig):
+        return compile_columnar_assign(action)
+    if isinstance(action, AssignConstantConfig):
+        return compile_columnar_assign_constant(action)
+    if isinstance(action, AssignFormatConfig):
+        return compile_columnar_assign_format(action)
+    if isinstance(action, FilterConfig):
+        return compile_columnar_filter(action)
+    if isinstance(action, JoinConfig):
+        return compile_columnar_join(action)
+    if isinstance(action, ParseConfig):
+        return compile_columnar_parse(action)
+    if isinstance(action, SplitConfig):
+        return compile_columnar_split(action)
+    raise NotVectorizable(f'Unsupported action: {action}')
+
+def compile_columnar_plan(
+    config: Config,
+    output_debug: bool = False,
+) -> list[ColumnarAction] | None:
+    '''
+    Return the columnar plan of the configuration, or None if the
+    configuration needs the row engine.
+    '''
+    if output_debug:
+        return None
+    process = config.process
+    if process.assign_array or process.assign_length or process.push:
+        return None
+    targets = [pick.target for pick in config.pick]
+    if len(set(targets)) != len(targets):
+        return None
+    for pick in config.pick:
+        if pick.target.startswith(STAGING_FIELD):
+            return None
+        for other in config.pick:
+            if is_prefix_conflict(pick.target, other.target):
+                return None
+    try:
+        return [compile_columnar_action(action) for action in config.actions]
+    except NotVectorizable as e:
+        ic(e)
+        return None
+
+def compile_prefilter(
+    config: Config,
+    output_debug: bool = False,
+) -> Prefilter | None:
+    '''
+    Hoist the leading filters of the input fields. A filter can be moved
+    ahead of the assign, assign-constant and split actions, which neither
+    raise nor change the rows except their staging targets, if the field is
+    not one of the targets.
+    Returns None if no filter can be hoisted.
+    '''
+    if output_debug:
+        # NOTE: 除外された行にも途中のステージングが出力される
+        return None
+    process = config.process
+    if process.assign_array or process.assign_length or process.push:
+        return None
+    filters = []
+    filter_actions = []
+    actions = []
+    targets = set()
+    for index, action in enumerate(config.actions):
+        if isinstance(action, FilterConfig):
+            top_field = action.field.split('.', 1)[0]
+            if top_field in targets or top_field == STAGING_FIELD:
+                actions.extend(config.actions[index:])
+                break
+            try:
+                filters.append(compile_columnar_filter(action))
+            except NotVectorizable:
+                actions.extend(config.actions[index:])
+                break
+            filter_actions.append(action)
+            continue
+        if isinstance(action, AssignConfig) and not action.required or \
+                isinstance(action, AssignConstantConfig | SplitConfig):
+            targets.add(action.target.split('.', 1)[0])
+            actions.append(action)
+            continue
+        actions.extend(config.actions[index:])
+        break
+    if not filters:
+        return None
+    return Prefilter(
+        filters = filters,
+        filter_actions = filter_actions,
+        plan = compile_actions(actions),
+        actions = actions,
+    )
+
+def run_prefilter(
+    prefilter: Prefilter,
+    df: pd.DataFrame,
+    input_file: str,
+) -> np.ndarray | None:
+    '''
+    Return the boolean mask of the rows of df kept by the hoisted filters,
+    or None if the frame is not vectorizable or a filter raises.
+    '''
+    try:
+        frame = setup_columnar_frame(df, input_file)
+        for action in prefilter.filters:
+            action(frame)
+    except Exception:
+        # NOTE: 例外は行単位の処理で元の順序どおりに送出させる
+        return None
+    keep = np.zeros(len(df), dtype=bool)
+    keep[frame.positions] = True
+    return keep
+
+def setup_columnar_frame(
+    df: pd.DataFrame,
+    input_file: str,
+):
+    for column in df.columns:
+        if not isinstance(column, str):
+            raise NotVectorizable(f'Non-string column: {column!r}')
+        if column == STAGING_FIELD or column.startswith(f'{STAGING_FIELD}.'):
+            raise NotVectorizable(f'Staging column: {column}')
+        for other in df.columns:
+            if isinstance(other, str) and is_prefix_conflict(column, other):
+                raise NotVectorizable(f'Nested column: {column}')
+    index = df.index.tolist()
+    file_row_indices = [f'{input_file}:{row_index}' for row_index in index]
+    positions = np.arange(len(df))
+    frame_df = df.reset_index(drop=True)
+    dtypes = set(frame_df.dtypes)
+    if len(dtypes) > 1 and all(dtype != object for dtype in dtypes):
+        # NOTE: 行単位の処理 (iterrows) は数値だけの行を共通の型に揃えるので合わせる
+        frame_df = pd.DataFrame(
+            frame_df.to_numpy(), columns=frame_df.columns,
+        )
+    frame = ColumnarFrame(
+        df = frame_df,
+        positions = positions,
+    )
+    size = len(frame)
+    found = np.ones(size, dtype=bool)
+    frame.staging[FILE_FIELD] = (full_object_array(input_file, size), found)
+    frame.staging[FILE_ROW_INDEX_FIELD] = (to_object_array(file_row_indices), found)
+    frame.staging[ROW_INDEX_FIELD] = (to_object_array(index), found)
+    positional_columns = df.attrs.get(POSITIONAL_COLUMNS_ATTR)
+    if positional_columns:
+        # NOTE: 列番号による参照は入力列の別名
+        for position, column in positional_columns.items():
+            frame.staging[f'{VALUES_FIELD}.{position}'] = \
+                search_input_column(frame, column)
+    return frame
+
+def build_output_frame(
+    columns: Mapping[str, tuple[np.ndarray, np.ndarray]],
+    size: int,
+):
+    '''
+    Build the same DataFrame as pd.DataFrame(list_of_flat_rows) would from the
+    rows having the found values of the given columns, in the nested order.
+    '''
+    if size == 0:
+        return pd.DataFrame()
+    names = list(columns.keys())
+    ordered = OrderedDict()
+    if names:
+        matrix = np.stack([found for values, found in columns.values()], axis=1)
+        patterns, first_rows = np.unique(matrix, axis=0, return_index=True)
+        # NOTE: pd.DataFrame は行ごとのキーの順序で、各列の最初の出現順に並べる
+        for position in np.argsort(first_rows):
+            nested = OrderedDict()
+            for name, found in zip(names, patterns[position]):
+                if found:
+                    set_nested_field_value(nested, name, None)
+            for name in flatten_row(nested).keys():
+                ordered[name] = True
+    data = OrderedDict()
+    for column in ordered.keys():
+        values, found = columns[column]
+        values = values.copy()
+        values[~found] = np.nan
+        data[column] = values
+    if not data:
+        return pd.DataFrame(index=range(size), columns=[])
+    return pd.DataFrame(data, index=range(size)).infer_objects()
+
+def convert_rows_columnar(
+    config: Config,
+    plan: list[ColumnarAction],
+    df: pd.DataFrame,
+    input_file: str,
+    row_list_filtered_out: list[OrderedDict] | None = None,
+) -> pd.DataFrame:
+    '''
+    Columnar version of convert_rows. Returns the converted DataFrame.
+    '''
+    # NOTE: NaN を None に変換しておかないと厄介
+    df = df.replace([np.nan], [None])
+    frame = setup_columnar_frame(df, input_file)
+    all_positions = frame.positions
+    for action in plan:
+        action(frame)
+    if config.pick:
+        columns = OrderedDict()
+        for pick in config.pick:
+            values, found = search_column(frame, pick.source)
+            if found.any() and is_instance(values[found], Mapping).any():
+                # NOTE: マッピングの値は展開されるので行単位で処理する
+                raise NotVectorizable(f'Mapping value: {pick.source}')
+            columns[pick.target] = (values, found)
+    else:
+        size = len(frame)
+        columns = OrderedDict(
+            (column, (frame.df[column].to_numpy(dtype=object), np.ones(size, dtype=bool)))
+            for column in frame.df.columns
+        )
+    new_df = build_output_frame(columns, len(frame))
+    if row_list_filtered_out is not None:
+        filtered_out = np.setdiff1d(all_positions, frame.positions)
+        for index, flat_row in df.iloc[filtered_out].iterrows():
+            row_list_filtered_out.append(prepare_row(flat_row).flat)
+    return new_df
+
+def compare_engine_results(
+    input_file: str,
+    row_df: pd.DataFrame,
+    columnar_df: pd.DataFrame,
+    row_filtered_out: list[OrderedDict] | None = None,
+    columnar_filtered_out: list[OrderedDict] | None = None,
+):
+    '''
+    Differential check of the two engines, used by the compare engine.
+    '''
+    try:
+        pd.testing.assert_frame_equal(columnar_df, row_df)
+    except AssertionError as e:
+        ic.enable()
+        ic(row_df)
+        ic(columnar_df)
+        raise ValueError(
+            f'The columnar engine result differs from the row engine: {input_file}\n{e}'
+        )
+    if row_filtered_out != columnar_filtered_out:
+        ic.enable()
+        ic(row_filtered_out)
+        ic(columnar_filtered_out)
+        raise ValueError(
+            f'The columnar engine filtered out different rows: {input_file}'
+        )
@@ -9,7 +9,6 @@ from typing import (
 )
 
 from icecream import ic
-import yaml
 
 from . functions.flatten_row import (
     FlatFieldMap,
@@ -59,6 +58,7 @@ def setup_config(
     config = Config()
     if config_path:
         if config_path.endswith('.yaml'):
+            import yaml
             yaml.add_constructor(
                 yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
                 lambda loader, node: OrderedDict(loader.construct_pairs(node)),
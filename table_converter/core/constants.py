@@ -3,3 +3,22 @@ ROW_INDEX_FIELD = '__row_index__'
 FILE_ROW_INDEX_FIELD = '__file_row_index__'
 INPUT_FIELD = '__input__'
 STAGING_FIELD = '__staging__'
+VALUES_FIELD = '__values__'
+
+# NOTE: 列番号でアクセスできる列名を DataFrame.attrs に入れておくキー
+POSITIONAL_COLUMNS_ATTR = 'positional_columns'
+
+# NOTE: 変換の実行エンジン (CLI の選択肢にも使うため pandas なしで参照できるここに置く)
+ENGINES = ['row', 'columnar', 'compare']
+
+DEFAULT_CHUNK_SIZE = 10000
+MAX_IN_FLIGHT_CHUNKS_PER_JOB = 2
+DEFAULT_ID_CACHE_SIZE = 100000
+ID_REGISTRY_BATCH_SIZE = 1000
+# NOTE: キャッシュのファイル形式 (保存する結果の構造) を変えたら上げる。
+# 変換の処理の変更はパッケージのソースのハッシュでキーが変わる
+CACHE_FORMAT_VERSION = 1
+
+# NOTE: Excel のシートあたりの上限 (見出し行を含む)
+EXCEL_MAX_ROWS = 1048576
+EXCEL_MAX_COLUMNS = 16384
@@ -0,0 +1,141 @@
+'''
+Cache of the converted input files, keyed by the content of the input file,
+the configuration, the tool version and the source of the package, so
+unchanged files are not converted again when the same conversion is run
+repeatedly.
+'''
+
+import dataclasses
+import functools
+import hashlib
+import json
+import os
+import pickle
+
+from typing import (
+    Any,
+    Mapping,
+)
+
+# 3-rd party modules
+
+from icecream import ic
+
+# local
+
+from .. import __version__
+from . config import Config
+from . constants import CACHE_FORMAT_VERSION
+
+def hash_file(
+    input_file: str,
+    block_size: int = 1 << 20,
+) -> str:
+    digest = hashlib.sha256()
+    with open(input_file, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+@functools.cache
+def hash_source_files() -> str:
+    '''
+    Return the hash of the source files of the package, so the cached
+    results are not reused after the conversion code changes, even when the
+    version is not bumped (e.g. in a development checkout).
+    '''
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(package_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.endswith('.py'):
+                continue
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, package_dir).encode('utf-8'))
+            digest.update(hash_file(path).encode('utf-8'))
+    return digest.hexdigest()
+
+class ConversionCache:
+    '''
+    A directory of pickled conversion results of the input files.
+    The results hold the assigned IDs as LocalId values with the ID maps
+    of the file, and they are merged like the results of the parallel
+    workers, so the ID assignments of the cached files are replayed.
+    '''
+
+    def __init__(
+        self,
+        cache_dir: str,
+        config: Config,
+        options: Mapping[str, Any] | None = None,
+    ):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        # NOTE: 設定やオプションが変われば別のキーになる
+        normalized = json.dumps(
+            {
+                'version': __version__,
+                'format': CACHE_FORMAT_VERSION,
+                'source': hash_source_files(),
+                'config': dataclasses.asdict(config),
+                'options': options or {},
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+            default=repr,
+        )
+        self.config_digest = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+        self.num_hits = 0
+        self.num_misses = 0
+
+    def get_key(
+        self,
+        input_file: str,
+    ) -> str:
+        digest = hashlib.sha256()
+        digest.update(self.config_digest.encode('utf-8'))
+        # NOTE: 出力に含まれるのでファイルのパスもキーに含める
+        digest.update(input_file.encode('utf-8'))
+        digest.update(hash_file(input_file).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get_path(
+        self,
+        key: str,
+    ) -> str:
+        return os.path.join(self.cache_dir, key[:2], f'{key}.pkl')
+
+    def load(
+        self,
+        key: str,
+    ):
+        path = self.get_path(key)
+        if not os.path.exists(path):
+            self.num_misses += 1
+            return None
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+        except Exception as e:
+            ic('Broken cache file: ', path, e)
+            self.num_misses += 1
+            return None
+        self.num_hits += 1
+        return result
+
+    def save(
+        self,
+        key: str,
+        result: Any,
+    ):
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # NOTE: 中断されても壊れたファイルが残らないよう置き換えで書き込む
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
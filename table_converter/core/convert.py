@@ -1,282 +1,216 @@
 # -*- coding: utf-8 -*-
 
-import json
-import math
+import contextlib
+import functools
 import os
 
-from collections import OrderedDict
-
-from typing import (
-    Mapping,
-)
-
 # 3-rd party modules
 
 from icecream import ic
-import numpy as np
 import pandas as pd
 
 # local
 
 from . config import (
-    AssignArrayConfig,
-    PushConfig,
+    AssignIdConfig,
+    Config,
     setup_config,
     setup_pick_with_args,
 )
 from . constants import (
-    FILE_FIELD,
-    ROW_INDEX_FIELD,
-    FILE_ROW_INDEX_FIELD,
-    INPUT_FIELD,
+    DEFAULT_CHUNK_SIZE,
     STAGING_FIELD,
 )
-from . functions.flatten_row import flatten_row
-from . functions.get_nested_field_value import get_nested_field_value
-from . functions.get_nested_field_value import get_nested_field_value
-from . functions.nest_row import nest_row as nest
-from . functions.search_column_value import search_column_value
-from . functions.set_nested_field_value import set_nested_field_value
-from . functions.set_row_value import (
-    set_row_value,
-    set_row_staging_value,
-)
 
 from . actions import (
-    do_actions,
-    pop_row_staging,
-    prepare_row,
-    remap_columns,
+    ActionFunction,
+    compile_actions,
+    get_action_fields,
+    get_process_fields,
+    get_referenced_fields,
     setup_actions_with_args,
 )
 
-from . types import (
-    GlobalStatus,
+from . conversion_cache import ConversionCache
+from . id_registry import IdRegistry
+from . row_ranges import IgnoreRows
+from . stage_timer import (
+    StageTimer,
+    iter_measured,
+    measure_stage,
+    profile_function,
+    set_input_file,
 )
 
-dict_loaders: dict[str, callable] = {}
-def register_loader(
-    ext: str,
-):
-    def decorator(loader):
-        dict_loaders[ext] = loader
-        return loader
-    return decorator
-
-dict_savers: dict[str, callable] = {}
-def register_saver(
-    ext: str,
-):
-    def decorator(saver):
-        dict_savers[ext] = saver
-        return saver
-    return decorator
-
-@register_loader('.csv')
-def load_csv(
-    input_file: str,
-):
-    # utf-8
-    #df = pd.read_csv(input_file)
-    # UTF-8 with BOM
-    df = pd.read_csv(input_file, encoding='utf-8-sig')
-    return df
-
-@register_loader('.xlsx')
-def load_excel(
-    input_file: str,
-):
-    #df = pd.read_excel(input_file)
-    # NOTE: Excelで勝手に日時データなどに変換されてしまうことを防ぐため
-    df = pd.read_excel(input_file, dtype=str)
-    # NOTE: 列番号でもアクセスできるようフィールドを追加する
-    df_with_column_number = pd.read_excel(
-        input_file, dtype=str, header=None, skiprows=1
-    )
-    new_column_names = [f'__values__.{i}' for i in df_with_column_number.columns]
-    df2 = df_with_column_number.rename(columns=dict(
-        zip(df_with_column_number.columns, new_column_names)
-    ))
-    df = pd.concat([df, df2], axis=1)
-    df = df.dropna(axis=0, how='all')
-    df = df.dropna(axis=1, how='all')
-    return df
+from . columnar import (
+    ColumnarAction,
+    Prefilter,
+    compile_columnar_plan,
+    compile_prefilter,
+)
+from . engine import convert_frame
+from . loaders import (
+    dict_loaders,
+    iter_input_chunks,
+    load_input_file,
+)
+from . parallel import (
+    convert_chunks_parallel,
+    convert_files_parallel,
+)
+from . writers import (
+    dict_savers,
+    get_writer,
+)
 
-@register_loader('.json')
-def load_json(
-    input_file: str,
-):
-    with open(input_file, 'r') as f:
-        data = json.load(f)
-    if not isinstance(data, list):
-        raise ValueError(f'Invalid JSON array data: {input_file}')
-    #ic(data[0])
-    rows = []
-    for row in data:
-        new_row = flatten_row(row)
-        rows.append(new_row)
-    df = pd.DataFrame(rows)
-    return df
+from . types import (
+    ActionConfig,
+    GlobalStatus,
+    PickConfig,
+)
 
-@register_saver('.json')
-def save_json(
+def reindex_picked_columns(
     df: pd.DataFrame,
-    output_file: str,
-):
-    # NOTE: この方法だとスラッシュがすべてエスケープされてしまった
-    #df.to_json(
-    #    output_file,
-    #    orient='records',
-    #    force_ascii=False,
-    #    indent=2,
-    #    escape_forward_slashes=False,
-    #)
-    #ic(df.iloc[0])
-    data = df.to_dict(orient='records')
-    #ic(data[0])
-    data = [nest(row) for row in data]
-    #ic(data[0])
-    with open(output_file, 'w') as f:
-        json.dump(
-            data,
-            f,
-            indent=2,
-            ensure_ascii=False,
-        )
-
-@register_loader('.jsonl')
-def load_jsonl(
-    input_file: str,
-):
-    rows = []
-    with open(input_file, 'r') as f:
-        for line in f:
-            row = json.loads(line)
-            rows.append(row)
-    df = pd.DataFrame(rows)
+    list_pick: list[PickConfig],
+) -> pd.DataFrame:
+    '''
+    Reindex the columns of a converted chunk to the pick targets, so all the
+    chunks have the picked columns even if a field is missing in some of
+    them. The columns flattened from a picked object follow its target.
+    '''
+    columns = []
+    for pick in list_pick:
+        prefix = f'{pick.target}.'
+        nested = [
+            column for column in df.columns
+            if isinstance(column, str) and column.startswith(prefix)
+        ]
+        if pick.target in df.columns or not nested:
+            columns.append(pick.target)
+        columns.extend(nested)
+    columns = list(dict.fromkeys([*columns, *df.columns]))
+    missing = [column for column in columns if column not in df.columns]
+    df = df.reindex(columns=columns)
+    for column in missing:
+        # NOTE: NaN の列を足すと数値だけの行が浮動小数点数にまとめられてしまう
+        df[column] = pd.Series([None] * len(df), index=df.index, dtype=object)
     return df
 
-@register_saver('.jsonl')
-def save_jsonl(
-    df: pd.DataFrame,
-    output_file: str,
-):
-    # NOTE: この方法だとスラッシュがすべてエスケープされてしまった
-    #df.to_json(
-    #    output_file,
-    #    orient='records',
-    #    lines=True,
-    #    force_ascii=False,
-    #)
-    with open(output_file, 'w') as f:
-        for index, row in df.iterrows():
-            data = row.to_dict()
-            json.dump(
-                data,
-                f,
-                ensure_ascii=False,
-            )
-            f.write('\n')
-
-@register_saver('.csv')
-def save_csv(
-    df: pd.DataFrame,
-    output_file: str,
-):
-    # utf-8
-    #df.to_csv(output_file, index=False)
-    # UTF-8 with BOM
-    df.to_csv(output_file, index=False, encoding='utf-8-sig')
-
-@register_saver('.xlsx')
-def save_excel(
-    df: pd.DataFrame,
-    output_file: str,
-):
-    # openpyxl
-    df.to_excel(output_file, index=False)
-    # xlsxwriter
-    #writer = pd.ExcelWriter(
-    #    output_file,
-    #    engine='xlsxwriter',
-    #    engine_kwargs={
-    #        'options': {
-    #            'strings_to_urls': False,
-    #        },
-    #    }
-    #)
-    #df.to_excel(writer, index=False)
-    #writer.close()
+def is_field_overlapping(
+    field: str,
+    target: str,
+) -> bool:
+    '''
+    Return True if the referenced field reads the target, a column nested in
+    it or a column containing it.
+    '''
+    if field == STAGING_FIELD:
+        return True
+    if field.startswith(f'{STAGING_FIELD}.'):
+        field = field[len(f'{STAGING_FIELD}.'):]
+    if field == target:
+        return True
+    return target.startswith(f'{field}.') or field.startswith(f'{target}.')
 
-def assign_array(
-    row: OrderedDict,
-    dict_config: Mapping[str, list[AssignArrayConfig]],
-):
-    new_row = OrderedDict(row)
-    #ic(dict_config)
-    for key, config in dict_config.items():
-        array = []
-        for item in config:
-            value, found = search_column_value(row, item.field)
-            if found and value is not None:
-                array.append(value)
-            elif not item.optional:
-                array.append(None)
-        new_row[f'{STAGING_FIELD}.{key}'] = array
-    return new_row
-
-def search_column_value_from_nested(
-    nested_row: OrderedDict,
-    column: str,
-):
-    if STAGING_FIELD in nested_row:
-        value, found = get_nested_field_value(nested_row[STAGING_FIELD], column)
-        if found:
-            return value, True
-    value, found = get_nested_field_value(nested_row[STAGING_FIELD], column)
-    original, found = get_nested_field_value(nested_row, f'{STAGING_FIELD}.{INPUT_FIELD}')
-    if found:
-        value, found = get_nested_field_value(original, column)
-        if found:
-            return value, True
-    value, found = get_nested_field_value(nested_row, column)
-    if found:
-        return value, True
-    return None, False
-
-
-def push_fields(
-    row: OrderedDict,
-    list_config: list[PushConfig],
-):
-    nested_row = nest(row)
-    for config in list_config:
-        target_value, found = search_column_value_from_nested(nested_row, config.target)
-        if found:
-            array = target_value
-        else:
-            array = []
-            #set_field_value(nested_row, f'{STAGING_FIELD}.{config.target}', array)
-            set_row_staging_value(nested_row, config.target, array)
-        source_value, found = search_column_value_from_nested(nested_row, config.source)
-        if config.condition is None:
-            array.append(source_value)
+def can_defer_ids(
+    config: Config,
+) -> bool:
+    '''
+    Return True if the IDs of the assign-id actions are only carried to the
+    output, so the IDs assigned by parallel workers can be renumbered after
+    the conversion. An ID referenced by a later action must be assigned in
+    the input order, and then the files are converted one after another.
+    '''
+    for index, action in enumerate(config.actions):
+        if not isinstance(action, AssignIdConfig):
             continue
-        condition_value, found = search_column_value_from_nested(nested_row, config.condition)
-        if condition_value:
-            array.append(source_value)
-    return flatten_row(nested_row)
+        fields = []
+        for later_action in config.actions[index+1:]:
+            try:
+                action_fields = get_action_fields(later_action)
+            except ValueError:
+                # NOTE: 参照を特定できないので順に処理する
+                return False
+            if action_fields is None:
+                return False
+            fields.extend(action_fields)
+        fields.extend(get_process_fields(config))
+        for field in fields:
+            if not isinstance(field, str):
+                return False
+            if is_field_overlapping(field, action.target):
+                return False
+    return True
+
+def profile_plan(
+    stage_timer: StageTimer | None,
+    config: Config,
+    actions: list[ActionConfig],
+    plan: list[ActionFunction | ColumnarAction],
+) -> list[ActionFunction | ColumnarAction]:
+    '''
+    Return the plan compiled from the actions, or the hoisted filters, with
+    each action measured as a stage named by its index in the configuration
+    and its config, if the stage timer is detailed, or the plan itself.
+    '''
+    if stage_timer is None or not stage_timer.detailed:
+        return plan
+    dict_indices = {
+        id(action): index for index, action in enumerate(config.actions)
+    }
+    return [
+        profile_function(
+            stage_timer, f'action[{dict_indices[id(action)]}] {action}', function,
+        )
+        for action, function in zip(actions, plan)
+    ]
 
-def assign_length(
-    row: OrderedDict,
-    dict_fields: OrderedDict,
+def convert_chunks(
+    global_status: GlobalStatus,
+    config: Config,
+    input_files: list[str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ignore_rows: IgnoreRows | None = None,
+    output_debug: bool = False,
+    verbose: bool = False,
+    output_filtered_out: bool = False,
+    plan: list[ActionFunction] | None = None,
+    columnar_plan: list[ColumnarAction] | None = None,
+    engine: str = 'row',
+    prefilter: Prefilter | None = None,
+    stage_timer: StageTimer | None = None,
 ):
-    new_row = OrderedDict(row)
-    for key, field in dict_fields.items():
-        value, found = search_column_value(row, field)
-        if found:
-            new_row[f'{STAGING_FIELD}.{key}'] = len(value)
-    return new_row
+    '''
+    Convert the chunks of the input files one after another and yield the
+    converted DataFrames and the filtered out rows.
+    '''
+    for input_file in input_files:
+        ic(input_file)
+        set_input_file(stage_timer, input_file)
+        chunks = iter_measured(
+            stage_timer, 'load', iter_input_chunks(input_file, chunk_size, ignore_rows),
+        )
+        for df in chunks:
+            row_list_filtered_out = None
+            if output_filtered_out:
+                row_list_filtered_out = []
+            with measure_stage(stage_timer, 'convert'):
+                new_df = convert_frame(
+                    global_status,
+                    config,
+                    df,
+                    input_file,
+                    output_debug = output_debug,
+                    verbose = verbose,
+                    row_list_filtered_out = row_list_filtered_out,
+                    plan = plan,
+                    columnar_plan = columnar_plan,
+                    engine = engine,
+                    prefilter = prefilter,
+                    stage_timer = stage_timer,
+                )
+            yield new_df, row_list_filtered_out
+    set_input_file(stage_timer, None)
 
 def convert(
     input_files: list[str],
@@ -289,18 +223,28 @@ def convert(
     action_delimiter: str = ':',
     verbose: bool = False,
     ignore_file_rows: list[str] | None = None,
+    stream: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    engine: str = 'row',
+    jobs: int = 1,
+    id_registry: str | None = None,
+    cache_dir: str | None = None,
+    compact_json: bool = False,
+    nest_jsonl: bool = False,
+    stage_timer: StageTimer | None = None,
 ):
-    ic.enable()
+    # NOTE: ic は呼び出すたびにソースを解析して遅いため、有効にするかは
+    # 呼び出し側 (CLI の --verbose や DEBUG) に任せる
     ic()
     ic(input_files)
     df_list = []
     row_list_filtered_out = []
-    set_ignore_file_rows = set()
+    ignore_rows = None
     global_status = GlobalStatus()
     config = setup_config(config_path)
     ic(config)
     if ignore_file_rows:
-        set_ignore_file_rows = set(ignore_file_rows)
+        ignore_rows = IgnoreRows(ignore_file_rows)
     if list_pick_columns:
         setup_pick_with_args(config, list_pick_columns)
     if list_actions:
@@ -314,89 +258,251 @@ def convert(
         if ext not in dict_savers:
             raise ValueError(f'Unsupported file type: {ext}')
         saver = dict_savers[ext]
+        if compact_json and ext == '.json':
+            saver = functools.partial(saver, indent=None)
+        if nest_jsonl and ext == '.jsonl':
+            saver = functools.partial(saver, nested=True)
     ic(config)
+    plan = compile_actions(config.actions)
+    prefilter = compile_prefilter(config, output_debug)
+    plan = profile_plan(stage_timer, config, config.actions, plan)
+    if prefilter is not None:
+        # NOTE: 前に移したフィルタもアクションごとに計測する
+        prefilter.filters = profile_plan(
+            stage_timer, config, prefilter.filter_actions, prefilter.filters,
+        )
+        prefilter.plan = profile_plan(
+            stage_timer, config, prefilter.actions, prefilter.plan,
+        )
+    columnar_plan = None
+    if engine != 'row':
+        columnar_plan = compile_columnar_plan(config, output_debug)
+        if columnar_plan is None:
+            ic('The configuration is not vectorizable, using the row engine')
     #return # debug return
     for input_file in input_files:
-        ic(input_file)
         if not os.path.exists(input_file):
             raise FileNotFoundError(f'File not found: {input_file}')
-        base_name = os.path.basename(input_file)
         ext = os.path.splitext(input_file)[1]
-        ic(ext)
         if ext not in dict_loaders:
             raise ValueError(f'Unsupported file type: {ext}')
-        df = dict_loaders[ext](input_file)
-        # NOTE: NaN を None に変換しておかないと厄介
-        df = df.replace([np.nan], [None])
-        #ic(df)
-        #ic(len(df))
-        #ic(df.columns)
-        #ic(df.iloc[0])
-        #new_rows = []
-        new_flat_rows = []
-        for index, flat_row in df.iterrows():
-            file_row_index = f'{input_file}:{index}'
-            if file_row_index in set_ignore_file_rows:
-                continue
-            short_file_row_index = f'{base_name}:{index}'
-            if short_file_row_index in set_ignore_file_rows:
-                continue
-            #if flat_row.empty:
-            #    continue
-            orig_row = prepare_row(flat_row)
-            row = prepare_row(flat_row)
-            if STAGING_FIELD not in orig_row.nested:
-                set_row_staging_value(row, FILE_FIELD, input_file)
-                set_row_staging_value(row, FILE_ROW_INDEX_FIELD, file_row_index)
-                set_row_staging_value(row, ROW_INDEX_FIELD, index)
-                set_row_staging_value(row, INPUT_FIELD, orig_row.nested)
-            if config.process.assign_array:
-                row.flat= assign_array(row.flat, config.process.assign_array)
-            if config.process.push:
-                row.flat = push_fields(row.flat, config.process.push)
-            if config.process.assign_length:
-                row.flat = assign_length(row.flat, config.process.assign_length)
-            if config.actions:
-                try:
-                    new_row = do_actions(global_status, row, config.actions)
-                    if new_row is None:
-                        if not output_debug:
-                            pop_row_staging(row)
-                        if verbose:
-                            ic('Filtered out: ', row.flat)
-                        if output_file_filtered_out:
-                            row_list_filtered_out.append(row.flat)
-                        continue
-                    row = new_row
-                except Exception as e:
-                    if verbose:
-                        ic(index)
-                        ic(flat_row)
-                        ic(row.flat)
-                    raise e
-            if config.pick:
-                remap_columns(row, config.pick)
-            if not output_debug:
-                pop_row_staging(row)
-            new_flat_rows.append(row.flat)
-        new_df = pd.DataFrame(new_flat_rows)
-        df_list.append(new_df)
-        # NOTE: concatの仕様が変わり、all-NAの列を含むdfを連結しようとすると警告が出るようになった
-        #if ic(new_df.dropna(axis=1, how='all').empty):
-        #    ic(new_df.dropna(axis=1, how='all'))
-        #    raise ValueError('No rows to output.')
-        #df_list.append(new_df.dropna(axis=1, how='all'))
-    all_df = pd.concat(df_list)
-    #ic(all_df)
-    ic(len(all_df))
-    #ic(all_df.columns)
-    #ic(all_df.iloc[0])
-    if output_file:
-        ic('Saing to: ', output_file)
-        saver(all_df, output_file)
-    else:
-        ic(all_df)
-    if row_list_filtered_out:
-        df_filtered_out = pd.DataFrame(row_list_filtered_out)
-        ic('Saving filtered out to: ', output_file_filtered_out)
-        saver(df_filtered_out, output_file_filtered_out)
+    if jobs < 1:
+        raise ValueError(f'Invalid number of jobs: {jobs}')
+    if jobs > 1 and not can_defer_ids(config):
+        ic('The assigned IDs are referenced by the actions, converting the files serially')
+        jobs = 1
+    cache = None
+    if cache_dir:
+        if stream:
+            raise ValueError('The conversion cache is not supported in the streaming mode')
+        if can_defer_ids(config):
+            cache = ConversionCache(cache_dir, config, options = {
+                'output_debug': output_debug,
+                'output_filtered_out': bool(output_file_filtered_out),
+                'ignore_file_rows': ignore_rows.specs if ignore_rows else [],
+            })
+        else:
+            ic('The assigned IDs are referenced by the actions, not using the cache')
+    fields = None
+    if not output_debug and not output_file_filtered_out:
+        # NOTE: 参照される列だけを読み込む
+        fields = get_referenced_fields(config)
+        ic(fields)
+    registry = contextlib.nullcontext()
+    if id_registry:
+        registry = global_status.id_registry = IdRegistry(id_registry)
+    # NOTE: 失敗した場合は割り当てた ID を登録せずに接続を閉じる
+    with registry:
+        if stream:
+            convert_stream(
+                global_status,
+                config,
+                input_files,
+                output_file = output_file,
+                output_file_filtered_out = output_file_filtered_out,
+                output_debug = output_debug,
+                verbose = verbose,
+                ignore_rows = ignore_rows,
+                chunk_size = chunk_size,
+                plan = plan,
+                columnar_plan = columnar_plan,
+                engine = engine,
+                prefilter = prefilter,
+                jobs = jobs,
+                compact_json = compact_json,
+                nest_jsonl = nest_jsonl,
+                fields = fields,
+                stage_timer = stage_timer,
+            )
+            return
+        if (jobs > 1 and len(input_files) > 1) or cache:
+            # NOTE: ワーカーでは読み込みと変換をまとめて計測する
+            with measure_stage(stage_timer, 'load+convert'):
+                df_list = convert_files_parallel(
+                    global_status,
+                    config,
+                    input_files,
+                    jobs,
+                    ignore_rows = ignore_rows,
+                    output_debug = output_debug,
+                    verbose = verbose,
+                    row_list_filtered_out = \
+                        row_list_filtered_out if output_file_filtered_out else None,
+                    engine = engine,
+                    cache = cache,
+                    fields = fields,
+                )
+        else:
+            for input_file in input_files:
+                ic(input_file)
+                ext = os.path.splitext(input_file)[1]
+                ic(ext)
+                set_input_file(stage_timer, input_file)
+                with measure_stage(stage_timer, 'load'):
+                    df = load_input_file(input_file, fields, ignore_rows)
+                #ic(df)
+                #ic(len(df))
+                #ic(df.columns)
+                #ic(df.iloc[0])
+                with measure_stage(stage_timer, 'convert'):
+                    new_df = convert_frame(
+                        global_status,
+                        config,
+                        df,
+                        input_file,
+                        output_debug = output_debug,
+                        verbose = verbose,
+                        row_list_filtered_out = \
+                            row_list_filtered_out if output_file_filtered_out else None,
+                        plan = plan,
+                        columnar_plan = columnar_plan,
+                        engine = engine,
+                        prefilter = prefilter,
+                        stage_timer = stage_timer,
+                    )
+                df_list.append(new_df)
+                # NOTE: concatの仕様が変わり、all-NAの列を含むdfを連結しようとすると警告が出るようになった
+                #if ic(new_df.dropna(axis=1, how='all').empty):
+                #    ic(new_df.dropna(axis=1, how='all'))
+                #    raise ValueError('No rows to output.')
+                #df_list.append(new_df.dropna(axis=1, how='all'))
+            set_input_file(stage_timer, None)
+        with measure_stage(stage_timer, 'concat'):
+            all_df = pd.concat(df_list)
+        #ic(all_df)
+        ic(len(all_df))
+        #ic(all_df.columns)
+        #ic(all_df.iloc[0])
+        if output_file:
+            ic('Saing to: ', output_file)
+            with measure_stage(stage_timer, 'save'):
+                saver(all_df, output_file)
+        else:
+            ic(all_df)
+        if row_list_filtered_out:
+            df_filtered_out = pd.DataFrame(row_list_filtered_out)
+            ic('Saving filtered out to: ', output_file_filtered_out)
+            with measure_stage(stage_timer, 'save'):
+                saver(df_filtered_out, output_file_filtered_out)
+
+def convert_stream(
+    global_status: GlobalStatus,
+    config: Config,
+    input_files: list[str],
+    output_file: str | None = None,
+    output_file_filtered_out: str | None = None,
+    output_debug: bool = False,
+    verbose: bool = False,
+    ignore_rows: IgnoreRows | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    plan: list[ActionFunction] | None = None,
+    columnar_plan: list[ColumnarAction] | None = None,
+    engine: str = 'row',
+    prefilter: Prefilter | None = None,
+    jobs: int = 1,
+    compact_json: bool = False,
+    nest_jsonl: bool = False,
+    fields: frozenset[str] | None = None,
+    stage_timer: StageTimer | None = None,
+):
+    '''
+    Streaming version of convert(). The input files are read in chunks and
+    the converted rows are written incrementally, so the memory usage is
+    bounded by the chunk size rather than the file size.
+    With jobs > 1 the chunks are converted in a process pool and written in
+    the input order.
+    With picked columns, every chunk is written with all of them. Without,
+    the JSON rows of a chunk have only the columns found in the chunk.
+    The output files are written only if the conversion succeeds.
+    '''
+    if plan is None:
+        plan = compile_actions(config.actions)
+    writer = None
+    writer_filtered_out = None
+    num_rows = 0
+    completed = False
+    try:
+        if output_file:
+            writer = get_writer(
+                output_file, compact_json=compact_json, nest_jsonl=nest_jsonl,
+            )
+        if output_file_filtered_out:
+            writer_filtered_out = get_writer(
+                output_file_filtered_out, compact_json=compact_json, nest_jsonl=nest_jsonl,
+            )
+        if jobs > 1:
+            results = convert_chunks_parallel(
+                global_status,
+                config,
+                input_files,
+                jobs,
+                chunk_size = chunk_size,
+                ignore_rows = ignore_rows,
+                output_debug = output_debug,
+                verbose = verbose,
+                output_filtered_out = writer_filtered_out is not None,
+                engine = engine,
+                fields = fields,
+            )
+            # NOTE: ワーカーでは読み込みと変換をまとめて計測する
+            results = iter_measured(stage_timer, 'load+convert', results)
+        else:
+            results = convert_chunks(
+                global_status,
+                config,
+                input_files,
+                chunk_size = chunk_size,
+                ignore_rows = ignore_rows,
+                output_debug = output_debug,
+                verbose = verbose,
+                output_filtered_out = writer_filtered_out is not None,
+                plan = plan,
+                columnar_plan = columnar_plan,
+                engine = engine,
+                prefilter = prefilter,
+                stage_timer = stage_timer,
+            )
+        for new_df, row_list_filtered_out in results:
+            num_rows += len(new_df)
+            with measure_stage(stage_timer, 'save'):
+                if config.pick and not output_debug:
+                    # NOTE: チャンクごとに出力の列が変わらないようにする
+                    new_df = reindex_picked_columns(new_df, config.pick)
+                if writer:
+                    writer.write(new_df)
+                else:
+                    ic(new_df)
+                if row_list_filtered_out:
+                    writer_filtered_out.write(pd.DataFrame(row_list_filtered_out))
+        completed = True
+    finally:
+        with measure_stage(stage_timer, 'save'):
+            for table_writer in [writer, writer_filtered_out]:
+                if table_writer is None:
+                    continue
+                if completed:
+                    table_writer.close()
+                else:
+                    table_writer.abort()
+    ic(num_rows)
+
@@ -0,0 +1,334 @@
+'''
+Conversion of a loaded DataFrame: the row engine running the compiled
+actions on one row at a time, and the dispatch to the columnar engine.
+'''
+
+from collections import OrderedDict
+
+from typing import Mapping
+
+# 3-rd party modules
+
+from icecream import ic
+import numpy as np
+import pandas as pd
+
+# local
+
+from . config import (
+    AssignArrayConfig,
+    Config,
+    PushConfig,
+)
+from . constants import (
+    ENGINES,
+    FILE_FIELD,
+    ROW_INDEX_FIELD,
+    FILE_ROW_INDEX_FIELD,
+    INPUT_FIELD,
+    POSITIONAL_COLUMNS_ATTR,
+    STAGING_FIELD,
+    VALUES_FIELD,
+)
+from . functions.create_row_schema import create_row_schema
+from . functions.get_nested_field_value import get_nested_field_value
+from . functions.nest_value import nest_value
+from . functions.search_column_value import search_column_value
+from . functions.set_row_value import set_row_staging_value
+
+from . actions import (
+    ActionFunction,
+    compile_actions,
+    discard_row_staging,
+    do_actions,
+    prepare_row,
+    remap_columns,
+)
+from . stage_timer import (
+    StageTimer,
+    measure_detail,
+    profile_function,
+)
+from . columnar import (
+    ColumnarAction,
+    NotVectorizable,
+    Prefilter,
+    compare_engine_results,
+    convert_rows_columnar,
+    run_prefilter,
+)
+from . types import (
+    INPUT_SNAPSHOT,
+    GlobalStatus,
+    Row,
+)
+
+def assign_array(
+    row: Row,
+    dict_config: Mapping[str, list[AssignArrayConfig]],
+):
+    #ic(dict_config)
+    arrays = OrderedDict()
+    for key, config in dict_config.items():
+        array = []
+        for item in config:
+            value, found = search_column_value(row.nested, item.field)
+            if found and value is not None:
+                array.append(value)
+            elif not item.optional:
+                array.append(None)
+        arrays[key] = array
+    for key, array in arrays.items():
+        set_row_staging_value(row, key, array)
+    return row
+
+def search_column_value_from_nested(
+    nested_row: OrderedDict,
+    column: str,
+):
+    if STAGING_FIELD in nested_row:
+        value, found = get_nested_field_value(nested_row[STAGING_FIELD], column)
+        if found:
+            return value, True
+    value, found = get_nested_field_value(nested_row[STAGING_FIELD], column)
+    original, found = get_nested_field_value(nested_row, f'{STAGING_FIELD}.{INPUT_FIELD}')
+    if found:
+        value, found = get_nested_field_value(original, column)
+        if found:
+            return value, True
+    value, found = get_nested_field_value(nested_row, column)
+    if found:
+        return value, True
+    return None, False
+
+
+def push_fields(
+    row: Row,
+    list_config: list[PushConfig],
+):
+    nested_row = row.nested
+    for config in list_config:
+        target_value, found = search_column_value_from_nested(nested_row, config.target)
+        if found:
+            array = target_value
+        else:
+            array = []
+            #set_field_value(nested_row, f'{STAGING_FIELD}.{config.target}', array)
+            set_row_staging_value(row, config.target, array)
+        source_value, found = search_column_value_from_nested(nested_row, config.source)
+        if config.condition is None:
+            array.append(source_value)
+            continue
+        condition_value, found = search_column_value_from_nested(nested_row, config.condition)
+        if condition_value:
+            array.append(source_value)
+    return row
+
+def assign_length(
+    row: Row,
+    dict_fields: OrderedDict,
+):
+    lengths = OrderedDict()
+    for key, field in dict_fields.items():
+        value, found = search_column_value(row.nested, field)
+        if found:
+            lengths[key] = len(value)
+    for key, length in lengths.items():
+        set_row_staging_value(row, key, length)
+    return row
+
+def convert_rows(
+    global_status: GlobalStatus,
+    config: Config,
+    df: pd.DataFrame,
+    input_file: str,
+    output_debug: bool = False,
+    verbose: bool = False,
+    row_list_filtered_out: list[OrderedDict] | None = None,
+    plan: list[ActionFunction] | None = None,
+    prefilter: Prefilter | None = None,
+    stage_timer: StageTimer | None = None,
+):
+    '''
+    Convert the rows of a loaded DataFrame one at a time and return the list
+    of the converted flat rows. Filtered out rows are appended to
+    row_list_filtered_out if given.
+    The rows dropped by the hoisted filters of the prefilter are not made
+    into Row objects. The rows of a DataFrame with a schema are bound to it
+    and hold only the list of the values.
+    With a detailed stage timer, the stages of each row are measured.
+    '''
+    if plan is None:
+        plan = compile_actions(config.actions)
+    positional_columns = df.attrs.get(POSITIONAL_COLUMNS_ATTR)
+    # NOTE: NaN を None に変換しておかないと厄介
+    with measure_detail(stage_timer, 'replace'):
+        df = df.replace([np.nan], [None])
+    columns = frozenset(df.columns)
+    keep = None
+    if prefilter is not None:
+        with measure_detail(stage_timer, 'prefilter'):
+            keep = run_prefilter(prefilter, df, input_file)
+        if keep is not None:
+            plan = prefilter.plan
+            if row_list_filtered_out is None and not verbose:
+                # NOTE: 除外された行は読み飛ばす
+                df = df[keep]
+                keep = None
+    list_columns = list(df.columns)
+    schema = create_row_schema(list_columns)
+    def make_row(values):
+        if schema is not None:
+            return Row(columns=columns, schema=schema, values=values)
+        return prepare_row(OrderedDict(zip(list_columns, values)), columns)
+    positional_slots = []
+    if positional_columns:
+        positional_slots = [
+            (str(position), list_columns.index(column))
+            for position, column in positional_columns.items()
+        ]
+    def prepare_input_row(values, index):
+        row = make_row(values)
+        if schema is not None or STAGING_FIELD not in row.nested:
+            if schema is not None:
+                # NOTE: スナップショットは値のリストを共有し、必要になるまで作らない
+                input_row = INPUT_SNAPSHOT
+            else:
+                # NOTE: 入力のスナップショットは入れ子の OrderedDict として複製しておく
+                input_row = nest_value(row.nested)
+            set_row_staging_value(row, FILE_FIELD, input_file)
+            set_row_staging_value(row, FILE_ROW_INDEX_FIELD, f'{input_file}:{index}')
+            set_row_staging_value(row, ROW_INDEX_FIELD, index)
+            set_row_staging_value(row, INPUT_FIELD, input_row)
+            if positional_slots:
+                set_row_staging_value(row, VALUES_FIELD, OrderedDict(
+                    (position, values[slot]) for position, slot in positional_slots
+                ))
+        return row
+    # NOTE: 計測しない場合は元の関数がそのまま使われる
+    prepare_input_row = profile_function(stage_timer, 'prepare_row', prepare_input_row)
+    run_assign_array = profile_function(stage_timer, 'process.assign_array', assign_array)
+    run_push_fields = profile_function(stage_timer, 'process.push', push_fields)
+    run_assign_length = profile_function(stage_timer, 'process.assign_length', assign_length)
+    run_actions = profile_function(stage_timer, 'actions', do_actions)
+    run_remap_columns = profile_function(stage_timer, 'remap_columns', remap_columns)
+    run_discard_staging = profile_function(stage_timer, 'discard_staging', discard_row_staging)
+    # NOTE: iterrows と同じく共通の型の配列にしてから Python の値として取り出す
+    array = df.to_numpy()
+    new_flat_rows = []
+    for position, index in enumerate(df.index):
+        values = array[position].tolist()
+        if keep is not None and not keep[position]:
+            if verbose or row_list_filtered_out is not None:
+                # NOTE: ステージングを除いた入力の行と同じになる
+                filtered_flat_row = make_row(values).flat
+                if verbose:
+                    ic('Filtered out: ', filtered_flat_row)
+                if row_list_filtered_out is not None:
+                    row_list_filtered_out.append(filtered_flat_row)
+            continue
+        #if flat_row.empty:
+        #    continue
+        row = prepare_input_row(values, index)
+        if config.process.assign_array:
+            run_assign_array(row, config.process.assign_array)
+        if config.process.push:
+            run_push_fields(row, config.process.push)
+        if config.process.assign_length:
+            run_assign_length(row, config.process.assign_length)
+        if plan:
+            try:
+                new_row = run_actions(global_status, row, plan)
+                if new_row is None:
+                    if not output_debug:
+                        run_discard_staging(row)
+                    if verbose:
+                        ic('Filtered out: ', row.flat)
+                    if row_list_filtered_out is not None:
+                        row_list_filtered_out.append(row.flat)
+                    continue
+                row = new_row
+            except Exception as e:
+                if verbose:
+                    ic(index)
+                    ic(OrderedDict(zip(list_columns, values)))
+                    ic(row.flat)
+                raise e
+        if config.pick:
+            run_remap_columns(row, config.pick, keep_staging=output_debug)
+        if not output_debug:
+            run_discard_staging(row)
+        new_flat_rows.append(row.flat)
+    return new_flat_rows
+
+def convert_frame(
+    global_status: GlobalStatus,
+    config: Config,
+    df: pd.DataFrame,
+    input_file: str,
+    output_debug: bool = False,
+    verbose: bool = False,
+    row_list_filtered_out: list[OrderedDict] | None = None,
+    plan: list[ActionFunction] | None = None,
+    columnar_plan: list[ColumnarAction] | None = None,
+    engine: str = 'row',
+    prefilter: Prefilter | None = None,
+    stage_timer: StageTimer | None = None,
+) -> pd.DataFrame:
+    '''
+    Convert a loaded DataFrame with the given engine. The columnar engine
+    falls back to the row engine for the frames it can not vectorize, and
+    the compare engine runs both and raises if the results differ.
+    '''
+    if engine not in ENGINES:
+        raise ValueError(f'Unsupported engine: {engine}')
+    columnar_df = None
+    columnar_filtered_out = None
+    if engine != 'row' and columnar_plan is not None:
+        if row_list_filtered_out is not None:
+            columnar_filtered_out = []
+        try:
+            with measure_detail(stage_timer, 'columnar'):
+                columnar_df = convert_rows_columnar(
+                    config,
+                    columnar_plan,
+                    df,
+                    input_file,
+                    row_list_filtered_out = columnar_filtered_out,
+                )
+        except NotVectorizable as e:
+            if verbose:
+                ic('Falling back to the row engine: ', e)
+        if columnar_df is not None and engine == 'columnar':
+            if row_list_filtered_out is not None:
+                row_list_filtered_out.extend(columnar_filtered_out)
+            return columnar_df
+    row_filtered_out = None
+    if row_list_filtered_out is not None:
+        row_filtered_out = []
+    new_flat_rows = convert_rows(
+        global_status,
+        config,
+        df,
+        input_file,
+        output_debug = output_debug,
+        verbose = verbose,
+        row_list_filtered_out = row_filtered_out,
+        plan = plan,
+        prefilter = prefilter,
+        stage_timer = stage_timer,
+    )
+    with measure_detail(stage_timer, 'build_frame'):
+        new_df = pd.DataFrame(new_flat_rows)
+    if columnar_df is not None:
+        compare_engine_results(
+            input_file,
+            new_df,
+            columnar_df,
+            row_filtered_out,
+            columnar_filtered_out,
+        )
+    if row_list_filtered_out is not None:
+        row_list_filtered_out.extend(row_filtered_out)
+    return new_df
+
@@ -0,0 +1,159 @@
+'''
+Source expressions of the assign actions, such as "city || name ?? 'unknown'",
+parsed once into a small tree of columns, literals and fallback operators.
+'''
+
+import ast
+import dataclasses
+import functools
+import re
+
+from typing import (
+    Any,
+)
+
+OPERATOR_PATTERN = re.compile(r'(\|\||\?\?)')
+LITERAL_PATTERN = re.compile(
+    r'''("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')\s*(?=\)|\|\||\?\?|$)'''
+)
+WHITESPACE_PATTERN = re.compile(r'\s*')
+
+@dataclasses.dataclass(frozen=True)
+class ColumnExpression:
+    column: str
+
+@dataclasses.dataclass(frozen=True)
+class LiteralExpression:
+    value: Any
+    text: str
+
+@dataclasses.dataclass(frozen=True)
+class FallbackExpression:
+    '''
+    "||" takes the left value if it is truthy, and "??" if it is found and
+    not None, otherwise the right one.
+    '''
+    operator: str
+    left: 'Expression'
+    right: 'Expression'
+
+type Expression = ColumnExpression | LiteralExpression | FallbackExpression
+
+def tokenize_expression(
+    source: str,
+) -> list[tuple[str, Any]]:
+    '''
+    Split the source into the tokens of the parentheses, the operators and
+    the operands. A parenthesis opens a group only at the beginning of an
+    operand, and closes one only at the end of it, so the column names can
+    contain parentheses, like "price (USD)".
+    '''
+    tokens = []
+    depth = 0
+    position = 0
+    while True:
+        # NOTE: 被演算子の前の開き括弧
+        position = WHITESPACE_PATTERN.match(source, position).end()
+        while source.startswith('(', position):
+            tokens.append(('(', None))
+            depth += 1
+            position = WHITESPACE_PATTERN.match(source, position + 1).end()
+        matched = LITERAL_PATTERN.match(source, position)
+        if matched:
+            text = matched.group(1)
+            tokens.append(('literal', LiteralExpression(ast.literal_eval(text), text)))
+            position = matched.end()
+            operator = OPERATOR_PATTERN.search(source, position)
+            end = operator.start() if operator else len(source)
+            closing = source[position:end].strip()
+            if closing.strip(')').strip() or closing.count(')') > depth:
+                raise ValueError(f'Invalid expression: {source!r}')
+        else:
+            operator = OPERATOR_PATTERN.search(source, position)
+            end = operator.start() if operator else len(source)
+            column = source[position:end].strip()
+            closing = ''
+            while depth > len(closing) and column.endswith(')'):
+                # NOTE: 開いている括弧の数だけ末尾の閉じ括弧を取り除く
+                column = column[:-1].rstrip()
+                closing += ')'
+            if not column:
+                raise ValueError(f'Invalid expression: {source!r}')
+            tokens.append(('column', ColumnExpression(column)))
+        for _ in range(closing.count(')')):
+            tokens.append((')', None))
+            depth -= 1
+        if operator is None:
+            break
+        tokens.append(('operator', operator.group(1)))
+        position = operator.end()
+    if depth != 0:
+        raise ValueError(f'Invalid expression: {source!r}')
+    return tokens
+
+@functools.lru_cache(maxsize=1024)
+def parse_expression(
+    source: str,
+) -> Expression:
+    '''
+    Parse the source expression. The operands are the column names, the
+    quoted string literals and the parenthesized expressions, and the
+    operators are evaluated from the left, the rest being the fallback of
+    each operand ("a ?? b || c" is "a ?? (b || c)").
+    Raises ValueError if the expression is malformed.
+    '''
+    tokens = tokenize_expression(source)
+    position = 0
+
+    def parse_operand():
+        nonlocal position
+        kind, value = tokens[position]
+        position += 1
+        if kind == '(':
+            expression = parse_fallback()
+            if position >= len(tokens) or tokens[position][0] != ')':
+                raise ValueError(f'Invalid expression: {source!r}')
+            position += 1
+            return expression
+        if kind in ['column', 'literal']:
+            return value
+        raise ValueError(f'Invalid expression: {source!r}')
+
+    def parse_fallback():
+        nonlocal position
+        left = parse_operand()
+        if position < len(tokens) and tokens[position][0] == 'operator':
+            operator = tokens[position][1]
+            position += 1
+            return FallbackExpression(operator, left, parse_fallback())
+        return left
+
+    expression = parse_fallback()
+    if position != len(tokens):
+        raise ValueError(f'Invalid expression: {source!r}')
+    return expression
+
+def get_expression_columns(
+    expression: Expression,
+) -> list[str]:
+    '''
+    Return the column names referenced by the expression, in order.
+    '''
+    if isinstance(expression, ColumnExpression):
+        return [expression.column]
+    if isinstance(expression, FallbackExpression):
+        return get_expression_columns(expression.left) + \
+            get_expression_columns(expression.right)
+    return []
+
+def iter_fallback_chain(
+    expression: Expression,
+):
+    '''
+    Yield the pairs of the operand and the operator along the right spine of
+    the expression, and finally the last operand with None.
+    '''
+    while isinstance(expression, FallbackExpression):
+        yield expression.left, expression.operator
+        expression = expression.right
+    yield expression, None
@@ -31,10 +31,58 @@ from . set_row_value import set_row_staging_value
 
 from .. types import (
     AssignIdConfig,
+    GlobalStatus,
     IdContextMap,
+    IdMap,
+    LocalId,
+    PrimaryValueTuple,
     Row,
 )
 
+def get_or_assign_id(
+    id_map: IdMap,
+    primary_value: PrimaryValueTuple,
+) -> int:
+    if primary_value not in id_map.dict_value_to_id:
+        field_id = id_map.max_id + 1
+        id_map.max_id = field_id
+        id_map.dict_value_to_id[primary_value] = field_id
+        id_map.dict_id_to_value[field_id] = primary_value
+    else:
+        field_id = id_map.dict_value_to_id[primary_value]
+    return field_id
+
+def get_or_assign_context_id(
+    status: GlobalStatus,
+    context_key: tuple,
+    primary_value: PrimaryValueTuple,
+) -> int:
+    '''
+    Get or assign the ID in the persistent registry if configured,
+    otherwise in the in-memory ID map of the context.
+    '''
+    if status.id_registry is not None:
+        return status.id_registry.get_or_assign_id(context_key, primary_value)
+    return get_or_assign_id(status.id_context_map[context_key], primary_value)
+
+def merge_id_context_map(
+    status: GlobalStatus,
+    local_id_context_map: IdContextMap,
+) -> dict[LocalId, int]:
+    '''
+    Assign the IDs of a worker's ID maps in the global ID maps, in the
+    order the worker assigned them, and return the map from the local IDs
+    to the global IDs. Merging the workers in the input order gives the same
+    IDs as converting the files one after another.
+    '''
+    local_to_global = {}
+    for context_key, local_id_map in local_id_context_map.items():
+        for local_id in range(1, local_id_map.max_id + 1):
+            primary_value = local_id_map.dict_id_to_value[local_id]
+            local_to_global[LocalId(context_key, local_id)] = \
+                get_or_assign_context_id(status, context_key, primary_value)
+    return local_to_global
+
 def assign_id(
     id_context_map: IdContextMap,
     row: Row,
@@ -64,12 +112,6 @@ def assign_id(
     )
     primary_value = tuple(primary_values)
     id_map = id_context_map[context_key]
-    if primary_value not in id_map.dict_value_to_id:
-        field_id = id_map.max_id + 1
-        id_map.max_id = field_id
-        id_map.dict_value_to_id[primary_value] = field_id
-        id_map.dict_id_to_value[field_id] = primary_value
-    else:
-        field_id = id_map.dict_value_to_id[primary_value]
+    field_id = get_or_assign_id(id_map, primary_value)
     set_row_staging_value(row, config.target, field_id)
     return row
@@ -0,0 +1,46 @@
+'''
+Create the schema of the rows of a loaded table, or return None if the rows
+of the table can not be bound to a schema.
+'''
+
+from typing import Iterable
+
+from .. constants import (
+    STAGING_FIELD,
+)
+
+from . get_nested_field_value import parse_field_path
+
+from .. types import (
+    RowSchema,
+)
+
+def create_row_schema(
+    columns: Iterable,
+) -> RowSchema | None:
+    '''
+    The columns must be unique strings without the staging field, and no
+    column may be the parent of another one (e.g. "a" and "a.b").
+    '''
+    columns = tuple(columns)
+    path_slots = {}
+    for slot, column in enumerate(columns):
+        if not isinstance(column, str):
+            return None
+        path = parse_field_path(column)
+        if path[0] == STAGING_FIELD or path in path_slots:
+            return None
+        path_slots[path] = slot
+    parent_paths = set()
+    for path in path_slots:
+        for depth in range(1, len(path)):
+            parent_paths.add(path[:depth])
+    if not parent_paths.isdisjoint(path_slots):
+        # NOTE: 入れ子にすると値が上書きされる
+        return None
+    return RowSchema(
+        columns = columns,
+        path_slots = path_slots,
+        parent_paths = frozenset(parent_paths),
+        dotted = bool(parent_paths),
+    )
@@ -12,13 +12,17 @@ def flatten_row(
     mapping: FieldMap,
     parent_key: str = '',
     new_mapping: FlatFieldMap | None = None,
+    nested_type: type = Mapping,
 ) -> FlatFieldMap:
+    '''
+    Only the values of nested_type are expanded, the other values are leaves.
+    '''
     if new_mapping is None:
         new_mapping = OrderedDict()
     for key, mapped in mapping.items():
         new_key = f'{parent_key}.{key}' if parent_key else key
-        if isinstance(mapped, Mapping):
-            flatten_row(mapped, new_key, new_mapping)
+        if isinstance(mapped, nested_type):
+            flatten_row(mapped, new_key, new_mapping, nested_type)
         else:
             new_mapping[new_key] = mapped
     return new_mapping
@@ -1,6 +1,7 @@
 # Description: Get the value of a field in a dictionary.
 
 from collections import OrderedDict
+from functools import lru_cache
 
 def get_nested_field_value(
     data: OrderedDict | list,
@@ -20,3 +21,40 @@ def get_nested_field_value(
         if field in data:
             return get_nested_field_value(data[field], rest)
     return None, False
+
+@lru_cache(maxsize=4096)
+def parse_field_path(
+    field: str,
+) -> tuple[str, ...]:
+    return tuple(field.split('.'))
+
+def get_nested_path_value(
+    data: OrderedDict | list,
+    path: tuple[str, ...],
+):
+    '''
+    Same as get_nested_field_value, but with the field already split into a
+    path tuple by parse_field_path. As in get_nested_field_value, a key
+    containing dots which matches the rest of the path is tried first at
+    each level.
+    '''
+    last = len(path) - 1
+    for depth, field in enumerate(path):
+        if isinstance(data, dict):
+            if depth < last:
+                rest = '.'.join(path[depth:])
+                if rest in data:
+                    return data[rest], True
+            if field in data:
+                data = data[field]
+                continue
+            return None, False
+        if isinstance(data, list):
+            if field.isdigit():
+                index = int(field)
+                if index < len(data):
+                    data = data[index]
+                    continue
+            return None, False
+        return None, False
+    return data, True
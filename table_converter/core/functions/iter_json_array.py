@@ -0,0 +1,94 @@
+'''
+Yield the elements of a top-level JSON array one at a time, reading the
+file in blocks instead of loading the whole document.
+'''
+
+import json
+import re
+
+from typing import (
+    Any,
+    Iterator,
+    TextIO,
+)
+
+WHITESPACE_PATTERN = re.compile(r'[ \t\n\r]*')
+DELIMITERS = ' \t\n\r,]'
+
+def iter_json_array(
+    f: TextIO,
+    block_size: int = 1 << 20,
+) -> Iterator[Any]:
+    '''
+    The elements are decoded with json.JSONDecoder.raw_decode from a buffer,
+    which is extended while an element is incomplete.
+    Raises ValueError if the document is not an array.
+    '''
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    read_size = block_size
+
+    def fill():
+        # NOTE: 読み込んだ分だけ前方を捨ててバッファを伸ばす
+        nonlocal buffer, position, eof
+        block = f.read(read_size)
+        if not block:
+            eof = True
+            return False
+        buffer = buffer[position:] + block
+        position = 0
+        return True
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            position = WHITESPACE_PATTERN.match(buffer, position).end()
+            if position < len(buffer) or not fill():
+                return
+
+    def error(message):
+        return json.JSONDecodeError(message, buffer, position)
+
+    skip_whitespace()
+    if position >= len(buffer):
+        raise error('Expecting value')
+    if buffer[position] != '[':
+        raise ValueError('Not a JSON array')
+    position += 1
+    skip_whitespace()
+    if position < len(buffer) and buffer[position] == ']':
+        position += 1
+    else:
+        while True:
+            skip_whitespace()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof or not fill():
+                        raise
+                    # NOTE: 大きな要素で何度も解析し直さないよう読み込む量を増やす
+                    read_size *= 2
+                    continue
+                if not eof and (end >= len(buffer) or buffer[end] not in DELIMITERS):
+                    # NOTE: 数値などがバッファの終わりで切れている可能性がある
+                    if fill():
+                        continue
+                break
+            read_size = block_size
+            position = end
+            yield value
+            skip_whitespace()
+            if position >= len(buffer):
+                raise error("Expecting ',' delimiter")
+            if buffer[position] == ']':
+                position += 1
+                break
+            if buffer[position] != ',':
+                raise error("Expecting ',' delimiter")
+            position += 1
+    skip_whitespace()
+    if position < len(buffer):
+        raise error('Extra data')
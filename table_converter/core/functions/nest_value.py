@@ -0,0 +1,24 @@
+'''
+Convert a mapping value into nested OrderedDicts, so that it is expanded in the flat view of a row.
+'''
+
+from collections import OrderedDict
+from typing import (
+    Any,
+    Mapping,
+)
+
+def nest_value(
+    value: Any,
+    depth: int = 0,
+):
+    if depth > 10:
+        raise ValueError(
+            'Depth too high'
+        )
+    if isinstance(value, Mapping):
+        new_value = OrderedDict()
+        for key, sub_value in value.items():
+            new_value[key] = nest_value(sub_value, depth + 1)
+        return new_value
+    return value
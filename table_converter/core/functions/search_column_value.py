@@ -1,5 +1,5 @@
 '''
-This function is used to search for a column value in a row. It will first search in the '__debug__' field, then in the '__debug__.__original__' field, and finally in the row itself. If the value is found, it will be set in the row and returned.
+This function is used to search for a column value in a row. It will first search in the '__staging__' field, then in the row itself, and finally in the '__staging__.__input__' field. If the value is found, the value and the key where it was found are returned.
 '''
 
 from .. constants import (
@@ -8,19 +8,155 @@ from .. constants import (
 )
 
 from collections import OrderedDict
+from functools import lru_cache
+from typing import (
+    Any,
+    Callable,
+)
+
+from . get_nested_field_value import (
+    get_nested_path_value,
+    parse_field_path,
+)
+
+from .. types import (
+    INPUT_SNAPSHOT,
+    Row,
+    is_missing_value,
+)
 
-from . get_nested_field_value import get_nested_field_value
+type ColumnCandidates = tuple[tuple[tuple[str, ...], str], ...]
+
+# NOTE: スキーマが増え続ける場合に備えてキャッシュの大きさを抑える
+MAX_RESOLVED_SCHEMAS = 1024
+
+@lru_cache(maxsize=4096)
+def get_column_candidates(
+    column: str,
+) -> ColumnCandidates:
+    '''
+    Return the pairs of the path tuple and the key to search, in order.
+    '''
+    path = parse_field_path(column)
+    return (
+        ((STAGING_FIELD,) + path, f'{STAGING_FIELD}.{column}'),
+        (path, column),
+        ((STAGING_FIELD, INPUT_FIELD) + path, f'{STAGING_FIELD}.{INPUT_FIELD}.{column}'),
+    )
 
 def search_column_value(
     row: OrderedDict,
     column: str,
 ):
-    for key in [
-        f'{STAGING_FIELD}.{column}',
-        column,
-        f'{STAGING_FIELD}.{INPUT_FIELD}.{column}',
-    ]:
-        value, found = get_nested_field_value(row, key)
+    for path, key in get_column_candidates(column):
+        value, found = get_nested_path_value(row, path)
         if found:
             return value, key
     return None, None
+
+def get_row_path_value(
+    row: Row,
+    path: tuple[str, ...],
+):
+    '''
+    Same as get_nested_path_value in the nested view of the row, but the
+    values of a row bound to a schema are searched without building it
+    where possible.
+    '''
+    values = row.values
+    if values is None:
+        return get_nested_path_value(row.nested, path)
+    if path[0] == STAGING_FIELD:
+        staging = row.staging
+        if staging is None:
+            return None, False
+        if len(path) > 2 and path[1] == INPUT_FIELD and \
+                staging.get(INPUT_FIELD) is INPUT_SNAPSHOT:
+            # NOTE: 入力のスナップショットは値のリストと同じ
+            path = path[2:]
+        elif len(path) > 1 and path[1] != INPUT_FIELD:
+            return get_nested_path_value(staging, path[1:])
+        else:
+            return get_nested_path_value(row.nested, path)
+    found = row.schema.find_path(path)
+    if found is None:
+        return get_nested_path_value(row.nested, path)
+    slot, rest = found
+    if slot < 0:
+        return None, False
+    value = values[slot]
+    if is_missing_value(value):
+        return None, False
+    if rest:
+        return get_nested_path_value(value, rest)
+    return value, True
+
+def search_row_value(
+    row: Row,
+    column: str,
+):
+    '''
+    Same as search_column_value in the nested view of the row.
+    '''
+    for path, key in get_column_candidates(column):
+        value, found = get_row_path_value(row, path)
+        if found:
+            return value, key
+    return None, None
+
+def resolve_column_candidates(
+    candidates: ColumnCandidates,
+    columns: frozenset[str],
+) -> ColumnCandidates:
+    '''
+    Drop the candidates which can not exist in the rows loaded with the given
+    columns. The top level keys of such rows are the first components of the
+    columns and the staging field, and the input snapshot has the same top
+    level keys as the input, so only the staging candidate depends on the row.
+    '''
+    top_fields = set(str(column).split('.', 1)[0] for column in columns)
+    if STAGING_FIELD in top_fields:
+        # NOTE: 入力に既にステージングがある場合は絞り込めない
+        return candidates
+    staging, direct, input = candidates
+    first = direct[0][0]
+    if first == STAGING_FIELD:
+        return (staging, direct)
+    if first in top_fields:
+        return candidates
+    return (staging,)
+
+def compile_column_search(
+    column: str,
+) -> Callable[[Row], tuple[Any, str | None]]:
+    '''
+    Return a function searching the column in a row like search_column_value,
+    with the path parsed once and the possible locations cached per column set
+    of the rows.
+    '''
+    candidates = get_column_candidates(column)
+    dict_resolved: dict[frozenset[str], ColumnCandidates] = {}
+    def search(row: Row):
+        columns = row.columns
+        if columns is None:
+            resolved = candidates
+        else:
+            resolved = dict_resolved.get(columns)
+            if resolved is None:
+                if len(dict_resolved) >= MAX_RESOLVED_SCHEMAS:
+                    dict_resolved.clear()
+                resolved = resolve_column_candidates(candidates, columns)
+                dict_resolved[columns] = resolved
+        if row.values is not None:
+            for path, key in resolved:
+                value, found = get_row_path_value(row, path)
+                if found:
+                    return value, key
+            return None, None
+        nested_row = row.nested
+        for path, key in resolved:
+            value, found = get_nested_path_value(nested_row, path)
+            if found:
+                return value, key
+        return None, None
+    return search
@@ -1,14 +1,17 @@
 '''
-Set a value in a row, both in the flat and nested representations.
+Set a value in a row. Plain dict values are converted into nested OrderedDicts,
+so that they are expanded in the flat view of the row.
 '''
 
+from collections import OrderedDict
 from typing import Any
 
 from .. constants import (
+    INPUT_FIELD,
     STAGING_FIELD,
 )
 
-from . set_flat_field_value import set_flat_field_value
+from . nest_value import nest_value
 from . set_nested_field_value import set_nested_field_value
 
 from .. types import (
@@ -20,7 +23,16 @@ def set_row_value(
     target: str,
     value: Any,
 ):
-    set_flat_field_value(row.flat, target, value)
+    if isinstance(value, dict) and not isinstance(value, OrderedDict):
+        value = nest_value(value)
+    if row.values is not None and target.startswith(f'{STAGING_FIELD}.'):
+        rest = target[len(STAGING_FIELD)+1:]
+        if not rest.startswith(f'{INPUT_FIELD}.'):
+            # NOTE: スキーマに結び付いた行のステージングは別に持つ
+            if row.staging is None:
+                row.staging = OrderedDict()
+            set_nested_field_value(row.staging, rest, value)
+            return row
     set_nested_field_value(row.nested, target, value)
     return row
 
@@ -0,0 +1,162 @@
+'''
+Persistent registry of the IDs assigned by the assign-id actions, so the IDs
+continue across the runs instead of restarting at 1.
+'''
+
+import json
+import sqlite3
+
+from collections import OrderedDict
+from typing import Any
+
+# 3-rd party modules
+
+from icecream import ic
+
+# local
+
+from . constants import (
+    DEFAULT_ID_CACHE_SIZE,
+    ID_REGISTRY_BATCH_SIZE,
+)
+
+def normalize_id_value(
+    value: Any,
+) -> Any:
+    '''
+    Normalize the values equal as dict keys, such as 1, 1.0 and True, into
+    the same value, so they get the same ID as in IdMap.
+    '''
+    if isinstance(value, tuple | list):
+        return [normalize_id_value(item) for item in value]
+    if type(value).__module__ == 'numpy' and hasattr(value, 'item'):
+        # NOTE: numpy のスカラーは Python の値にしてから比べる
+        value = value.item()
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def encode_id_key(
+    key: tuple,
+) -> str:
+    return json.dumps(normalize_id_value(key), ensure_ascii=False, default=str)
+
+class IdRegistry:
+    '''
+    SQLite backed ID maps with an in-memory LRU cache in front.
+    New IDs are inserted in batches, and committed only by close(), so a
+    failed run leaves the registry unchanged. Used as a context manager, the
+    registry is closed if the block succeeds and aborted if it raises.
+    '''
+
+    def __init__(
+        self,
+        path: str,
+        cache_size: int = DEFAULT_ID_CACHE_SIZE,
+        batch_size: int = ID_REGISTRY_BATCH_SIZE,
+    ):
+        self.path = path
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS ids (
+                context TEXT NOT NULL,
+                value TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                PRIMARY KEY (context, value)
+            )
+        ''')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS max_ids (
+                context TEXT PRIMARY KEY,
+                max_id INTEGER NOT NULL
+            )
+        ''')
+        self.cache: OrderedDict[tuple[str, str], int] = OrderedDict()
+        self.pending: dict[tuple[str, str], int] = {}
+        self.max_ids: dict[str, int] = {}
+        self.num_assigned = 0
+
+    def get_max_id(
+        self,
+        context: str,
+    ) -> int:
+        if context not in self.max_ids:
+            row = self.connection.execute(
+                'SELECT max_id FROM max_ids WHERE context = ?', (context,)
+            ).fetchone()
+            self.max_ids[context] = row[0] if row else 0
+        return self.max_ids[context]
+
+    def get_or_assign_id(
+        self,
+        context_key: tuple,
+        primary_value: tuple,
+    ) -> int:
+        key = (encode_id_key(context_key), encode_id_key(primary_value))
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        if key in self.pending:
+            field_id = self.pending[key]
+        else:
+            row = self.connection.execute(
+                'SELECT id FROM ids WHERE context = ? AND value = ?', key
+            ).fetchone()
+            if row:
+                field_id = row[0]
+            else:
+                field_id = self.get_max_id(key[0]) + 1
+                self.max_ids[key[0]] = field_id
+                self.pending[key] = field_id
+                self.num_assigned += 1
+                if len(self.pending) >= self.batch_size:
+                    self.flush()
+        self.cache[key] = field_id
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return field_id
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.connection.executemany(
+            'INSERT INTO ids (context, value, id) VALUES (?, ?, ?)',
+            [(context, value, field_id) for (context, value), field_id in self.pending.items()],
+        )
+        contexts = {context for context, value in self.pending.keys()}
+        self.connection.executemany(
+            'INSERT INTO max_ids (context, max_id) VALUES (?, ?) ' +
+            'ON CONFLICT (context) DO UPDATE SET max_id = excluded.max_id',
+            [(context, self.max_ids[context]) for context in contexts],
+        )
+        self.pending = {}
+
+    def close(self):
+        self.flush()
+        self.connection.commit()
+        self.connection.close()
+        ic(self.path, self.num_assigned)
+
+    def abort(self):
+        '''
+        Discard the IDs assigned in this run and close the connection,
+        releasing the pending write transaction.
+        '''
+        self.pending = {}
+        try:
+            self.connection.rollback()
+        finally:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
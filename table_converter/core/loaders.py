@@ -0,0 +1,575 @@
+'''
+Loaders of the input files, registered by the file extension: loading a
+whole file, loading it in chunks for the streaming mode, and splitting it
+into byte ranges loaded by the parallel workers.
+'''
+
+import csv
+import functools
+import io
+import json
+import os
+
+from typing import (
+    Any,
+    Mapping,
+)
+
+# 3-rd party modules
+
+from icecream import ic
+import numpy as np
+import pandas as pd
+
+# NOTE: openpyxl は読み込みが遅いため、Excel を扱うときに読み込む
+
+# local
+
+from . constants import (
+    DEFAULT_CHUNK_SIZE,
+    POSITIONAL_COLUMNS_ATTR,
+    VALUES_FIELD,
+)
+from . functions.flatten_row import flatten_row
+from . functions.iter_json_array import iter_json_array
+from . row_ranges import (
+    IgnoreRows,
+    RowRanges,
+)
+from . types import FileRange
+
+dict_loaders: dict[str, callable] = {}
+def register_loader(
+    ext: str,
+):
+    def decorator(loader):
+        dict_loaders[ext] = loader
+        return loader
+    return decorator
+
+dict_chunk_loaders: dict[str, callable] = {}
+def register_chunk_loader(
+    ext: str,
+):
+    def decorator(loader):
+        dict_chunk_loaders[ext] = loader
+        return loader
+    return decorator
+
+dict_range_splitters: dict[str, callable] = {}
+def register_range_splitter(
+    ext: str,
+):
+    def decorator(splitter):
+        dict_range_splitters[ext] = splitter
+        return splitter
+    return decorator
+
+dict_range_loaders: dict[str, callable] = {}
+def register_range_loader(
+    ext: str,
+):
+    def decorator(loader):
+        dict_range_loaders[ext] = loader
+        return loader
+    return decorator
+
+def is_referenced_column(
+    column: Any,
+    fields: frozenset[str] | None = None,
+):
+    if fields is None:
+        return True
+    return str(column).split('.', 1)[0] in fields
+
+def select_row_fields(
+    row: Mapping,
+    fields: frozenset[str] | None = None,
+):
+    if fields is None:
+        return row
+    return {
+        key: value for key, value in row.items()
+        if is_referenced_column(key, fields)
+    }
+
+def is_projection_safe(
+    df: pd.DataFrame,
+):
+    '''
+    The rows without object columns are cast to the common type in
+    df.iterrows(), depending on the other columns, so the projected frame
+    gives the same rows only when it still has an object column.
+    '''
+    return any(dtype == object for dtype in df.dtypes)
+
+def drop_ignored_rows(
+    df: pd.DataFrame,
+    ignore_ranges: RowRanges | None = None,
+):
+    if ignore_ranges is None:
+        return df
+    ignored = ignore_ranges.contains(df.index.to_numpy())
+    if not ignored.any():
+        return df
+    return df[~ignored]
+
+def find_csv_skip_rows(
+    input_file: str,
+    ignore_ranges: RowRanges,
+):
+    '''
+    Return the record numbers to give pd.read_csv as skiprows and the row
+    indices of the rows left. The blank lines are counted in skiprows but
+    not in the row indices, so the records are scanned with the csv module.
+    '''
+    with open(input_file, 'r', encoding='utf-8-sig', newline='') as f:
+        # NOTE: pandas は空白だけの行を読み飛ばす
+        blank = np.fromiter((
+            not record or (len(record) == 1 and not record[0].strip())
+            for record in csv.reader(f)
+        ), dtype=bool)
+    record_numbers = np.flatnonzero(~blank)
+    # NOTE: 空行でない最初のレコードがヘッダ
+    record_numbers = record_numbers[1:]
+    ignored = ignore_ranges.contains(np.arange(len(record_numbers)))
+    return record_numbers[ignored], np.flatnonzero(~ignored)
+
+@register_loader('.csv')
+def load_csv(
+    input_file: str,
+    fields: frozenset[str] | None = None,
+    ignore_ranges: RowRanges | None = None,
+):
+    usecols = None
+    if fields is not None:
+        usecols = functools.partial(is_referenced_column, fields=fields)
+    if ignore_ranges is not None:
+        skiprows, index = find_csv_skip_rows(input_file, ignore_ranges)
+        df = pd.read_csv(
+            input_file, encoding='utf-8-sig', usecols=usecols, skiprows=skiprows,
+        )
+        if len(df) == len(index):
+            df.index = index
+            return df
+        ic('Failed to skip the ignored rows while loading: ', input_file)
+        return drop_ignored_rows(load_csv(input_file, fields), ignore_ranges)
+    # utf-8
+    #df = pd.read_csv(input_file)
+    # UTF-8 with BOM
+    df = pd.read_csv(input_file, encoding='utf-8-sig', usecols=usecols)
+    return df
+
+@register_chunk_loader('.csv')
+def load_csv_chunks(
+    input_file: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+):
+    # NOTE: TextFileReader の index はチャンクをまたいで連番になる
+    with pd.read_csv(
+        input_file, encoding='utf-8-sig', chunksize=chunk_size
+    ) as reader:
+        for df in reader:
+            yield df
+
+@register_range_splitter('.csv')
+def split_csv_ranges(
+    input_file: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+):
+    '''
+    Yield the byte ranges of chunk_size rows of the CSV file. The record
+    boundaries are found with the csv module, so quoted fields spanning
+    lines are kept in a range.
+    '''
+    columns = list(
+        pd.read_csv(input_file, encoding='utf-8-sig', nrows=0).columns
+    )
+    with open(input_file, 'rb') as f:
+        offsets = []
+        def iter_lines():
+            offset = 0
+            for line in f:
+                offset += len(line)
+                offsets.append(offset)
+                yield line.decode('utf-8-sig' if offset == len(line) else 'utf-8')
+        reader = csv.reader(iter_lines())
+        # NOTE: 1行目はヘッダ
+        next(reader, None)
+        start = offsets[-1] if offsets else 0
+        first_row_index = 0
+        num_rows = 0
+        for record in reader:
+            # NOTE: pandas は空白だけの行を読み飛ばす
+            if not record or (len(record) == 1 and not record[0].strip()):
+                continue
+            num_rows += 1
+            if num_rows >= chunk_size:
+                end = offsets[-1]
+                yield FileRange(
+                    input_file, start, end, first_row_index, num_rows, columns,
+                )
+                start = end
+                first_row_index += num_rows
+                num_rows = 0
+        if num_rows > 0:
+            yield FileRange(
+                input_file, start, offsets[-1], first_row_index, num_rows, columns,
+            )
+
+@register_range_loader('.csv')
+def load_csv_range(
+    file_range: FileRange,
+    fields: frozenset[str] | None = None,
+):
+    usecols = None
+    if fields is not None:
+        usecols = functools.partial(is_referenced_column, fields=fields)
+    with open(file_range.input_file, 'rb') as f:
+        f.seek(file_range.start)
+        data = f.read(file_range.end - file_range.start)
+    df = pd.read_csv(
+        io.BytesIO(data),
+        encoding='utf-8',
+        header=None,
+        names=file_range.columns,
+        usecols=usecols,
+    )
+    return df
+
+def convert_excel_value(
+    value: Any,
+    error_codes: tuple[str, ...],
+):
+    # NOTE: pd.read_excel (openpyxl) と同じ値に変換する
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        if value.is_integer():
+            return int(value)
+        return value
+    if isinstance(value, str) and value in error_codes:
+        return np.nan
+    return value
+
+def iter_excel_rows(
+    input_file: str,
+    pad_to_dimension: bool = False,
+):
+    '''
+    Yield the rows of the first sheet as lists of the converted cell values,
+    parsing the workbook once in the read-only mode.
+    Trailing empty cells are trimmed like pd.read_excel does, or the rows
+    are padded to the width recorded in the sheet if pad_to_dimension.
+    '''
+    import openpyxl
+    from openpyxl.cell.cell import ERROR_CODES
+    workbook = openpyxl.load_workbook(input_file, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        width = 0
+        if pad_to_dimension:
+            width = sheet.max_column or 0
+        # NOTE: 記録されている範囲が正しいとは限らない
+        sheet.reset_dimensions()
+        for values in sheet.iter_rows(values_only=True):
+            row = [convert_excel_value(value, ERROR_CODES) for value in values]
+            while len(row) > width and row[-1] == '':
+                row.pop()
+            if len(row) < width:
+                row.extend([''] * (width - len(row)))
+            yield row
+    finally:
+        workbook.close()
+
+def parse_excel_rows(
+    rows: list[list],
+    **kwargs,
+):
+    from pandas.io.parsers import TextParser
+    # NOTE: Excelで勝手に日時データなどに変換されてしまうことを防ぐため
+    return TextParser(
+        rows, dtype=str, skip_blank_lines=False, **kwargs
+    ).read()
+
+def set_positional_columns(
+    df: pd.DataFrame,
+    columns: list,
+):
+    # NOTE: 列番号でもアクセスできるよう、列を複製せずに列名の対応だけ持たせる
+    df.attrs[POSITIONAL_COLUMNS_ATTR] = {
+        position: column
+        for position, column in enumerate(columns)
+        if column in df.columns
+    }
+    return df
+
+@register_loader('.xlsx')
+def load_excel(
+    input_file: str,
+    fields: frozenset[str] | None = None,
+    ignore_ranges: RowRanges | None = None,
+):
+    rows = list(iter_excel_rows(input_file))
+    while rows and not rows[-1]:
+        rows.pop()
+    if not rows:
+        return pd.DataFrame()
+    index = None
+    if ignore_ranges is not None:
+        # NOTE: 無視する行は変換する前に取り除く
+        ignored = ignore_ranges.contains(np.arange(len(rows) - 1))
+        index = np.flatnonzero(~ignored)
+        rows = rows[:1] + [rows[position + 1] for position in index]
+    width = max(len(row) for row in rows)
+    rows = [row + [''] * (width - len(row)) for row in rows]
+    df = parse_excel_rows(rows, header=0)
+    if index is not None:
+        df.index = index
+    columns = list(df.columns)
+    # NOTE: 空行は全部の列を見て判定してから列を絞る
+    df = df.dropna(axis=0, how='all')
+    if fields is not None:
+        df = df[[
+            column for position, column in enumerate(columns)
+            if is_referenced_column(column, fields) or
+            is_referenced_column(f'{VALUES_FIELD}.{position}', fields)
+        ]]
+    df = df.dropna(axis=1, how='all')
+    return set_positional_columns(df, columns)
+
+@register_chunk_loader('.xlsx')
+def load_excel_chunks(
+    input_file: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+):
+    '''
+    The columns are fixed by the header row padded to the recorded width of
+    the sheet, and the all-empty columns are not dropped since the later
+    rows are not known yet.
+    '''
+    rows = iter_excel_rows(input_file, pad_to_dimension=True)
+    header = next(rows, None)
+    if not header:
+        return
+    columns = list(parse_excel_rows([header], header=0).columns)
+    width = len(columns)
+    def parse_chunk(chunk, start):
+        df = parse_excel_rows(chunk, header=None, names=columns)
+        df.index = range(start, start + len(chunk))
+        df = df.dropna(axis=0, how='all')
+        return set_positional_columns(df, columns)
+    chunk = []
+    start = 0
+    for row in rows:
+        if len(row) > width:
+            raise ValueError(
+                f'Row wider than the header: {input_file}:{start + len(chunk)}'
+            )
+        chunk.append(row + [''] * (width - len(row)))
+        if len(chunk) >= chunk_size:
+            yield parse_chunk(chunk, start)
+            start += len(chunk)
+            chunk = []
+    if chunk:
+        yield parse_chunk(chunk, start)
+
+@register_loader('.json')
+def load_json(
+    input_file: str,
+    fields: frozenset[str] | None = None,
+    ignore_ranges: RowRanges | None = None,
+):
+    #with open(input_file, 'r') as f:
+    #    data = json.load(f)
+    # NOTE: 配列全体を読み込まず、要素ごとに平坦化していく
+    index = []
+    rows = []
+    for row_index, row in iter_json_rows(input_file, ignore_ranges):
+        index.append(row_index)
+        rows.append(select_row_fields(row, fields))
+    if ignore_ranges is None:
+        return pd.DataFrame(rows)
+    return pd.DataFrame(rows, index=index)
+
+def iter_json_rows(
+    input_file: str,
+    ignore_ranges: RowRanges | None = None,
+):
+    '''
+    Yield the row indices and the flattened elements of the JSON array file
+    one at a time, except the ignored rows.
+    '''
+    with open(input_file, 'r') as f:
+        try:
+            for row_index, row in enumerate(iter_json_array(f)):
+                if ignore_ranges is not None and row_index in ignore_ranges:
+                    continue
+                yield row_index, flatten_row(row)
+        except json.JSONDecodeError:
+            raise
+        except ValueError:
+            raise ValueError(f'Invalid JSON array data: {input_file}')
+
+@register_chunk_loader('.json')
+def load_json_chunks(
+    input_file: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+):
+    rows = []
+    start = 0
+    for row_index, row in iter_json_rows(input_file):
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            yield pd.DataFrame(rows, index=range(start, start + len(rows)))
+            start += len(rows)
+            rows = []
+    if rows:
+        yield pd.DataFrame(rows, index=range(start, start + len(rows)))
+
+@register_loader('.jsonl')
+def load_jsonl(
+    input_file: str,
+    fields: frozenset[str] | None = None,
+    ignore_ranges: RowRanges | None = None,
+):
+    index = []
+    rows = []
+    with open(input_file, 'r') as f:
+        for row_index, line in enumerate(f):
+            if ignore_ranges is not None and row_index in ignore_ranges:
+                # NOTE: 無視する行は解析しない
+                continue
+            row = json.loads(line)
+            index.append(row_index)
+            rows.append(select_row_fields(row, fields))
+    if ignore_ranges is None:
+        return pd.DataFrame(rows)
+    return pd.DataFrame(rows, index=index)
+
+@register_chunk_loader('.jsonl')
+def load_jsonl_chunks(
+    input_file: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+):
+    rows = []
+    start = 0
+    with open(input_file, 'r') as f:
+        for line in f:
+            row = json.loads(line)
+            rows.append(row)
+            if len(rows) >= chunk_size:
+                yield pd.DataFrame(rows, index=range(start, start + len(rows)))
+                start += len(rows)
+                rows = []
+    if rows:
+        yield pd.DataFrame(rows, index=range(start, start + len(rows)))
+
+@register_range_splitter('.jsonl')
+def split_jsonl_ranges(
+    input_file: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+):
+    '''
+    Yield the byte ranges of chunk_size lines of the JSONL file.
+    '''
+    with open(input_file, 'rb') as f:
+        start = 0
+        end = 0
+        first_row_index = 0
+        num_rows = 0
+        for line in f:
+            end += len(line)
+            num_rows += 1
+            if num_rows >= chunk_size:
+                yield FileRange(input_file, start, end, first_row_index, num_rows)
+                start = end
+                first_row_index += num_rows
+                num_rows = 0
+        if num_rows > 0:
+            yield FileRange(input_file, start, end, first_row_index, num_rows)
+
+@register_range_loader('.jsonl')
+def load_jsonl_range(
+    file_range: FileRange,
+    fields: frozenset[str] | None = None,
+):
+    with open(file_range.input_file, 'rb') as f:
+        f.seek(file_range.start)
+        data = f.read(file_range.end - file_range.start)
+    rows = [
+        select_row_fields(json.loads(line), fields)
+        for line in io.BytesIO(data)
+    ]
+    return pd.DataFrame(rows)
+
+def iter_input_chunks(
+    input_file: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ignore_rows: IgnoreRows | None = None,
+):
+    '''
+    Yield the input file as DataFrames of at most chunk_size rows, without
+    the ignored rows.
+    Formats without a chunk loader are loaded at once and then sliced.
+    '''
+    ext = os.path.splitext(input_file)[1]
+    ignore_ranges = ignore_rows.get_ranges(input_file) if ignore_rows else None
+    if ext in dict_chunk_loaders:
+        for df in dict_chunk_loaders[ext](input_file, chunk_size):
+            yield drop_ignored_rows(df, ignore_ranges)
+        return
+    if ext not in dict_loaders:
+        raise ValueError(f'Unsupported file type: {ext}')
+    df = dict_loaders[ext](input_file, ignore_ranges=ignore_ranges)
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start+chunk_size]
+
+def load_input_file(
+    input_file: str,
+    fields: frozenset[str] | None = None,
+    ignore_rows: IgnoreRows | None = None,
+) -> pd.DataFrame:
+    '''
+    Load the input file with only the columns referenced by the fields if
+    given, or with all the columns if the projection is not safe.
+    The ignored rows are skipped by the loaders.
+    '''
+    ext = os.path.splitext(input_file)[1]
+    if ext not in dict_loaders:
+        raise ValueError(f'Unsupported file type: {ext}')
+    ignore_ranges = ignore_rows.get_ranges(input_file) if ignore_rows else None
+    if fields is not None:
+        df = dict_loaders[ext](input_file, fields=fields, ignore_ranges=ignore_ranges)
+        if is_projection_safe(df):
+            return df
+        ic('Loading all the columns: ', input_file)
+    return dict_loaders[ext](input_file, ignore_ranges=ignore_ranges)
+
+def load_file_range(
+    file_range: FileRange,
+    fields: frozenset[str] | None = None,
+    ignore_rows: IgnoreRows | None = None,
+) -> pd.DataFrame:
+    ext = os.path.splitext(file_range.input_file)[1]
+    df = None
+    if fields is not None:
+        df = dict_range_loaders[ext](file_range, fields=fields)
+        if not is_projection_safe(df):
+            df = None
+    if df is None:
+        df = dict_range_loaders[ext](file_range)
+    if len(df) != file_range.num_rows:
+        raise ValueError(
+            'Number of rows in the byte range does not match, ' +
+            f'expected: {file_range.num_rows}, loaded: {len(df)}, ' +
+            f'file: {file_range.input_file}, range: {file_range.start}-{file_range.end}'
+        )
+    df.index = range(
+        file_range.first_row_index,
+        file_range.first_row_index + file_range.num_rows,
+    )
+    if ignore_rows:
+        df = drop_ignored_rows(df, ignore_rows.get_ranges(file_range.input_file))
+    return df
+
@@ -0,0 +1,280 @@
+'''
+Memory usage of the stages of a conversion, traced with tracemalloc and
+sampled as the RSS of the process, attributed to each stage and each input
+file, for sizing the machines and comparing the options.
+'''
+
+import dataclasses
+import os
+import sys
+import threading
+import tracemalloc
+
+from collections import defaultdict
+from typing import Any
+
+try:
+    # NOTE: Windows には resource モジュールがない
+    import resource
+except ImportError:
+    resource = None
+
+DEFAULT_SAMPLE_INTERVAL = 0.01
+
+def get_current_rss() -> int | None:
+    '''
+    Return the current RSS in bytes, or None if it can not be read.
+    '''
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def get_peak_rss() -> int | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak
+    # NOTE: Linux では KiB 単位
+    return peak * 1024
+
+class RssSampler:
+    '''
+    Sample the RSS in a background thread, keeping the peak since it was
+    last taken, so the short peaks inside a stage are not missed.
+    '''
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_SAMPLE_INTERVAL,
+    ):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.peak = get_current_rss()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def sample(self) -> int:
+        rss = get_current_rss()
+        with self.lock:
+            self.peak = max(self.peak, rss)
+        return rss
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def take_peak(self) -> tuple[int, int]:
+        '''
+        Return the peak since the last call and the current RSS, and start
+        a new peak from the current RSS.
+        '''
+        rss = get_current_rss()
+        with self.lock:
+            peak = max(self.peak, rss)
+            self.peak = rss
+        return peak, rss
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+@dataclasses.dataclass
+class MemoryUsage:
+    '''
+    The peak is the most allocated above the start of a call, and the
+    retained is the sum of the allocated at the end minus at the start.
+    '''
+    calls: int = 0
+    peak_bytes: int = 0
+    retained_bytes: int = 0
+    peak_rss_bytes: int | None = None
+    rss_delta_bytes: int | None = None
+
+    def add(
+        self,
+        peak_bytes: int,
+        retained_bytes: int,
+        peak_rss_bytes: int | None,
+        rss_delta_bytes: int | None,
+    ):
+        self.calls += 1
+        self.peak_bytes = max(self.peak_bytes, peak_bytes)
+        self.retained_bytes += retained_bytes
+        if peak_rss_bytes is not None:
+            self.peak_rss_bytes = max(self.peak_rss_bytes or 0, peak_rss_bytes)
+            self.rss_delta_bytes = (self.rss_delta_bytes or 0) + rss_delta_bytes
+
+@dataclasses.dataclass
+class MemoryFrame:
+    stage: str
+    input_file: str | None
+    # NOTE: 同じファイルの外側の段階の中なら、ファイルの集計には含めない
+    outermost: bool
+    start_bytes: int
+    peak_bytes: int
+    start_rss: int | None
+    peak_rss: int | None
+
+class MemoryTracker:
+    '''
+    Track the memory of the stages entered and exited by a StageTimer.
+    tracemalloc is started by start() unless already tracing, and slows
+    down the conversion while tracing.
+    '''
+
+    def __init__(
+        self,
+        sample_interval: float = DEFAULT_SAMPLE_INTERVAL,
+    ):
+        self.sample_interval = sample_interval
+        self.sampler: RssSampler | None = None
+        self.started_tracing = False
+        self.stack: list[MemoryFrame] = []
+        self.dict_stages: dict[tuple[str, str | None], MemoryUsage] = \
+            defaultdict(MemoryUsage)
+        self.dict_files: dict[str, MemoryUsage] = defaultdict(MemoryUsage)
+        self.peak_bytes = 0
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        if get_current_rss() is not None:
+            self.sampler = RssSampler(self.sample_interval)
+            self.sampler.start()
+
+    def stop(self):
+        if self.sampler:
+            self.sampler.stop()
+        self.peak_bytes = max(self.peak_bytes, tracemalloc.get_traced_memory()[1])
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def take_peaks(self) -> tuple[int, int, int | None, int | None]:
+        '''
+        Return the traced and the RSS peaks since the last call with the
+        current values, folding the peaks into the enclosing stage.
+        '''
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        peak_rss = rss = None
+        if self.sampler:
+            peak_rss, rss = self.sampler.take_peak()
+        self.peak_bytes = max(self.peak_bytes, peak)
+        if self.stack:
+            frame = self.stack[-1]
+            frame.peak_bytes = max(frame.peak_bytes, peak)
+            if peak_rss is not None:
+                frame.peak_rss = max(frame.peak_rss, peak_rss)
+        return current, peak, peak_rss, rss
+
+    def enter(
+        self,
+        stage: str,
+        input_file: str | None = None,
+    ):
+        current, _, _, rss = self.take_peaks()
+        outermost = input_file is not None and not any(
+            frame.input_file == input_file for frame in self.stack
+        )
+        self.stack.append(MemoryFrame(
+            stage = stage,
+            input_file = input_file,
+            outermost = outermost,
+            start_bytes = current,
+            peak_bytes = current,
+            start_rss = rss,
+            peak_rss = rss,
+        ))
+
+    def exit(self):
+        current, _, _, rss = self.take_peaks()
+        frame = self.stack.pop()
+        peak_rss = rss_delta = None
+        if frame.start_rss is not None:
+            peak_rss = frame.peak_rss
+            rss_delta = rss - frame.start_rss
+        usage = (
+            frame.peak_bytes - frame.start_bytes,
+            current - frame.start_bytes,
+            peak_rss,
+            rss_delta,
+        )
+        self.dict_stages[frame.stage, frame.input_file].add(*usage)
+        if frame.outermost:
+            self.dict_files[frame.input_file].add(*usage)
+        if self.stack:
+            parent = self.stack[-1]
+            parent.peak_bytes = max(parent.peak_bytes, frame.peak_bytes)
+            if frame.peak_rss is not None:
+                parent.peak_rss = max(parent.peak_rss, frame.peak_rss)
+
+def get_memory_report(
+    tracker: MemoryTracker,
+) -> dict[str, Any]:
+    '''
+    Return the memory usage of the stages and the input files, ranked by
+    the traced peak.
+    '''
+    stages = [
+        {'stage': stage, 'input_file': input_file} | dataclasses.asdict(usage)
+        for (stage, input_file), usage in tracker.dict_stages.items()
+    ]
+    stages.sort(key=lambda stage: stage['peak_bytes'], reverse=True)
+    files = [
+        {'input_file': input_file} | dataclasses.asdict(usage)
+        for input_file, usage in tracker.dict_files.items()
+    ]
+    files.sort(key=lambda file: file['peak_bytes'], reverse=True)
+    return {
+        'peak_bytes': tracker.peak_bytes,
+        'peak_rss_bytes': get_peak_rss(),
+        'stages': stages,
+        'files': files,
+    }
+
+def format_bytes(
+    num_bytes: int | None,
+) -> str:
+    if num_bytes is None:
+        return '-'
+    return f'{num_bytes / (1 << 20):.1f}'
+
+def format_memory_report(
+    report: dict[str, Any],
+) -> str:
+    header = f'{"peak MiB":>10} {"retained":>10} {"peak RSS":>10} {"RSS diff":>10} {"calls":>8}  '
+    lines = [header + 'stage']
+    for stage in report['stages']:
+        name = stage['stage']
+        if stage['input_file'] is not None:
+            name += f' ({stage["input_file"]})'
+        lines.append(
+            f'{format_bytes(stage["peak_bytes"]):>10} ' +
+            f'{format_bytes(stage["retained_bytes"]):>10} ' +
+            f'{format_bytes(stage["peak_rss_bytes"]):>10} ' +
+            f'{format_bytes(stage["rss_delta_bytes"]):>10} ' +
+            f'{stage["calls"]:8d}  {name}'
+        )
+    if report['files']:
+        lines.append(header + 'input file')
+        for file in report['files']:
+            lines.append(
+                f'{format_bytes(file["peak_bytes"]):>10} ' +
+                f'{format_bytes(file["retained_bytes"]):>10} ' +
+                f'{format_bytes(file["peak_rss_bytes"]):>10} ' +
+                f'{format_bytes(file["rss_delta_bytes"]):>10} ' +
+                f'{file["calls"]:8d}  {file["input_file"]}'
+            )
+    lines.append(
+        f'{format_bytes(report["peak_bytes"]):>10} {"":10} ' +
+        f'{format_bytes(report["peak_rss_bytes"]):>10} {"":10} {"":8}  (total)'
+    )
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,319 @@
+'''
+Conversion in a process pool. The workers assign the IDs in their own ID
+maps, and the results are merged in the input order, so the output is the
+same as in the serial conversion.
+'''
+
+import os
+
+from collections import (
+    OrderedDict,
+    deque,
+)
+from concurrent.futures import ProcessPoolExecutor
+
+from typing import Mapping
+
+# 3-rd party modules
+
+from icecream import ic
+import pandas as pd
+
+# local
+
+from . config import Config
+from . constants import (
+    DEFAULT_CHUNK_SIZE,
+    MAX_IN_FLIGHT_CHUNKS_PER_JOB,
+)
+from . functions.assign_id import merge_id_context_map
+
+from . actions import compile_actions
+from . columnar import (
+    compile_columnar_plan,
+    compile_prefilter,
+)
+from . conversion_cache import ConversionCache
+from . engine import convert_frame
+from . loaders import (
+    dict_range_splitters,
+    iter_input_chunks,
+    load_file_range,
+    load_input_file,
+)
+from . row_ranges import IgnoreRows
+from . types import (
+    FileRange,
+    GlobalStatus,
+    IdContextMap,
+    LocalId,
+)
+
+def resolve_local_ids(
+    df: pd.DataFrame,
+    local_to_global: Mapping[LocalId, int],
+) -> pd.DataFrame:
+    '''
+    Replace the LocalId values in the converted DataFrame by the global IDs.
+    '''
+    def resolve(value):
+        if isinstance(value, LocalId):
+            return local_to_global[value]
+        return value
+    for column in df.columns:
+        series = df[column]
+        if series.dtype != object:
+            continue
+        if not series.map(lambda value: isinstance(value, LocalId)).any():
+            continue
+        # NOTE: 型の推論を行単位の処理で作る DataFrame に合わせる
+        df[column] = pd.Series(series.map(resolve).tolist(), index=series.index)
+    return df
+
+worker_state: dict = {}
+
+def init_convert_worker(
+    config: Config,
+    ignore_rows: IgnoreRows | None,
+    output_debug: bool,
+    verbose: bool,
+    output_filtered_out: bool,
+    engine: str,
+    fields: frozenset[str] | None = None,
+):
+    worker_state['config'] = config
+    worker_state['ignore_rows'] = ignore_rows
+    worker_state['output_debug'] = output_debug
+    worker_state['verbose'] = verbose
+    worker_state['output_filtered_out'] = output_filtered_out
+    worker_state['engine'] = engine
+    worker_state['fields'] = fields
+    worker_state['plan'] = compile_actions(config.actions)
+    worker_state['prefilter'] = compile_prefilter(config, output_debug)
+    worker_state['columnar_plan'] = None
+    if engine != 'row':
+        worker_state['columnar_plan'] = compile_columnar_plan(config, output_debug)
+
+def convert_in_worker(
+    df: pd.DataFrame,
+    input_file: str,
+) -> tuple[pd.DataFrame, list[OrderedDict] | None, IdContextMap]:
+    '''
+    Convert a loaded DataFrame in a worker process. The IDs are assigned in
+    the worker's own ID maps and returned as LocalId values with the maps.
+    '''
+    global_status = GlobalStatus(defer_ids=True)
+    row_list_filtered_out = None
+    if worker_state['output_filtered_out']:
+        row_list_filtered_out = []
+    new_df = convert_frame(
+        global_status,
+        worker_state['config'],
+        df,
+        input_file,
+        output_debug = worker_state['output_debug'],
+        verbose = worker_state['verbose'],
+        row_list_filtered_out = row_list_filtered_out,
+        plan = worker_state['plan'],
+        columnar_plan = worker_state['columnar_plan'],
+        engine = worker_state['engine'],
+        prefilter = worker_state['prefilter'],
+    )
+    # NOTE: defaultdict(lambda) は pickle できないので dict にして返す
+    return new_df, row_list_filtered_out, dict(global_status.id_context_map)
+
+def convert_file_worker(
+    input_file: str,
+):
+    df = load_input_file(input_file, worker_state['fields'], worker_state['ignore_rows'])
+    return convert_in_worker(df, input_file)
+
+def convert_chunk_worker(
+    task: tuple[str, FileRange | pd.DataFrame],
+):
+    input_file, chunk = task
+    if isinstance(chunk, FileRange):
+        chunk = load_file_range(
+            chunk, worker_state['fields'], worker_state['ignore_rows'],
+        )
+    return convert_in_worker(chunk, input_file)
+
+def iter_input_tasks(
+    input_files: list[str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ignore_rows: IgnoreRows | None = None,
+):
+    '''
+    Yield the chunks of the input files for the workers. The formats with a
+    range splitter are passed as byte ranges loaded by the workers, and the
+    others as DataFrames loaded here.
+    '''
+    for input_file in input_files:
+        ic(input_file)
+        ext = os.path.splitext(input_file)[1]
+        if ext in dict_range_splitters:
+            for file_range in dict_range_splitters[ext](input_file, chunk_size):
+                yield input_file, file_range
+        else:
+            for df in iter_input_chunks(input_file, chunk_size, ignore_rows):
+                yield input_file, df
+
+def merge_worker_result(
+    global_status: GlobalStatus,
+    result: tuple[pd.DataFrame, list[OrderedDict] | None, IdContextMap],
+) -> tuple[pd.DataFrame, list[OrderedDict] | None]:
+    '''
+    Merge the ID maps of a worker result into the global ID maps and
+    replace the LocalId values. The results must be merged in the input
+    order, then the IDs are the same as in the serial conversion.
+    '''
+    new_df, row_list_filtered_out, local_id_context_map = result
+    local_to_global = merge_id_context_map(
+        global_status,
+        local_id_context_map,
+    )
+    if local_to_global:
+        new_df = resolve_local_ids(new_df, local_to_global)
+        for flat_row in row_list_filtered_out or []:
+            for key, value in flat_row.items():
+                if isinstance(value, LocalId):
+                    flat_row[key] = local_to_global[value]
+    return new_df, row_list_filtered_out
+
+def create_worker_pool(
+    config: Config,
+    jobs: int,
+    ignore_rows: IgnoreRows | None = None,
+    output_debug: bool = False,
+    verbose: bool = False,
+    output_filtered_out: bool = False,
+    engine: str = 'row',
+    fields: frozenset[str] | None = None,
+):
+    return ProcessPoolExecutor(
+        max_workers = jobs,
+        initializer = init_convert_worker,
+        initargs = (
+            config,
+            ignore_rows,
+            output_debug,
+            verbose,
+            output_filtered_out,
+            engine,
+            fields,
+        ),
+    )
+
+def convert_files_parallel(
+    global_status: GlobalStatus,
+    config: Config,
+    input_files: list[str],
+    jobs: int,
+    ignore_rows: IgnoreRows | None = None,
+    output_debug: bool = False,
+    verbose: bool = False,
+    row_list_filtered_out: list[OrderedDict] | None = None,
+    engine: str = 'row',
+    cache: ConversionCache | None = None,
+    fields: frozenset[str] | None = None,
+) -> list[pd.DataFrame]:
+    '''
+    Convert the input files in a process pool (or in this process if jobs is
+    1) and return the converted DataFrames in the input order.
+    The files found in the cache are not converted again, and the converted
+    files are stored in the cache.
+    '''
+    output_filtered_out = row_list_filtered_out is not None
+    keys = [None] * len(input_files)
+    results = [None] * len(input_files)
+    if cache:
+        for index, input_file in enumerate(input_files):
+            keys[index] = cache.get_key(input_file)
+            results[index] = cache.load(keys[index])
+    missed_files = [
+        input_file for input_file, result in zip(input_files, results) if result is None
+    ]
+    executor = None
+    if jobs > 1 and len(missed_files) > 1:
+        executor = create_worker_pool(
+            config,
+            jobs,
+            ignore_rows = ignore_rows,
+            output_debug = output_debug,
+            verbose = verbose,
+            output_filtered_out = output_filtered_out,
+            engine = engine,
+            fields = fields,
+        )
+        converted = executor.map(convert_file_worker, missed_files)
+    else:
+        # NOTE: このプロセスをワーカーとして使う
+        init_convert_worker(
+            config,
+            ignore_rows,
+            output_debug,
+            verbose,
+            output_filtered_out,
+            engine,
+            fields,
+        )
+        converted = map(convert_file_worker, missed_files)
+    df_list = []
+    try:
+        for input_file, key, result in zip(input_files, keys, results):
+            ic(input_file)
+            if result is None:
+                result = next(converted)
+                if cache:
+                    cache.save(key, result)
+            else:
+                ic('Loaded from the cache: ', input_file)
+            new_df, filtered_out = merge_worker_result(global_status, result)
+            df_list.append(new_df)
+            if output_filtered_out:
+                row_list_filtered_out.extend(filtered_out)
+    finally:
+        if executor:
+            executor.shutdown()
+    if cache:
+        ic(cache.num_hits, cache.num_misses)
+    return df_list
+
+def convert_chunks_parallel(
+    global_status: GlobalStatus,
+    config: Config,
+    input_files: list[str],
+    jobs: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ignore_rows: IgnoreRows | None = None,
+    output_debug: bool = False,
+    verbose: bool = False,
+    output_filtered_out: bool = False,
+    engine: str = 'row',
+    fields: frozenset[str] | None = None,
+):
+    '''
+    Convert the chunks of the input files in a process pool and yield the
+    converted DataFrames and the filtered out rows in the input order.
+    At most MAX_IN_FLIGHT_CHUNKS_PER_JOB chunks per job are submitted ahead
+    of the one being written, so a slow writer holds back the readers.
+    '''
+    max_in_flight = jobs * MAX_IN_FLIGHT_CHUNKS_PER_JOB
+    with create_worker_pool(
+        config,
+        jobs,
+        ignore_rows = ignore_rows,
+        output_debug = output_debug,
+        verbose = verbose,
+        output_filtered_out = output_filtered_out,
+        engine = engine,
+        fields = fields,
+    ) as executor:
+        futures = deque()
+        for task in iter_input_tasks(input_files, chunk_size, ignore_rows):
+            if len(futures) >= max_in_flight:
+                yield merge_worker_result(global_status, futures.popleft().result())
+            futures.append(executor.submit(convert_chunk_worker, task))
+        while futures:
+            yield merge_worker_result(global_status, futures.popleft().result())
+
@@ -0,0 +1,111 @@
+'''
+Row indices to ignore, given by --ignore-file-rows as "file:index" or
+"file:start-end", parsed once into sorted ranges per file, so the rows are
+skipped without building a key string for each row.
+'''
+
+import bisect
+import dataclasses
+import os
+
+from collections import defaultdict
+
+# 3-rd party modules
+
+import numpy as np
+
+@dataclasses.dataclass
+class RowRanges:
+    '''
+    Sorted and disjoint ranges of row indices, inclusive at both ends.
+    '''
+    starts: np.ndarray
+    ends: np.ndarray
+
+    def __contains__(
+        self,
+        index: int,
+    ):
+        position = bisect.bisect_right(self.starts, index) - 1
+        return position >= 0 and index <= self.ends[position]
+
+    def __len__(self):
+        return int((self.ends - self.starts + 1).sum())
+
+    def contains(
+        self,
+        indices: np.ndarray,
+    ) -> np.ndarray:
+        '''
+        Return the boolean mask of the indices in the ranges.
+        '''
+        indices = np.asarray(indices)
+        positions = np.searchsorted(self.starts, indices, side='right') - 1
+        found = positions >= 0
+        found[found] = indices[found] <= self.ends[positions[found]]
+        return found
+
+def merge_row_ranges(
+    ranges: list[tuple[int, int]],
+) -> RowRanges:
+    starts = []
+    ends = []
+    for start, end in sorted(ranges):
+        if ends and start <= ends[-1] + 1:
+            ends[-1] = max(ends[-1], end)
+            continue
+        starts.append(start)
+        ends.append(end)
+    return RowRanges(
+        starts = np.array(starts, dtype=np.int64),
+        ends = np.array(ends, dtype=np.int64),
+    )
+
+def parse_row_range(
+    spec: str,
+) -> tuple[int, int]:
+    try:
+        if '-' in spec:
+            str_start, str_end = spec.split('-', 1)
+            start, end = int(str_start), int(str_end)
+        else:
+            start = end = int(spec)
+    except ValueError:
+        raise ValueError(f'Invalid row range: {spec!r}')
+    if start < 0 or end < start:
+        raise ValueError(f'Invalid row range: {spec!r}')
+    return start, end
+
+class IgnoreRows:
+    '''
+    The ranges of the rows to ignore, keyed by the file path or the base
+    name of the file as given in the specs.
+    '''
+
+    def __init__(
+        self,
+        specs: list[str],
+    ):
+        self.specs = sorted(set(specs))
+        self.dict_ranges: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        for spec in self.specs:
+            if ':' not in spec:
+                raise ValueError(f'Expected "file:rows": {spec!r}')
+            file_key, row_spec = spec.rsplit(':', 1)
+            self.dict_ranges[file_key].append(parse_row_range(row_spec.strip()))
+        self.dict_merged: dict[str, RowRanges | None] = {}
+
+    def get_ranges(
+        self,
+        input_file: str,
+    ) -> RowRanges | None:
+        '''
+        Return the merged ranges of the input file, or None if no rows of the
+        file are ignored.
+        '''
+        if input_file not in self.dict_merged:
+            ranges = []
+            for file_key in set([input_file, os.path.basename(input_file)]):
+                ranges.extend(self.dict_ranges.get(file_key, []))
+            self.dict_merged[input_file] = merge_row_ranges(ranges) if ranges else None
+        return self.dict_merged[input_file]
@@ -0,0 +1,221 @@
+'''
+Cumulative wall time of the stages of a conversion, such as loading,
+converting and saving, measured only when a timer is given to convert().
+The stages measured inside another one are keyed as "parent/child", and a
+detailed timer also measures the stages run for every row and each action.
+With a memory tracker, the memory of the stages of the frames is tracked.
+'''
+
+import contextlib
+import dataclasses
+import time
+
+from collections import defaultdict
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+)
+
+from . memory_tracker import MemoryTracker
+
+@dataclasses.dataclass
+class StageTimer:
+    # NOTE: 行ごとの段階や各アクションまで計測する (--profile)
+    detailed: bool = False
+    memory: MemoryTracker | None = None
+    # NOTE: メモリの使用量を入力ファイルごとに集計する
+    input_file: str | None = None
+    dict_seconds: dict[str, float] = \
+        dataclasses.field(default_factory=lambda: defaultdict(float))
+    dict_calls: dict[str, int] = \
+        dataclasses.field(default_factory=lambda: defaultdict(int))
+    dict_parents: dict[str, str | None] = \
+        dataclasses.field(default_factory=dict)
+    stack: list[tuple[str, float, bool]] = \
+        dataclasses.field(default_factory=list)
+    dict_keys: dict[tuple[str | None, str], str] = \
+        dataclasses.field(default_factory=dict)
+
+    def add(
+        self,
+        stage: str,
+        seconds: float,
+        calls: int = 1,
+    ):
+        self.dict_seconds[stage] += seconds
+        self.dict_calls[stage] += calls
+
+    def enter(
+        self,
+        stage: str,
+        track_memory: bool = True,
+    ):
+        parent = self.stack[-1][0] if self.stack else None
+        key = self.dict_keys.get((parent, stage))
+        if key is None:
+            key = f'{parent}/{stage}' if parent else stage
+            self.dict_keys[parent, stage] = key
+            self.dict_parents[key] = parent
+        track_memory = track_memory and self.memory is not None
+        if track_memory:
+            self.memory.enter(key, self.input_file)
+        self.stack.append((key, time.perf_counter(), track_memory))
+
+    def exit(
+        self,
+        calls: int = 1,
+    ):
+        key, start, track_memory = self.stack.pop()
+        self.add(key, time.perf_counter() - start, calls)
+        if track_memory:
+            self.memory.exit()
+
+    @contextlib.contextmanager
+    def measure(
+        self,
+        stage: str,
+    ):
+        self.enter(stage)
+        try:
+            yield
+        finally:
+            self.exit()
+
+    def as_dict(self) -> dict[str, dict[str, float | int]]:
+        '''
+        Return the seconds and the number of calls of each stage, in the
+        order the stages were first measured.
+        '''
+        return {
+            stage: {
+                'seconds': seconds,
+                'calls': self.dict_calls[stage],
+            }
+            for stage, seconds in self.dict_seconds.items()
+        }
+
+def measure_stage(
+    timer: StageTimer | None,
+    stage: str,
+):
+    if timer is None:
+        return contextlib.nullcontext()
+    return timer.measure(stage)
+
+def set_input_file(
+    timer: StageTimer | None,
+    input_file: str | None,
+):
+    '''
+    Attribute the memory of the following stages to the input file.
+    '''
+    if timer is not None:
+        timer.input_file = input_file
+
+def measure_detail(
+    timer: StageTimer | None,
+    stage: str,
+):
+    '''
+    Same as measure_stage, but only with a detailed timer or a memory
+    tracker.
+    '''
+    if timer is None or not (timer.detailed or timer.memory):
+        return contextlib.nullcontext()
+    return timer.measure(stage)
+
+def profile_function(
+    timer: StageTimer | None,
+    stage: str,
+    function: Callable,
+) -> Callable:
+    '''
+    Return the function measuring each call as the stage with a detailed
+    timer, or the function itself, so the rows are not slowed down unless
+    profiled. The memory is not tracked for each call.
+    '''
+    if timer is None or not timer.detailed:
+        return function
+    def measured(*args, **kwargs):
+        timer.enter(stage, track_memory=False)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timer.exit()
+    return measured
+
+def iter_measured(
+    timer: StageTimer | None,
+    stage: str,
+    iterable: Iterable,
+) -> Iterator:
+    '''
+    Yield the items of the iterable, adding the time spent to produce each
+    item to the stage, which is where the lazy loaders and converters do
+    their work.
+    '''
+    if timer is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        timer.enter(stage)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            timer.exit(calls=0)
+            return
+        except BaseException:
+            timer.exit()
+            raise
+        timer.exit()
+        yield item
+
+def get_stage_report(
+    timer: StageTimer,
+    wall_seconds: float | None = None,
+) -> dict[str, Any]:
+    '''
+    Return the stages ranked by the cumulative seconds, with the seconds
+    spent outside their child stages and the share of the wall time.
+    '''
+    dict_child_seconds = defaultdict(float)
+    for stage, parent in timer.dict_parents.items():
+        if parent is not None:
+            dict_child_seconds[parent] += timer.dict_seconds[stage]
+    if wall_seconds is None:
+        wall_seconds = sum(
+            seconds for stage, seconds in timer.dict_seconds.items()
+            if timer.dict_parents.get(stage) is None
+        )
+    stages = []
+    for stage, seconds in timer.dict_seconds.items():
+        stages.append({
+            'stage': stage,
+            'parent': timer.dict_parents.get(stage),
+            'seconds': seconds,
+            'self_seconds': seconds - dict_child_seconds[stage],
+            'calls': timer.dict_calls[stage],
+            'ratio': seconds / wall_seconds if wall_seconds > 0 else 0.0,
+        })
+    stages.sort(key=lambda stage: stage['seconds'], reverse=True)
+    return {
+        'wall_seconds': wall_seconds,
+        'stages': stages,
+    }
+
+def format_stage_report(
+    report: dict[str, Any],
+) -> str:
+    lines = [
+        f'{"seconds":>10} {"self":>10} {"%":>6} {"calls":>10}  stage',
+    ]
+    for stage in report['stages']:
+        lines.append(
+            f'{stage["seconds"]:10.3f} {stage["self_seconds"]:10.3f} ' +
+            f'{stage["ratio"] * 100:6.1f} {stage["calls"]:10d}  {stage["stage"]}'
+        )
+    lines.append(f'{report["wall_seconds"]:10.3f} {"":10} {100:6.1f} {"":10}  (wall)')
+    return '\n'.join(lines) + '\n'
@@ -4,6 +4,7 @@ for the table_converter package.
 '''
 
 import dataclasses
+import math
 
 from collections import (
     OrderedDict,
@@ -16,10 +17,168 @@ from typing import (
     Mapping,
 )
 
-@dataclasses.dataclass
+from . constants import (
+    INPUT_FIELD,
+    STAGING_FIELD,
+)
+from . functions.flatten_row import flatten_row
+from . functions.nest_row import nest_row
+from . functions.nest_value import nest_value
+
+class InputSnapshot(OrderedDict):
+    '''
+    Placeholder of the input snapshot in the staging of a row bound to a
+    schema, standing for the nested view of the values of the row.
+    '''
+
+INPUT_SNAPSHOT = InputSnapshot()
+
+def is_missing_value(
+    value: Any,
+):
+    # NOTE: NaN は入れ子の行に入れない
+    return isinstance(value, float) and math.isnan(value)
+
+@dataclasses.dataclass(eq=False)
+class RowSchema:
+    '''
+    The columns of a loaded table mapped to the slots of the row values.
+    Only the tables whose columns nest without conflicts have a schema, so
+    a column path is either a leaf of the nested view or not there.
+    '''
+    columns: tuple[str, ...]
+    path_slots: dict[tuple[str, ...], int]
+    parent_paths: frozenset[tuple[str, ...]]
+    dotted: bool
+    dict_found: dict[tuple[str, ...], tuple[int, tuple[str, ...]] | None] = \
+        dataclasses.field(default_factory=dict)
+
+    def find_path(
+        self,
+        path: tuple[str, ...],
+    ) -> tuple[int, tuple[str, ...]] | None:
+        '''
+        Return the slot of the column holding the path with the rest of the
+        path in the value, the slot -1 if the path is not in the values, or
+        None if the path is a parent of the columns (a nested OrderedDict).
+        '''
+        if path in self.dict_found:
+            return self.dict_found[path]
+        found = (-1, ())
+        if path in self.parent_paths:
+            found = None
+        else:
+            for depth in range(len(path), 0, -1):
+                slot = self.path_slots.get(path[:depth])
+                if slot is not None:
+                    found = (slot, path[depth:])
+                    break
+        self.dict_found[path] = found
+        return found
+
+    def nest(
+        self,
+        values: list,
+    ) -> OrderedDict:
+        return nest_row(dict(zip(self.columns, values)))
+
+    def flatten(
+        self,
+        values: list,
+    ) -> list[tuple[str, Any]] | None:
+        '''
+        Return the items of the flat view of the values, or None if a value
+        is a mapping and the flat view is made from the nested view.
+        '''
+        items = []
+        for column, value in zip(self.columns, values):
+            if is_missing_value(value):
+                continue
+            if isinstance(value, dict):
+                return None
+            items.append((column, value))
+        if self.dotted:
+            # NOTE: 入れ子にすると同じ親を持つ列がまとまるので順序が変わる
+            items = list(flatten_row(
+                nest_row(dict(items)), nested_type=OrderedDict,
+            ).items())
+        return items
+
 class Row:
-    flat: OrderedDict
-    nested: OrderedDict
+    '''
+    A row of the table. The nested OrderedDict is the only store of the
+    values, and the flat view is produced from it on demand.
+    Mappings written into the row are nested OrderedDicts and expanded in
+    the flat view, while the other mappings (e.g. dict values given by the
+    loaders) are kept as leaves.
+    columns is the column set of the loaded table the row came from, shared
+    by the rows of the same table and used as the key of the lookup caches.
+    A row bound to a schema holds only the list of the values and the
+    staging fields in a small OrderedDict, with INPUT_SNAPSHOT as the input
+    snapshot, until the nested OrderedDict is needed.
+    '''
+    __slots__ = ['_nested', 'columns', 'schema', 'values', 'staging']
+
+    def __init__(
+        self,
+        nested: OrderedDict | None = None,
+        columns: frozenset[str] | None = None,
+        schema: RowSchema | None = None,
+        values: list | None = None,
+    ):
+        self._nested = OrderedDict() if nested is None else nested
+        self.columns = columns
+        self.schema = schema
+        self.values = values
+        self.staging: OrderedDict | None = None
+
+    @property
+    def nested(self) -> OrderedDict:
+        if self.values is not None:
+            self.unbind()
+        return self._nested
+
+    @nested.setter
+    def nested(
+        self,
+        nested: OrderedDict,
+    ):
+        self._nested = nested
+        self.schema = None
+        self.values = None
+        self.staging = None
+
+    def unbind(self):
+        '''
+        Build the nested OrderedDict from the values and the staging fields.
+        '''
+        nested = self.schema.nest(self.values)
+        staging = self.staging
+        if staging is not None:
+            if staging.get(INPUT_FIELD) is INPUT_SNAPSHOT:
+                staging[INPUT_FIELD] = nest_value(nested)
+            nested[STAGING_FIELD] = staging
+        self.nested = nested
+
+    @property
+    def flat(self) -> OrderedDict:
+        if self.values is None:
+            return flatten_row(self._nested, nested_type=OrderedDict)
+        items = self.schema.flatten(self.values)
+        if items is None:
+            return flatten_row(self.nested, nested_type=OrderedDict)
+        flat = OrderedDict(items)
+        if self.staging is not None:
+            for key, value in self.staging.items():
+                staging_key = f'{STAGING_FIELD}.{key}'
+                if value is INPUT_SNAPSHOT:
+                    for input_key, input_value in items:
+                        flat[f'{staging_key}.{input_key}'] = input_value
+                elif isinstance(value, OrderedDict):
+                    flatten_row(value, staging_key, flat, OrderedDict)
+                else:
+                    flat[staging_key] = value
+        return flat
 
 @dataclasses.dataclass
 class AssignConfig:
@@ -112,7 +271,33 @@ type IdContextMap = Mapping[
     IdMap
 ]
 
+@dataclasses.dataclass
+class FileRange:
+    '''
+    A byte range of an input file aligned to the record boundaries,
+    holding num_rows rows starting at the row index first_row_index.
+    '''
+    input_file: str
+    start: int
+    end: int
+    first_row_index: int
+    num_rows: int
+    columns: list[str] | None = None
+
+@dataclasses.dataclass(frozen=True)
+class LocalId:
+    '''
+    An ID assigned by a parallel worker, valid only in the ID map of the
+    worker until it is renumbered into the global ID map.
+    '''
+    context_key: tuple
+    local_id: int
+
 @dataclasses.dataclass
 class GlobalStatus:
     id_context_map: IdContextMap = \
         dataclasses.field(default_factory=lambda: defaultdict(IdMap))
+    # NOTE: 並列処理のワーカーでは ID を LocalId として割り当てておき、後で採番し直す
+    defer_ids: bool = False
+    # NOTE: 指定されていれば ID は実行をまたいで永続化されたレジストリから割り当てる
+    id_registry: Any = None
@@ -0,0 +1,562 @@
+'''
+Savers of the converted tables, registered by the file extension, and the
+writers appending the converted chunks to the output files in the
+streaming mode.
+'''
+
+import csv
+import datetime
+import io
+import json
+import math
+import numbers
+import os
+import shutil
+
+from typing import (
+    Any,
+    Callable,
+    Mapping,
+)
+
+# 3-rd party modules
+
+from icecream import ic
+import numpy as np
+import pandas as pd
+
+# NOTE: xlsxwriter は読み込みが遅いため、Excel を扱うときに読み込む
+
+try:
+    # NOTE: orjson があれば JSON の書き出しを速くできる
+    import orjson
+except ImportError:
+    orjson = None
+
+# local
+
+from . constants import (
+    DEFAULT_CHUNK_SIZE,
+    EXCEL_MAX_COLUMNS,
+    EXCEL_MAX_ROWS,
+)
+from . functions.nest_row import nest_row as nest
+
+dict_savers: dict[str, callable] = {}
+def register_saver(
+    ext: str,
+):
+    def decorator(saver):
+        dict_savers[ext] = saver
+        return saver
+    return decorator
+
+dict_writers: dict[str, type] = {}
+def register_writer(
+    ext: str,
+):
+    def decorator(writer):
+        dict_writers[ext] = writer
+        return writer
+    return decorator
+
+@register_saver('.json')
+def save_json(
+    df: pd.DataFrame,
+    output_file: str,
+    indent: int | None = 2,
+):
+    # NOTE: この方法だとスラッシュがすべてエスケープされてしまった
+    #df.to_json(
+    #    output_file,
+    #    orient='records',
+    #    force_ascii=False,
+    #    indent=2,
+    #    escape_forward_slashes=False,
+    #)
+    # NOTE: 全行の辞書のリストを作らず、1行ずつ書き出す
+    with JsonWriter(output_file, indent=indent) as writer:
+        writer.write(df)
+
+def is_orjson_compatible(
+    value: Any,
+) -> bool:
+    '''
+    Return True if orjson encodes the value into the same text as json.
+    orjson writes NaN and infinity as null and the small floats without
+    the exponent, so they are left to json.
+    '''
+    if isinstance(value, float):
+        return math.isfinite(value) and (value == 0 or abs(value) >= 1e-4)
+    if isinstance(value, Mapping):
+        return all(is_orjson_compatible(item) for item in value.values())
+    if isinstance(value, list):
+        return all(is_orjson_compatible(item) for item in value)
+    return True
+
+def dump_json(
+    data: Any,
+    indent: int | None = 2,
+) -> str:
+    '''
+    Encode the data into JSON, without escaping the non-ASCII characters
+    and the slashes. Compact without indent.
+    orjson is used if available and it gives the same result.
+    '''
+    if orjson is not None and indent in [2, None] and is_orjson_compatible(data):
+        option = orjson.OPT_INDENT_2 if indent == 2 else 0
+        try:
+            return orjson.dumps(data, option=option).decode('utf-8')
+        except TypeError:
+            # NOTE: 非対応の型などは json に任せる
+            pass
+    if indent is None:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return json.dumps(data, indent=indent, ensure_ascii=False)
+
+def iter_records(
+    df: pd.DataFrame,
+):
+    '''
+    Yield the rows of the DataFrame as dicts one by one, like
+    df.to_dict(orient='records') without the list of all rows.
+    '''
+    columns = list(df.columns)
+    for values in df.itertuples(index=False, name=None):
+        yield dict(zip(columns, values))
+
+@register_saver('.jsonl')
+def save_jsonl(
+    df: pd.DataFrame,
+    output_file: str,
+    nested: bool = False,
+):
+    # NOTE: この方法だとスラッシュがすべてエスケープされてしまった
+    #df.to_json(
+    #    output_file,
+    #    orient='records',
+    #    lines=True,
+    #    force_ascii=False,
+    #)
+    with JsonlWriter(output_file, nested=nested) as writer:
+        writer.write(df)
+
+def iter_row_values(
+    df: pd.DataFrame,
+    batch_size: int = DEFAULT_CHUNK_SIZE,
+):
+    '''
+    Yield the batches of the row values as 2-D arrays, without the Series
+    per row of df.iterrows(). The values are the same as in df.iterrows(),
+    e.g. the rows with only numeric columns are cast to the common type.
+    '''
+    for start in range(0, len(df), batch_size):
+        yield df.iloc[start:start+batch_size].to_numpy()
+
+def encode_json_column(
+    values: np.ndarray,
+    encode: Callable[[Any], str],
+) -> list[str]:
+    '''
+    Encode the values of a column into JSON texts, same as encode() of each
+    value, with the vectorized paths for the common types.
+    '''
+    if len(values) == 0:
+        return []
+    if values.dtype.kind == 'f':
+        items = values.tolist()
+        if orjson is not None:
+            texts = orjson.dumps(items).decode('utf-8')[1:-1].split(',')
+            irregular = ~np.isfinite(values) | ((values != 0) & (np.abs(values) < 1e-4))
+        else:
+            texts = list(map(float.__repr__, items))
+            irregular = ~np.isfinite(values)
+        # NOTE: NaN, Infinity や小さな値は json と同じ書き方にする
+        for index in np.flatnonzero(irregular):
+            texts[index] = encode(items[index])
+        return texts
+    if values.dtype.kind in 'iu':
+        if orjson is not None:
+            return orjson.dumps(values.tolist()).decode('utf-8')[1:-1].split(',')
+        return list(map(int.__repr__, values.tolist()))
+    if values.dtype.kind == 'b':
+        return ['true' if value else 'false' for value in values.tolist()]
+    items = values.tolist()
+    if all(type(item) is str for item in items):
+        return list(map(json.encoder.encode_basestring, items))
+    return list(map(encode, items))
+
+def encode_jsonl_lines(
+    values: np.ndarray,
+    columns: list[str],
+    dtypes: list,
+    encode: Callable[[Any], str],
+) -> list[str]:
+    '''
+    Encode the rows of a 2-D array into JSON object texts column by column,
+    same as encode(dict(zip(columns, row))) of each row. The columns must
+    be unique strings, and dtypes are the types of the original columns.
+    '''
+    if not columns:
+        return ['{}'] * len(values)
+    column_texts = []
+    for index, column in enumerate(columns):
+        column_values = values[:, index]
+        dtype = dtypes[index]
+        if values.dtype == object and isinstance(dtype, np.dtype) and dtype.kind in 'fiub':
+            # NOTE: 元の列が数値なら型を戻してまとめて変換する
+            column_values = column_values.astype(dtype)
+        prefix = f'{json.encoder.encode_basestring(column)}: '
+        texts = encode_json_column(column_values, encode)
+        column_texts.append(list(map(prefix.__add__, texts)))
+    return list(map('{%s}'.__mod__, map(', '.join, zip(*column_texts))))
+
+@register_saver('.csv')
+def save_csv(
+    df: pd.DataFrame,
+    output_file: str,
+):
+    # utf-8
+    #df.to_csv(output_file, index=False)
+    # UTF-8 with BOM
+    df.to_csv(output_file, index=False, encoding='utf-8-sig')
+
+@register_saver('.xlsx')
+def save_excel(
+    df: pd.DataFrame,
+    output_file: str,
+):
+    # NOTE: openpyxl (df.to_excel) ではワークブック全体をメモリ上に構築するため、
+    # xlsxwriter で行ごとに書き出す
+    with ExcelWriter(output_file) as writer:
+        writer.write(df)
+
+class TableWriter:
+    '''
+    Base class of the incremental writers used in the streaming mode.
+    Each call of write() appends the rows of the given DataFrame.
+    The rows are written into a temporary file next to the output file,
+    which replaces the output file on close(), so a failed conversion
+    leaves no partial output.
+    '''
+
+    def __init__(
+        self,
+        output_file: str,
+    ):
+        self.output_file = output_file
+        self.num_rows = 0
+        directory, name = os.path.split(output_file)
+        self.temp_file = os.path.join(directory, f'.{name}.{os.getpid()}.tmp')
+
+    def write(
+        self,
+        df: pd.DataFrame,
+    ):
+        raise NotImplementedError
+
+    def finish(self):
+        '''
+        Complete and close the temporary file.
+        '''
+        pass
+
+    def close(self):
+        self.finish()
+        os.replace(self.temp_file, self.output_file)
+
+    def abort(self):
+        '''
+        Discard the rows written so far, keeping the output file untouched.
+        '''
+        try:
+            self.finish()
+        except Exception as e:
+            ic('Failed to finish the temporary file: ', e)
+        if os.path.exists(self.temp_file):
+            os.remove(self.temp_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+@register_writer('.csv')
+class CsvWriter(TableWriter):
+    '''
+    The rows are written without the header, which is written on close with
+    all the columns seen in the order of their appearance, as pd.concat
+    does. The rows written before new columns appeared are padded with
+    empty values for them.
+    Each chunk infers its own types, so unlike the non-streaming mode an
+    integer column with missing values may be written as 20 in a chunk and
+    as 20.0 in another.
+    '''
+
+    def __init__(
+        self,
+        output_file: str,
+    ):
+        super().__init__(output_file)
+        self.body_file = f'{self.temp_file}.body'
+        self.file = open(self.body_file, 'w', encoding='utf-8', newline='')
+        self.columns = []
+        # NOTE: 書き出した行数と、その時点の列数の組
+        self.widths: list[tuple[int, int]] = []
+
+    def write(
+        self,
+        df: pd.DataFrame,
+    ):
+        if df.empty:
+            return
+        self.columns.extend(
+            column for column in df.columns if column not in self.columns
+        )
+        df = df.reindex(columns=self.columns)
+        df.to_csv(self.file, index=False, header=False)
+        self.widths.append((len(df), len(self.columns)))
+        self.num_rows += len(df)
+
+    def finish(self):
+        if self.file.closed:
+            return
+        self.file.close()
+        try:
+            # UTF-8 with BOM
+            with open(self.temp_file, 'w', encoding='utf-8-sig', newline='') as f:
+                if self.columns:
+                    pd.DataFrame(columns=self.columns).to_csv(f, index=False)
+                with open(self.body_file, 'r', encoding='utf-8', newline='') as body:
+                    if all(width == len(self.columns) for _, width in self.widths):
+                        shutil.copyfileobj(body, f)
+                    else:
+                        self.copy_padded_rows(body, f)
+        finally:
+            os.remove(self.body_file)
+
+    def copy_padded_rows(
+        self,
+        body: io.TextIOBase,
+        output: io.TextIOBase,
+    ):
+        # NOTE: 値の中の改行もあるため、行単位ではなく CSV として読み直す
+        reader = csv.reader(body)
+        writer = csv.writer(output, lineterminator=os.linesep)
+        for num_rows, width in self.widths:
+            padding = [''] * (len(self.columns) - width)
+            for _ in range(num_rows):
+                writer.writerow(next(reader) + padding)
+
+@register_writer('.json')
+class JsonWriter(TableWriter):
+    '''
+    Writes a JSON array of the nested rows, one row at a time.
+    With indent=None the rows are written compactly, one row per line.
+    '''
+
+    def __init__(
+        self,
+        output_file: str,
+        indent: int | None = 2,
+    ):
+        super().__init__(output_file)
+        self.indent = indent
+        self.file = open(self.temp_file, 'w')
+
+    def write(
+        self,
+        df: pd.DataFrame,
+    ):
+        for row in iter_records(df):
+            dumped = dump_json(nest(row), indent=self.indent)
+            if self.num_rows == 0:
+                self.file.write('[\n')
+            else:
+                self.file.write(',\n')
+            if self.indent:
+                # NOTE: json.dump(data, indent=2) と同じ出力になるよう各行を字下げする
+                prefix = ' ' * self.indent
+                self.file.write('\n'.join(f'{prefix}{line}' for line in dumped.split('\n')))
+            else:
+                self.file.write(dumped)
+            self.num_rows += 1
+
+    def finish(self):
+        if self.file.closed:
+            return
+        if self.num_rows == 0:
+            self.file.write('[]')
+        else:
+            self.file.write('\n]')
+        self.file.close()
+
+@register_writer('.jsonl')
+class JsonlWriter(TableWriter):
+    '''
+    Writes a JSON object per row and line, in batches of lines.
+    With nested=True the dotted keys are nested as in the JSON output.
+    '''
+
+    def __init__(
+        self,
+        output_file: str,
+        nested: bool = False,
+    ):
+        super().__init__(output_file)
+        self.nested = nested
+        self.encoder = json.JSONEncoder(ensure_ascii=False)
+        self.file = open(self.temp_file, 'w')
+
+    def write(
+        self,
+        df: pd.DataFrame,
+    ):
+        columns = list(df.columns)
+        dtypes = list(df.dtypes)
+        encode = self.encoder.encode
+        by_column = not self.nested and \
+            len(set(columns)) == len(columns) and \
+            all(isinstance(column, str) for column in columns)
+        for values in iter_row_values(df):
+            if by_column:
+                lines = encode_jsonl_lines(values, columns, dtypes, encode)
+            else:
+                lines = []
+                for row in values.tolist():
+                    data = dict(zip(columns, row))
+                    if self.nested:
+                        data = nest(data)
+                    lines.append(encode(data))
+            self.file.write('\n'.join(lines))
+            self.file.write('\n')
+            self.num_rows += len(lines)
+
+    def finish(self):
+        self.file.close()
+
+@register_writer('.xlsx')
+class ExcelWriter(TableWriter):
+    '''
+    Write the rows with xlsxwriter in the constant_memory mode, so only the
+    current row is kept in memory. When a sheet reaches the row limit of
+    Excel, the rows continue in a new sheet with the same header.
+    '''
+
+    def __init__(
+        self,
+        output_file: str,
+        max_rows: int = EXCEL_MAX_ROWS,
+    ):
+        import xlsxwriter
+        super().__init__(output_file)
+        self.workbook = xlsxwriter.Workbook(self.temp_file, {
+            'constant_memory': True,
+            # NOTE: URL らしき文字列をリンクに変換させない
+            'strings_to_urls': False,
+        })
+        # NOTE: pandas の to_excel と同じ見出しの書式
+        self.header_format = self.workbook.add_format({
+            'bold': True,
+            'border': 1,
+            'align': 'center',
+            'valign': 'top',
+        })
+        self.max_rows = max_rows
+        self.columns = None
+        # NOTE: 行がなかったときの見出し (最初の空の DataFrame の列)
+        self.empty_columns = None
+        self.worksheet = None
+        self.sheet_row = 0
+
+    def set_columns(
+        self,
+        columns: list,
+    ):
+        if len(columns) > EXCEL_MAX_COLUMNS:
+            raise ValueError(
+                f'Too many columns for Excel: {len(columns)}'
+            )
+        self.columns = columns
+        self.add_worksheet()
+
+    def add_worksheet(self):
+        self.worksheet = self.workbook.add_worksheet()
+        for column_index, column in enumerate(self.columns):
+            self.worksheet.write(0, column_index, column, self.header_format)
+        self.sheet_row = 1
+
+    def write_value(
+        self,
+        row_index: int,
+        column_index: int,
+        value: Any,
+    ):
+        if isinstance(value, float) and math.isinf(value):
+            # NOTE: Excel は無限大を数値として扱えない
+            value = 'inf' if value > 0 else '-inf'
+        elif not isinstance(value, str | numbers.Number | datetime.date | datetime.time | datetime.timedelta):
+            # NOTE: リストなどは df.to_excel と同じく文字列にする
+            value = str(value)
+        self.worksheet.write(row_index, column_index, value)
+
+    def write(
+        self,
+        df: pd.DataFrame,
+    ):
+        if df.empty:
+            if self.empty_columns is None:
+                self.empty_columns = list(df.columns)
+            return
+        if self.columns is None:
+            self.set_columns(list(df.columns))
+        new_columns = [
+            column for column in df.columns if column not in self.columns
+        ]
+        if new_columns:
+            raise ValueError(
+                'New columns appeared after the Excel header was written: ' +
+                f'{new_columns}. Use --pick to fix the output columns.'
+            )
+        df = df.reindex(columns=self.columns)
+        for start in range(0, len(df), DEFAULT_CHUNK_SIZE):
+            batch = df.iloc[start:start+DEFAULT_CHUNK_SIZE]
+            # NOTE: 列ごとの型を保ったまま Python の値として取り出す
+            values = batch.to_numpy(dtype=object)
+            missing = batch.isna().to_numpy()
+            for row_values, row_missing in zip(values, missing):
+                if self.sheet_row >= self.max_rows:
+                    self.add_worksheet()
+                for column_index, value in enumerate(row_values):
+                    if row_missing[column_index]:
+                        continue
+                    self.write_value(self.sheet_row, column_index, value)
+                self.sheet_row += 1
+        self.num_rows += len(df)
+
+    def finish(self):
+        if self.workbook.fileclosed:
+            return
+        if self.columns is None:
+            # NOTE: 行が書き出されなかった場合は見出しだけのシートにする
+            self.set_columns(self.empty_columns or [])
+        self.workbook.close()
+
+def get_writer(
+    output_file: str,
+    compact_json: bool = False,
+    nest_jsonl: bool = False,
+):
+    ext = os.path.splitext(output_file)[1]
+    if ext not in dict_writers:
+        raise ValueError(f'Unsupported file type: {ext}')
+    if compact_json and ext == '.json':
+        return dict_writers[ext](output_file, indent=None)
+    if nest_jsonl and ext == '.jsonl':
+        return dict_writers[ext](output_file, nested=True)
+    return dict_writers[ext](output_file)
+
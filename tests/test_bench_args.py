@@ -0,0 +1,27 @@
+'''
+Tests of the validation of the arguments of the bench subcommand.
+'''
+
+import argparse
+
+import pytest
+
+from table_converter.commands.bench import setup_parser
+
+def parse_args(
+    args: list[str],
+) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    setup_parser(parser)
+    return parser.parse_args(args)
+
+def test_widths():
+    assert parse_args(['--widths', '6', '10']).widths == [6, 10]
+
+@pytest.mark.parametrize('width', ['5', '0', 'x'])
+def test_invalid_widths(width, capsys):
+    # NOTE: ValueError ではなく argparse の使い方のエラーで終了する
+    with pytest.raises(SystemExit) as excinfo:
+        parse_args(['--widths', width])
+    assert excinfo.value.code == 2
+    assert 'argument --widths' in capsys.readouterr().err
@@ -0,0 +1,30 @@
+'''
+Tests of the check whether the assigned IDs can be renumbered after a
+parallel conversion.
+'''
+
+import pytest
+
+from table_converter.core.actions import setup_actions_with_args
+from table_converter.core.config import setup_config
+from table_converter.core.convert import can_defer_ids
+
+@pytest.mark.parametrize('list_actions, expected', [
+    (['assign-id:uid=name'], True),
+    (['assign-id:uid=name', 'assign:x=city||name'], True),
+    # NOTE: ID と同じ文字列を含むだけの列や値は参照ではない
+    (['assign-id:id=name', 'assign:identity=name'], True),
+    (['assign-id:id=name', 'filter:name==id'], True),
+    (['assign-id:id=name', 'assign-format:f=id-{name}'], True),
+    (['assign-id:uid=name', 'assign:x=uid'], False),
+    (['assign-id:uid=name', 'assign:x=missing??uid'], False),
+    (['assign-id:uid=name', 'assign-format:f={uid}-{name}'], False),
+    (['assign-id:uid=name', 'filter:uid==1'], False),
+    (['assign-id:uid=name', 'join:j=__staging__.uid'], False),
+    (['assign-id:meta.uid=name', 'assign:x=meta'], False),
+    (['assign-id:uid=name', 'assign-id:uid2=uid'], False),
+])
+def test_can_defer_ids(list_actions, expected):
+    config = setup_config()
+    setup_actions_with_args(config, list_actions)
+    assert can_defer_ids(config) == expected
@@ -0,0 +1,26 @@
+'''
+Tests of the keys of the conversion cache.
+'''
+
+from table_converter.core import conversion_cache
+from table_converter.core.config import setup_config
+from table_converter.core.conversion_cache import (
+    ConversionCache,
+    hash_source_files,
+)
+
+def test_hash_source_files_is_stable():
+    hash_source_files.cache_clear()
+    digest = hash_source_files()
+    hash_source_files.cache_clear()
+    assert hash_source_files() == digest
+
+def test_key_changes_with_source(tmp_path, monkeypatch):
+    input_file = tmp_path / 'input.csv'
+    input_file.write_text('id,name\n1,a\n', encoding='utf-8')
+    cache_dir = str(tmp_path / 'cache')
+    config = setup_config()
+    key = ConversionCache(cache_dir, config).get_key(str(input_file))
+    assert ConversionCache(cache_dir, config).get_key(str(input_file)) == key
+    monkeypatch.setattr(conversion_cache, 'hash_source_files', lambda: 'changed')
+    assert ConversionCache(cache_dir, config).get_key(str(input_file)) != key
@@ -0,0 +1,83 @@
+'''
+Tests of the parser of the source expressions of the assign actions.
+'''
+
+import pytest
+
+from table_converter.core.expressions import (
+    ColumnExpression as Column,
+    FallbackExpression as Fallback,
+    LiteralExpression as Literal,
+    get_expression_columns,
+    iter_fallback_chain,
+    parse_expression,
+)
+
+@pytest.mark.parametrize('source, expected', [
+    ('a', Column('a')),
+    ('  a  ', Column('a')),
+    ('a || b', Fallback('||', Column('a'), Column('b'))),
+    ('a??b', Fallback('??', Column('a'), Column('b'))),
+    # NOTE: 演算子は左から順に評価され、残りが各被演算子の代わりになる
+    ('a ?? b || c', Fallback('??', Column('a'), Fallback('||', Column('b'), Column('c')))),
+    ('a || b ?? c', Fallback('||', Column('a'), Fallback('??', Column('b'), Column('c')))),
+    ('(a ?? b) || c', Fallback('||', Fallback('??', Column('a'), Column('b')), Column('c'))),
+    ('a || (b ?? c)', Fallback('||', Column('a'), Fallback('??', Column('b'), Column('c')))),
+    ('((a))', Column('a')),
+    ("'x'", Literal('x', "'x'")),
+    ("a ?? 'n/a'", Fallback('??', Column('a'), Literal('n/a', "'n/a'"))),
+    ("'x' ?? a", Fallback('??', Literal('x', "'x'"), Column('a'))),
+    ('a ?? "b || c"', Fallback('??', Column('a'), Literal('b || c', '"b || c"'))),
+    (r'a ?? "q\"x"', Fallback('??', Column('a'), Literal('q"x', r'"q\"x"'))),
+    ("(a || 'x') ?? b", Fallback('??', Fallback('||', Column('a'), Literal('x', "'x'")), Column('b'))),
+])
+def test_parse_expression(source, expected):
+    assert parse_expression(source) == expected
+
+@pytest.mark.parametrize('source, expected', [
+    # NOTE: 列名には括弧や単独の記号を含められる
+    ('price (USD)', Column('price (USD)')),
+    ('(price (USD)) ?? x', Fallback('??', Column('price (USD)'), Column('x'))),
+    ('a)', Column('a)')),
+    ('(a))', Column('a)')),
+    ('a | b', Column('a | b')),
+    ('a ? b', Column('a ? b')),
+    ('meta.id ?? __staging__.x', Fallback('??', Column('meta.id'), Column('__staging__.x'))),
+    # NOTE: 引用符の後に続きがあれば列名として扱われる
+    ("a ?? 'x' y", Fallback('??', Column('a'), Column("'x' y"))),
+])
+def test_parse_column_names(source, expected):
+    assert parse_expression(source) == expected
+
+@pytest.mark.parametrize('source', [
+    '',
+    '   ',
+    '||',
+    '??',
+    'a ||',
+    '|| a',
+    'a ?? ?? b',
+    '(a',
+    '(a || b',
+    '()',
+    'a || ()',
+    "'x')",
+    "('x'",
+    "(a || 'x'",
+])
+def test_invalid_expression(source):
+    with pytest.raises(ValueError, match='Invalid expression'):
+        parse_expression(source)
+
+def test_get_expression_columns():
+    expression = parse_expression("(a || 'x') ?? b ?? c || a")
+    assert get_expression_columns(expression) == ['a', 'b', 'c', 'a']
+    assert get_expression_columns(parse_expression("'x'")) == []
+
+def test_iter_fallback_chain():
+    expression = parse_expression("a ?? b || 'x'")
+    assert list(iter_fallback_chain(expression)) == [
+        (Column('a'), '??'),
+        (Column('b'), '||'),
+        (Literal('x', "'x'"), None),
+    ]
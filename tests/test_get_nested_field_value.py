@@ -0,0 +1,55 @@
+'''
+Tests of the lookup of the precompiled field paths against the lookup of
+the field strings.
+'''
+
+import pytest
+
+from table_converter.core.functions.get_nested_field_value import (
+    get_nested_field_value,
+    get_nested_path_value,
+    parse_field_path,
+)
+
+DATA = {
+    'a': {'b': 1, 'c': {'d': 2}},
+    # NOTE: ドットを含むキーと入れ子のパスの両方がある
+    'x.y': 'literal',
+    'x': {'y': 'nested', 'z': {'w.v': 'inner literal', 'w': {'v': 'inner nested'}}},
+    'list': [10, {'k': 'v'}],
+    'none': None,
+}
+
+@pytest.mark.parametrize('field, expected', [
+    ('a', (DATA['a'], True)),
+    ('a.b', (1, True)),
+    ('a.c.d', (2, True)),
+    ('a.missing', (None, False)),
+    ('missing.b', (None, False)),
+    ('x.y', ('literal', True)),
+    ('x.z.w.v', ('inner literal', True)),
+    ('x.z.w', ({'v': 'inner nested'}, True)),
+    ('none', (None, True)),
+    ('none.a', (None, False)),
+    ('a.b.c', (None, False)),
+])
+def test_get_nested_path_value(field, expected):
+    assert get_nested_field_value(DATA, field) == expected
+    assert get_nested_path_value(DATA, parse_field_path(field)) == expected
+
+def test_literal_dotted_key_first():
+    data = {'a': {'b': 'nested'}, 'a.b': 'literal'}
+    assert get_nested_field_value(data, 'a.b') == ('literal', True)
+    assert get_nested_path_value(data, parse_field_path('a.b')) == ('literal', True)
+    # NOTE: ドットを含むキーがなければ入れ子のパスをたどる
+    del data['a.b']
+    assert get_nested_path_value(data, parse_field_path('a.b')) == ('nested', True)
+
+@pytest.mark.parametrize('field, expected', [
+    ('list.0', (10, True)),
+    ('list.1.k', ('v', True)),
+    ('list.2', (None, False)),
+    ('list.k', (None, False)),
+])
+def test_list_index(field, expected):
+    assert get_nested_path_value(DATA, parse_field_path(field)) == expected
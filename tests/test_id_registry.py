@@ -0,0 +1,79 @@
+'''
+Tests of the persistent ID registry.
+'''
+
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from table_converter.core.convert import convert
+from table_converter.core.id_registry import IdRegistry
+from table_converter.core.writers import save_csv
+
+def count_ids(
+    path: str,
+) -> int:
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute('SELECT COUNT(*) FROM ids').fetchone()[0]
+    finally:
+        connection.close()
+
+def test_keys_like_dict_keys(tmp_path):
+    with IdRegistry(os.path.join(tmp_path, 'ids.db')) as registry:
+        ids = [
+            registry.get_or_assign_id((), (value,))
+            for value in [1, 1.0, True, 2, 2.0, 'a', 'a']
+        ]
+    assert ids == [1, 1, 1, 2, 2, 3, 3]
+
+def test_ids_continue_across_runs(tmp_path):
+    path = os.path.join(tmp_path, 'ids.db')
+    with IdRegistry(path) as registry:
+        assert registry.get_or_assign_id((), ('a',)) == 1
+    with IdRegistry(path, batch_size=1) as registry:
+        assert registry.get_or_assign_id((), ('b',)) == 2
+        assert registry.get_or_assign_id((), ('a',)) == 1
+    assert count_ids(path) == 2
+
+def test_failed_run_is_rolled_back(tmp_path):
+    path = os.path.join(tmp_path, 'ids.db')
+    with IdRegistry(path) as registry:
+        registry.get_or_assign_id((), ('a',))
+    with pytest.raises(RuntimeError):
+        # NOTE: 書き込み済みのバッチも取り消される
+        with IdRegistry(path, batch_size=1) as registry:
+            registry.get_or_assign_id((), ('b',))
+            registry.get_or_assign_id((), ('c',))
+            raise RuntimeError('failed')
+    with pytest.raises(sqlite3.ProgrammingError):
+        registry.connection.execute('SELECT 1')
+    assert count_ids(path) == 1
+    with IdRegistry(path) as registry:
+        assert registry.get_or_assign_id((), ('b',)) == 2
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_failed_conversion_is_rolled_back(tmp_path, stream):
+    input_file = os.path.join(tmp_path, 'input.csv')
+    save_csv(pd.DataFrame({'name': ['a', 'b', 'c']}), input_file)
+    path = os.path.join(tmp_path, 'ids.db')
+    with pytest.raises(FileNotFoundError):
+        # NOTE: ID を割り当てた後、出力の書き出しで失敗させる
+        convert(
+            [input_file],
+            output_file = os.path.join(tmp_path, 'missing', 'output.jsonl'),
+            list_actions = ['assign-id:uid=name'],
+            stream = stream,
+            id_registry = path,
+        )
+    assert count_ids(path) == 0
+    convert(
+        [input_file],
+        output_file = os.path.join(tmp_path, 'output.jsonl'),
+        list_actions = ['assign-id:uid=name'],
+        stream = stream,
+        id_registry = path,
+    )
+    assert count_ids(path) == 3
@@ -0,0 +1,72 @@
+'''
+Tests of the incremental parser of top-level JSON arrays, run with every
+block size from 1 to the size of the document, so the elements, strings and
+numbers are cut at every position.
+'''
+
+import io
+import json
+
+import pytest
+
+from table_converter.core.functions.iter_json_array import iter_json_array
+
+DOCUMENTS = [
+    '[]',
+    ' [ ] ',
+    '[1]',
+    '[1, 2.5, -3e-2, 12345678901234567890]',
+    '[true, false, null]',
+    '\n[\n  {"a": 1, "b": "x"},\n  {"a": 2, "b": null}\n]\n',
+    '[{"a": {"b": [1, {"c": "]"}]}}, [[], {}], "[,]"]',
+    r'["quote \" and \\ backslash", "あい", "tab\tnew\nline"]',
+    '["あいう", {"キー": "値"}]',
+    '[{"text": "}, {\\"not\\": \\"a row\\"}, {"}]',
+]
+
+INVALID_DOCUMENTS = [
+    '',
+    '   ',
+    '[',
+    '[1',
+    '[1,',
+    '[1,]',
+    '[,1]',
+    '[1 2]',
+    '[{"a": 1}',
+    '[1] 2',
+    '[1] []',
+    '["unterminated]',
+]
+
+def parse(
+    document: str,
+    block_size: int,
+) -> list:
+    return list(iter_json_array(io.StringIO(document), block_size=block_size))
+
+@pytest.mark.parametrize('document', DOCUMENTS)
+def test_iter_json_array(document):
+    expected = json.loads(document)
+    for block_size in range(1, len(document) + 2):
+        assert parse(document, block_size) == expected, block_size
+
+@pytest.mark.parametrize('document', INVALID_DOCUMENTS)
+def test_invalid_json(document):
+    for block_size in range(1, len(document) + 2):
+        with pytest.raises(json.JSONDecodeError):
+            parse(document, block_size)
+
+@pytest.mark.parametrize('document', ['{"a": 1}', '1', '"[1]"', 'null'])
+def test_not_array(document):
+    for block_size in range(1, len(document) + 2):
+        with pytest.raises(ValueError, match='Not a JSON array'):
+            parse(document, block_size)
+
+def test_elements_are_yielded_before_the_end():
+    # NOTE: 後ろの壊れた部分を読む前に先頭の要素が得られる
+    rows = iter_json_array(io.StringIO('[{"a": 1}, {"a": 2}, oops'), block_size=4)
+    assert next(rows) == {'a': 1}
+    assert next(rows) == {'a': 2}
+    with pytest.raises(json.JSONDecodeError):
+        next(rows)
@@ -0,0 +1,97 @@
+'''
+Tests of the row ranges given by --ignore-file-rows.
+'''
+
+import numpy as np
+import pytest
+
+from table_converter.core.row_ranges import (
+    IgnoreRows,
+    merge_row_ranges,
+    parse_row_range,
+)
+
+@pytest.mark.parametrize('spec, expected', [
+    ('0', (0, 0)),
+    ('3', (3, 3)),
+    ('2-5', (2, 5)),
+    ('4-4', (4, 4)),
+    (' 7 - 9 ', (7, 9)),
+])
+def test_parse_row_range(spec, expected):
+    assert parse_row_range(spec) == expected
+
+@pytest.mark.parametrize('spec', [
+    '',
+    'x',
+    '1.5',
+    '5-',
+    '-3',
+    '-',
+    '5-3',
+    '-1-2',
+    '1-2-3',
+    '1,2',
+])
+def test_invalid_row_range(spec):
+    with pytest.raises(ValueError, match='Invalid row range'):
+        parse_row_range(spec)
+
+@pytest.mark.parametrize('ranges, expected', [
+    ([], []),
+    ([(5, 5)], [(5, 5)]),
+    ([(8, 9), (1, 2)], [(1, 2), (8, 9)]),
+    # NOTE: 重なる範囲と隣接する範囲はまとめられる
+    ([(1, 5), (3, 8)], [(1, 8)]),
+    ([(1, 5), (2, 3)], [(1, 5)]),
+    ([(1, 2), (3, 4)], [(1, 4)]),
+    ([(1, 2), (4, 5)], [(1, 2), (4, 5)]),
+    ([(4, 6), (0, 0), (1, 3), (10, 12), (6, 6)], [(0, 6), (10, 12)]),
+])
+def test_merge_row_ranges(ranges, expected):
+    row_ranges = merge_row_ranges(ranges)
+    assert list(zip(row_ranges.starts.tolist(), row_ranges.ends.tolist())) == expected
+
+def test_contains():
+    row_ranges = merge_row_ranges([(2, 4), (7, 7), (3, 5)])
+    indices = np.arange(10)
+    expected = [index in {2, 3, 4, 5, 7} for index in indices]
+    assert row_ranges.contains(indices).tolist() == expected
+    assert [index in row_ranges for index in indices] == expected
+    assert len(row_ranges) == 5
+
+def test_ignore_rows():
+    ignore_rows = IgnoreRows([
+        'data/a.csv:1',
+        'a.csv:3-4',
+        'data/a.csv:2-3',
+        'b.jsonl:0',
+        'a.csv:1',
+    ])
+    ranges = ignore_rows.get_ranges('data/a.csv')
+    # NOTE: パスとファイル名の両方の指定がまとめられる
+    assert ranges.starts.tolist() == [1]
+    assert ranges.ends.tolist() == [4]
+    # NOTE: 別のディレクトリのファイルにはファイル名の指定だけが当てはまる
+    ranges = ignore_rows.get_ranges('other/a.csv')
+    assert ranges.starts.tolist() == [1, 3]
+    assert ranges.ends.tolist() == [1, 4]
+    assert ignore_rows.get_ranges('b.jsonl').starts.tolist() == [0]
+    assert ignore_rows.get_ranges('c.csv') is None
+    # NOTE: 重複した指定は取り除かれる (キャッシュのキーに使われる)
+    assert len(ignore_rows.specs) == 5
+
+def test_ignore_rows_with_colon_in_path():
+    ignore_rows = IgnoreRows(['C:/data/a.csv:2'])
+    assert ignore_rows.get_ranges('C:/data/a.csv').starts.tolist() == [2]
+
+@pytest.mark.parametrize('spec, message', [
+    ('a.csv', 'Expected "file:rows"'),
+    ('a.csv:', 'Invalid row range'),
+    ('a.csv:x', 'Invalid row range'),
+    ('a.csv:3-1', 'Invalid row range'),
+    ('a.csv:2-', 'Invalid row range'),
+])
+def test_invalid_ignore_rows(spec, message):
+    with pytest.raises(ValueError, match=message):
+        IgnoreRows([spec])
@@ -0,0 +1,34 @@
+'''
+Tests of the stages measured by a detailed stage timer (--profile).
+'''
+
+import os
+
+import pandas as pd
+
+from table_converter.core.convert import convert
+from table_converter.core.stage_timer import StageTimer
+from table_converter.core.writers import save_csv
+
+def test_actions_are_measured(tmp_path):
+    input_file = os.path.join(tmp_path, 'input.csv')
+    save_csv(pd.DataFrame({
+        'id': [1, 2, 3],
+        'name': ['a', 'b', 'c'],
+        'city': ['x', 'y', None],
+    }), input_file)
+    stage_timer = StageTimer(detailed=True)
+    convert(
+        [input_file],
+        output_file = os.path.join(tmp_path, 'output.jsonl'),
+        list_actions = ['filter:city!=y', 'assign:x=city||name', 'filter:name!=c'],
+        list_pick_columns = ['id', 'x'],
+        stage_timer = stage_timer,
+    )
+    stages = stage_timer.as_dict()
+    # NOTE: 前に移したフィルタも元の位置でアクションごとに計測される
+    assert "convert/prefilter/action[0] FilterConfig(field='city', operator='!=', value='y')" in stages
+    assert "convert/prefilter/action[2] FilterConfig(field='name', operator='!=', value='c')" in stages
+    assert any(
+        stage.startswith('convert/actions/action[1] AssignConfig(') for stage in stages
+    )